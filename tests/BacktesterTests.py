@@ -1,9 +1,12 @@
 from tests_import import *
 import unittest
 import pandas as pd
+import numpy as np
+import cPickle as pickle
 import market_data
 from TradingAlgorithm import TradingAlgorithm
 from Backtester import Backtester
+from BacktestResults import BacktestResults
 from pprint import pprint
 
 
@@ -131,5 +134,39 @@ class BacktesterTests(unittest.TestCase):
 		self.assertNotEqual(0, len(results.cash))
 		self.assertTrue(len(results.cash) == len(results.invested) == len(results.fees) == len(results.transactions))
 
+	def test_backtest_results_derive_series_lazily(self):
+		# Initialize unsorted base series
+		dates = pd.date_range('2015-01-01', periods=5)
+		order = [3, 0, 4, 1, 2]
+		cash = dict((dates[i], 1000.0 - 10 * i) for i in order)
+		invested = dict((dates[i], 500.0 + 25 * i) for i in order)
+		fees = dict((dates[i], 0.0) for i in order)
+		transactions = dict((dates[i], {}) for i in order)
+
+		results = BacktestResults(0, cash, invested, fees, transactions)
+
+		# Check the base series share the sorted dates and nothing is derived up front
+		self.assertTrue(results.cash.index.equals(dates))
+		self.assertTrue(results.transactions.index.equals(dates))
+		self.assertEqual({}, results._derived_series)
+
+		# Check the derived series against an eager computation
+		portfolio_value = pd.Series([1500.0 + 15 * i for i in range(5)], dates)
+		log_returns = np.log(portfolio_value / portfolio_value.shift(1))
+		self.assertTrue(np.allclose(portfolio_value, results.portfolio_value))
+		self.assertTrue(np.allclose(portfolio_value.diff()[1:], results.profit_and_loss[1:]))
+		self.assertTrue(np.allclose((portfolio_value.diff() / portfolio_value.shift(1))[1:], results.discrete_returns[1:]))
+		self.assertTrue(np.allclose(log_returns[1:], results.log_returns[1:]))
+		self.assertTrue(results.log_returns.index.equals(dates))
+		self.assertIs(results.log_returns, results.log_returns)
+
+		# Check the pickle leaves the derived series out and they are derived again once loaded
+		accessed_size = len(pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+		loaded = pickle.loads(pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+		self.assertEqual({}, loaded._derived_series)
+		self.assertEqual(accessed_size, len(pickle.dumps(BacktestResults(0, cash, invested, fees, transactions), \
+			pickle.HIGHEST_PROTOCOL)))
+		self.assertTrue(np.allclose(results.log_returns[1:], loaded.log_returns[1:]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,7 @@ import unittest
 from BacktestConfiguration import BacktestConfiguration
 from OptimizationConfiguration import OptimizationConfiguration
 from WalkForwardAnalysisConfiguration import WalkForwardAnalysisConfiguration
+from MonteCarloConfiguration import MonteCarloConfiguration
 
 
 class ConfigurationTests(unittest.TestCase):
@@ -15,5 +16,8 @@ class ConfigurationTests(unittest.TestCase):
     def test_walk_forward_analysis_configuration_config_file(self):
         config = WalkForwardAnalysisConfiguration('./support_files/correct_walk_forward_analysis_config.json')
 
+    def test_monte_carlo_configuration_config_file(self):
+        config = MonteCarloConfiguration('./support_files/correct_monte_carlo_config.json')
+
 if __name__ == '__main__':
     unittest.main()
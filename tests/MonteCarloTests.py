@@ -0,0 +1,90 @@
+from tests_import import *
+import unittest
+import numpy as np
+import pandas as pd
+import market_data
+from TradingAlgorithm import TradingAlgorithm
+from Backtester import Backtester
+from MonteCarloSimulator import MonteCarloSimulator
+
+
+class MonteCarloTests(unittest.TestCase):
+	def setUp(self):
+		# Initialize market data loading values
+		tickers = ['SPY']
+		ticker_types = ['']
+		data_sources = ['CSV']
+		start_date = pd.to_datetime('2015-01-01')
+		end_date = pd.to_datetime('2016-5-31')
+		history_window = 20
+		csv_data_uri = "support_files"
+
+		# Load market data
+		data = market_data.load_market_data(tickers, ticker_types, data_sources, start_date, end_date,
+			history_window, csv_data_uri)
+
+		# Initialize algorithm values
+		algorithm_uri = "support_files/MovingAverageDivergenceAlgorithm.py"
+		algorithm_parameters = {
+			"ma_long_window"    : 20,
+			"ma_short_window"   : 5,
+			"open_long"         : -0.25,
+			"close_long"        : 0.4,
+			"open_short"        : 0.5,
+			"close_short"       : -0.15
+		}
+
+		# Create trading algorithm
+		trading_algorithm = TradingAlgorithm.create_trading_algorithm(algorithm_uri, tickers,
+			history_window, algorithm_parameters)
+
+		# Setup and run the backtester
+		backtester = Backtester(0, trading_algorithm, 10000, 0.0, [0.0001])
+		self.backtest_results = backtester.run(data, start_date, end_date)
+
+	def test_monte_carlo_bootstrap(self):
+		# Simulate in several blocks of paths
+		simulator = MonteCarloSimulator(2, num_simulations=2500, method='bootstrap', block_length=5, seed=7,
+			paths_per_block=1000)
+		results = simulator.run(self.backtest_results)
+		same_results = simulator.run(self.backtest_results)
+		simulator.close()
+
+		# Check results
+		self.assertEqual(2500, results.num_simulations)
+		self.assertEqual(2500, len(results.max_drawdown))
+		self.assertEqual(2500, len(results.sharpe_ratio))
+		self.assertTrue(np.array_equal(results.final_equity, same_results.final_equity))
+		self.assertTrue(np.all(results.max_drawdown <= 0))
+		self.assertTrue(0.0 <= results.probability_of_loss <= 1.0)
+		self.assertEqual([5, 25, 50, 75, 95], list(results.percentiles().index))
+		self.assertTrue(results.percentiles()['final_equity'].is_monotonic)
+		self.assertAlmostEqual(results.observed_final_equity, self.backtest_results.portfolio_value[-1])
+
+		# Blocks as long as the backtest can only draw the observed path
+		simulator = MonteCarloSimulator(1, num_simulations=10, method='bootstrap', block_length=100000, seed=7)
+		results = simulator.run(self.backtest_results)
+		simulator.close()
+		self.assertTrue(np.allclose(results.final_equity, results.observed_final_equity))
+		self.assertTrue(np.allclose(results.max_drawdown, results.observed_max_drawdown))
+
+	def test_monte_carlo_trade_permutation(self):
+		simulator = MonteCarloSimulator(2, num_simulations=500, method='permutation', seed=7, paths_per_block=200)
+		results = simulator.run(self.backtest_results)
+		simulator.close()
+
+		# Reordering trades changes the drawdowns, but never the final equity
+		self.assertEqual(500, results.num_simulations)
+		self.assertTrue(np.allclose(results.final_equity, results.observed_final_equity))
+		self.assertTrue(np.allclose(results.sharpe_ratio, results.sharpe_ratio[0]))
+		self.assertTrue(len(np.unique(np.round(results.max_drawdown, 10))) > 1)
+
+		# Every trade keeps the order of its own returns
+		log_returns, segment_ids = MonteCarloSimulator.returns_and_segments(self.backtest_results)
+		self.assertEqual(len(log_returns), len(segment_ids))
+		self.assertEqual(0, segment_ids[0])
+		self.assertTrue(np.all(np.diff(segment_ids) >= 0))
+		self.assertTrue(segment_ids[-1] > 0)
+
+if __name__ == '__main__':
+    unittest.main()
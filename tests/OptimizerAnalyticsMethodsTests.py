@@ -35,11 +35,44 @@ class OptimizerAnalyticsMethodsTests(unittest.TestCase):
 
 		self.assertAlmostEqual(0.5831621098, sortino_ratio, places=8)
 
+	def test_ratio_matrix_analytics_methods(self):
+		log_returns = optimizer_analytics.log_returns(self.test_series)
+		short_log_returns = log_returns[:500]
+		return_matrix = optimizer_analytics.return_matrix([log_returns.values, short_log_returns.values])
+		sharpe_ratios = optimizer_analytics.sharpe_ratio_matrix(return_matrix, 'daily')
+		sortino_ratios = optimizer_analytics.sortino_ratio_matrix(return_matrix, 'daily')
+
+		# Check each row matches the series method despite the NaN padding
+		self.assertEqual((2, len(log_returns)), return_matrix.shape)
+		self.assertAlmostEqual(optimizer_analytics.sharpe_ratio(log_returns, 'daily'), sharpe_ratios[0], places=10)
+		self.assertAlmostEqual(optimizer_analytics.sharpe_ratio(short_log_returns, 'daily'), sharpe_ratios[1], places=10)
+		self.assertAlmostEqual(optimizer_analytics.sortino_ratio(log_returns, 'daily'), sortino_ratios[0], places=10)
+		self.assertAlmostEqual(optimizer_analytics.sortino_ratio(short_log_returns, 'daily'), sortino_ratios[1],
+			places=10)
+
 	def test_mar_ratio_analytics_method(self):
 		self.assertTrue(False, 'Not implemented!')
 
 	def test_max_drawdown_analytics_method(self):
-		self.assertTrue(False, 'Not implemented!')
+		price_series = pd.Series([100.0, 120.0, 90.0, 130.0, 65.0, 80.0])
+		max_drawdown = optimizer_analytics.max_drawdown(price_series)
+
+		self.assertAlmostEqual(-0.5, max_drawdown, places=8)
+
+	def test_max_drawdown_matrix_analytics_method(self):
+		price_matrix = optimizer_analytics.return_matrix([[100.0, 120.0, 90.0, 130.0, 65.0, 80.0], [100.0, 90.0, 95.0]])
+		max_drawdowns = optimizer_analytics.max_drawdown_matrix(price_matrix)
+
+		self.assertAlmostEqual(-0.5, max_drawdowns[0], places=8)
+		self.assertAlmostEqual(-0.1, max_drawdowns[1], places=8)
+
+	def test_turnover_analytics_method(self):
+		price_series = pd.Series([1000.0, 1100.0, 900.0, 1000.0])
+		transactions_series = pd.Series([{}, {'SPY': {'position': 1, 'share_count': 10, 'share_price': 50.0}}, {},
+			{'SPY': {'position': 0, 'share_count': 10, 'share_price': 45.0}}])
+		turnover = optimizer_analytics.turnover(transactions_series, price_series, 'daily')
+
+		self.assertAlmostEqual(950.0 / 1000.0 * 252 / 4, turnover, places=8)
 
 	def test_var_analytics_method(self):
 		self.assertTrue(False, 'Not implemented!')
@@ -1,16 +1,73 @@
 from tests_import import *
 import unittest
 import pandas as pd
+import numpy as np
+import itertools
+import pickle
+import tempfile
+import shutil
+import os
+import time
 import market_data
+import indicators
 from TradingAlgorithm import TradingAlgorithm
+from Backtester import Backtester
 from Optimizer import Optimizer
 from GridSearchOptimizer import GridSearchOptimizer
+from ParameterSpace import ParameterSpace, ParameterGrid
+from TPEOptimizer import TPEOptimizer
+from SuccessiveHalvingOptimizer import SuccessiveHalvingOptimizer
+from WorkerPool import WorkerPool
+from DistributedWorkerPool import DistributedWorkerPool
+from BacktestResultStore import BacktestResultStore
+from OptimizationResults import OptimizationResults
+from OptimizationCheckpoint import OptimizationCheckpoint
+from OptimizationProgress import OptimizationProgress
+from ResultsArchive import ResultsArchive
+from MemmapResultSink import MemmapResultSink
 import optimizer_factory as of
+from analytics import compute_optimizer_metric
 from pprint import pprint
 
 
+def _crash_once(marker_uri, value):
+	# The first worker to run this task dies, leaving it to be reassigned
+	if not os.path.exists(marker_uri):
+		open(marker_uri, 'w').close()
+		os._exit(1)
+
+	return 2 * value
+
+class _OrderedWindowsAlgorithm(TradingAlgorithm):
+
+	def canonicalize_parameters(self, parameters):
+		# The windows canonicalize across parameters, the shorter one always comes first
+		parameters = TradingAlgorithm.canonicalize_parameters(self, parameters)
+		windows = sorted([parameters['ma_short_window'], parameters['ma_long_window']])
+		parameters['ma_short_window'], parameters['ma_long_window'] = windows
+
+		return parameters
+
+
 class OptimizerTests(unittest.TestCase):
 
+	def setUp(self):
+		# Most tests optimize the moving average divergence algorithm on the same market data
+		self.tickers = ['SPY']
+		self.start_date = pd.to_datetime('2016-01-01')
+		self.end_date = pd.to_datetime('2016-5-31')
+		self.history_window = 20
+		self.algorithm_uri = "support_files/MovingAverageDivergenceAlgorithm.py"
+
+		# Load market data and create the trading algorithm
+		self.data = self.load_market_data(self.start_date, self.history_window)
+		self.trading_algorithm = TradingAlgorithm.create_trading_algorithm(self.algorithm_uri, self.tickers,
+			self.history_window, None)
+
+	def load_market_data(self, start_date, history_window):
+		return market_data.load_market_data(self.tickers, [''], ['CSV'], start_date, self.end_date, history_window,
+			"support_files")
+
 	def test_grid_search_optimizer_as_expected(self):
 		# Initialize market data loading values
 		tickers = ['SPY']
@@ -60,6 +117,233 @@ class OptimizerTests(unittest.TestCase):
 		self.assertTrue(len(results.backtest_results) == len(results.parameter_sets))
 		self.assertEqual(4, len(results.backtest_results))
 
+	def test_grid_search_optimizer_reuses_worker_pool(self):
+		# Initialize grid search optimizer values
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 2],
+			"ma_short_window"   : [2, 5, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Run the optimizer twice on the same worker pool
+		with WorkerPool(2, self.algorithm_uri) as worker_pool:
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", True, optimization_parameters, "daily", worker_pool=worker_pool)
+			first_results = optimizer.run(self.data, self.start_date, self.end_date)
+			pool = worker_pool.pool
+			second_results = optimizer.run(self.data, self.start_date, self.end_date)
+
+			# Check the pool was reused and left running for its owner
+			self.assertIs(pool, worker_pool.pool)
+			optimizer.close()
+			self.assertTrue(worker_pool.is_running)
+
+		# Check results
+		self.assertFalse(worker_pool.is_running)
+		self.assertEqual(first_results.optimal_parameters, second_results.optimal_parameters)
+
+	def test_grid_search_optimizer_distributed_worker_pool(self):
+		# Initialize grid search optimizer values
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 2],
+			"ma_short_window"   : [2, 5, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Run the optimizer on local processors and on workers fed by the work queue
+		with WorkerPool(2, self.algorithm_uri) as worker_pool:
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", True, optimization_parameters, "daily", worker_pool=worker_pool, optimizer_options={
+				"chunk_size": 1})
+			expected_results = optimizer.run(self.data, self.start_date, self.end_date)
+
+		with DistributedWorkerPool(3, self.algorithm_uri, num_local_workers=3) as worker_pool:
+			optimizer = of.create_optimizer(3, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", True, optimization_parameters, "daily", worker_pool=worker_pool, optimizer_options={
+				"chunk_size": 1})
+			results = optimizer.run(self.data, self.start_date, self.end_date)
+			self.assertEqual(3, worker_pool.num_workers)
+
+		# Check results
+		self.assertFalse(worker_pool.is_running)
+		self.assertEqual(expected_results.optimal_parameters, results.optimal_parameters)
+		self.assertEqual(list(expected_results.parameter_sets), list(results.parameter_sets))
+		self.assertEqual([r.portfolio_value.iloc[-1] for r in expected_results.backtest_results],
+			[r.portfolio_value.iloc[-1] for r in results.backtest_results])
+
+	def test_distributed_worker_pool_reassigns_lost_tasks(self):
+		temp_uri = tempfile.mkdtemp()
+		marker_uri = os.path.join(temp_uri, 'crashed')
+
+		try:
+			# One worker dies while running a task, the remaining worker takes it over
+			with DistributedWorkerPool(2, num_local_workers=2) as worker_pool:
+				values = [worker_pool.apply_async(_crash_once, (marker_uri if i == 3 else temp_uri, i)) for i in range(6)]
+				results = [value.get(30) for value in values]
+				self.assertEqual(1, worker_pool.num_workers)
+		finally:
+			shutil.rmtree(temp_uri)
+
+		# Check results
+		self.assertEqual([0, 2, 4, 6, 8, 10], results)
+
+	def test_distributed_worker_pool_secures_and_closes_work_queue(self):
+		# A work queue reachable from other hosts needs an explicit authkey, a local one gets a random authkey
+		self.assertRaises(ValueError, DistributedWorkerPool, 2, host='0.0.0.0')
+		self.assertNotEqual(DistributedWorkerPool(2).authkey, DistributedWorkerPool(2).authkey)
+
+		# Closing a work queue without workers fails its tasks instead of waiting forever
+		worker_pool = DistributedWorkerPool(2, heartbeat_interval=0.1, heartbeat_timeout=0.5)
+		value = worker_pool.apply_async(_crash_once, (tempfile.gettempdir(), 1))
+		start_time = time.time()
+		worker_pool.close()
+
+		# Check results
+		self.assertTrue(time.time() - start_time < 5)
+		self.assertFalse(worker_pool.is_running)
+		self.assertRaises(RuntimeError, value.get, 1)
+
+	def test_grid_search_optimizer_streams_adaptive_chunks(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 6, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [-0.2, 0.4, 3]
+		}
+
+		# Setup and run the optimizer with adaptive and with fixed chunks
+		all_results = []
+		for chunk_size in [None, 5]:
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", False, optimization_parameters, "daily", optimizer_options={"chunk_size": chunk_size})
+			all_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+			optimizer.close()
+		results, fixed_results = all_results
+
+		# Check the running best is the optimum
+		self.assertEqual(results.optimal_parameters, fixed_results.optimal_parameters)
+		self.assertEqual(results.optimal_parameters, results.parameter_sets[optimizer.running_best[1]])
+		self.assertEqual([r.backtest_id for r in results.backtest_results], range(27))
+		for result, fixed_result in zip(results.backtest_results, fixed_results.backtest_results):
+			self.assertTrue(result.cash.equals(fixed_result.cash))
+
+		# Check chunks are measured first, then filled to the target duration and shrunk towards the end
+		optimizer.chunk_size = None
+		cumulative_costs = np.concatenate([[0.0], np.cumsum(np.ones(100000))])
+		self.assertEqual(1, optimizer.get_chunk_size(cumulative_costs, 0, 0.0, 0.0))
+		self.assertEqual(40, optimizer.get_chunk_size(cumulative_costs, 0, 0.25, 10.0))
+		self.assertEqual(GridSearchOptimizer.MAX_CHUNK_SIZE, optimizer.get_chunk_size(cumulative_costs, 0, 0.001, 10.0))
+		self.assertEqual(max(1, 10 // (2 * optimizer.worker_pool.num_processors)),
+			optimizer.get_chunk_size(cumulative_costs, 99990, 0.001, 10.0))
+		cumulative_costs = np.concatenate([[0.0], np.cumsum([10.0] * 10 + [1.0] * 990)])
+		self.assertEqual(4, optimizer.get_chunk_size(cumulative_costs, 0, 0.25, 10.0))
+
+	def test_grid_search_optimizer_reports_progress(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 6, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [-0.2, 0.4, 3]
+		}
+
+		# Setup and run the optimizer, recording every progress update
+		updates = []
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily")
+		optimizer.progress_callback = lambda progress: updates.append((progress.num_completed, progress.eta_seconds))
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Check the updates count up to every scenario
+		completed = [num_completed for num_completed, eta_seconds in updates]
+		self.assertEqual(sorted(completed), completed)
+		self.assertEqual(27, completed[-1])
+		self.assertEqual(0, updates[-1][1])
+
+		# Check optimizers evaluating in batches report one progress over their whole budget, along with the
+		# utilization of their workers and their slowest scenarios
+		for optimizer_name, options, num_scenarios in [("RandomSearchOptimizer", {"max_evaluations": 20,
+			"batch_size": 5, "seed": 1}, 20), ("SuccessiveHalvingOptimizer", {}, 27 + 9 + 3), ("TPEOptimizer",
+			{"max_evaluations": 12, "batch_size": 3, "seed": 1}, 12)]:
+			updates = []
+			optimizer = of.create_optimizer(2, optimizer_name, self.trading_algorithm, 0.0, [0.0001], "sharpe_ratio",
+				False, optimization_parameters, "daily", optimizer_options=options)
+			optimizer.progress_callback = lambda progress: updates.append((progress.num_completed,
+				progress.num_scenarios, progress.running_best, progress))
+			results = optimizer.run(self.data, self.start_date, self.end_date)
+			optimizer.close()
+
+			completed = [num_completed for num_completed, total, running_best, progress in updates]
+			self.assertEqual(sorted(completed), completed)
+			self.assertEqual(num_scenarios, completed[-1])
+			self.assertEqual(set([num_scenarios]), set(total for num_completed, total, running_best, progress in
+				updates))
+			self.assertEqual(results.optimal_parameters, results.parameter_sets[updates[-1][2][1]])
+			self.assertTrue(len(updates[-1][3].busy_seconds) > 0)
+			self.assertTrue(len(updates[-1][3].slowest_scenarios) > 0)
+
+		# Check the evolution also reports its workers and slowest scenarios
+		progresses = []
+		optimizer = of.create_optimizer(2, "DifferentialEvolutionOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily", optimizer_options={'population_size': 8,
+			'max_generations': 1, 'seed': 3})
+		optimizer.progress_callback = progresses.append
+		optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+		self.assertTrue(len(progresses[-1].busy_seconds) > 0)
+		self.assertTrue(all(duration > 0 for duration, backtest_id in progresses[-1].slowest_scenarios))
+
+		# Check the telemetry of a chunk
+		progress = OptimizationProgress(10, 2, num_slowest=2)
+		progress.update([0, 1, 2], [0.5, 2.0, 1.0], 'worker:1', (1.5, 1))
+		progress.update([3], [0.1], 'worker:2', (1.5, 1))
+		self.assertEqual(4, progress.num_completed)
+		self.assertEqual([(2.0, 1), (1.0, 2)], sorted(progress.slowest_scenarios, reverse=True))
+		self.assertEqual({'worker:1': 3.5, 'worker:2': 0.1}, progress.busy_seconds)
+		self.assertEqual(['worker:1', 'worker:2'], sorted(progress.worker_utilization))
+		self.assertTrue(progress.eta_seconds > 0)
+
+	def test_grid_search_optimizer_summary_result_mode(self):
+		# Initialize grid search optimizer values
+		optimization_metric = "sharpe_ratio"
+		optimization_metric_ascending = True
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+		time_resolution = "daily"
+
+		# Run the optimizer with full and summarized results
+		full_optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			optimization_metric, optimization_metric_ascending, optimization_parameters, time_resolution)
+		full_results = full_optimizer.run(self.data, self.start_date, self.end_date)
+		full_optimizer.close()
+
+		summary_optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			optimization_metric, optimization_metric_ascending, optimization_parameters, time_resolution,
+			optimizer_options={'result_mode': 'summary', 'top_n_results': 2})
+		summary_results = summary_optimizer.run(self.data, self.start_date, self.end_date)
+		summary_optimizer.close()
+
+		# Check results
+		self.assertEqual(full_results.optimal_parameters, summary_results.optimal_parameters)
+		self.assertEqual(6, len(summary_results.backtest_summaries))
+		self.assertEqual(2, len(summary_results.backtest_results))
+
+		top_results = Optimizer.get_top_n_optimal_results(full_results.backtest_results, 2, optimization_metric,
+			optimization_metric_ascending, time_resolution)
+		for top_result, summary_result in zip(top_results, summary_results.backtest_results):
+			self.assertEqual(top_result.backtest_id, summary_result.backtest_id)
+
+			summary = summary_results.backtest_summaries[summary_result.backtest_id]
+			self.assertAlmostEqual(top_result.portfolio_value[-1], summary.final_equity)
+			self.assertEqual(sum(len(t) for t in top_result.transactions), summary.trade_count)
+			self.assertTrue(summary.max_drawdown <= 0.0)
+
 	def test_parameter_space_discretization(self):
 		optimization_parameters = {
 			"ma_long_window"    : [10, 10, 1],
@@ -80,5 +364,956 @@ class OptimizerTests(unittest.TestCase):
 		dis_params = GridSearchOptimizer.get_param_sets(optimization_parameters)
 		self.assertEqual(96, len(dis_params))
 
+	def test_random_search_optimizer_is_reproducible(self):
+		# Initialize random search optimizer values
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_evaluations': 10, 'batch_size': 4, 'seed': 7}
+
+		# Setup and run the optimizer twice
+		optimizer = of.create_optimizer(2, "RandomSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options=optimizer_options)
+		first_results = optimizer.run(self.data, self.start_date, self.end_date)
+		second_results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Check results
+		self.assertEqual(10, len(first_results.backtest_results))
+		self.assertEqual(first_results.parameter_sets, second_results.parameter_sets)
+		self.assertEqual(first_results.optimal_parameters, second_results.optimal_parameters)
+		for parameters in first_results.parameter_sets:
+			self.assertTrue(10 <= parameters['ma_long_window'] <= 20)
+			self.assertTrue(-0.5 <= parameters['open_long'] <= -0.1)
+
+	def test_random_search_optimizer_time_budget(self):
+		# Initialize random search optimizer values, a batch of the given size would run far beyond the time budget
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_seconds': 2, 'batch_size': 5000, 'seed': 7}
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "RandomSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options=optimizer_options)
+		started = time.time()
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		elapsed_seconds = time.time() - started
+		optimizer.close()
+
+		# Check the time budget is not cut short by an evaluation budget and batches stop close to it
+		self.assertIsNone(optimizer.max_evaluations)
+		self.assertTrue(len(results.backtest_results) > 0)
+		self.assertTrue(elapsed_seconds < 10, elapsed_seconds)
+
+	def test_random_search_optimizer_warm_start(self):
+		# Initialize random search optimizer values
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_evaluations': 12, 'batch_size': 4, 'seed': 7, 'num_warm_start_seeds': 3,
+			'trust_region_radius': 0.1, 'max_seed_drop': 10.0}
+
+		# Run the first window cold and seed the second window with its best parameter sets
+		optimizer = of.create_optimizer(2, "RandomSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily", optimizer_options=optimizer_options)
+		first_results = optimizer.run(self.data, self.start_date, pd.to_datetime('2016-3-31'))
+		optimizer.set_warm_start(first_results)
+		seed_parameter_sets = [parameters for parameters, metric in optimizer.warm_start_seeds]
+		second_results = optimizer.run(self.data, pd.to_datetime('2016-2-1'), self.end_date)
+
+		# Check the seeds are evaluated first and include the optimum
+		self.assertEqual(3, len(seed_parameter_sets))
+		self.assertIn(first_results.optimal_parameters, seed_parameter_sets)
+		self.assertEqual(seed_parameter_sets, second_results.parameter_sets[:3])
+		self.assertEqual(12, len(second_results.parameter_sets))
+
+		# Integer parameters map back onto the middle of their slice, which may stick out of the trust region by up to
+		# half of the widest slice
+		lower, upper = optimizer.parameter_space.trust_region(seed_parameter_sets, 0.1)
+		for parameters in second_results.parameter_sets[3:]:
+			unit_point = optimizer.parameter_space.to_unit(parameters)
+			self.assertTrue(np.all((lower - 0.125 <= unit_point) & (unit_point <= upper + 0.125)))
+
+		# Seeds which lost most of their quality fall back to a global search
+		optimizer.max_seed_drop = 0.5
+		optimizer.warm_start_seeds = [(parameters, 1e6) for parameters in seed_parameter_sets]
+		seed_evaluations = optimizer.evaluate(seed_parameter_sets, self.data, self.start_date, self.end_date)
+		self.assertEqual(None, optimizer.warm_start_region(seed_evaluations))
+		optimizer.close()
+
+	def test_tpe_optimizer_as_expected(self):
+		# Initialize TPE optimizer values
+		optimization_metric = "sharpe_ratio"
+		optimization_metric_ascending = True
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_evaluations': 12, 'num_startup': 4, 'seed': 3}
+		time_resolution = "daily"
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "TPEOptimizer", self.trading_algorithm, 0.0, [0.0001], optimization_metric,
+			optimization_metric_ascending, optimization_parameters, time_resolution,
+			optimizer_options=optimizer_options)
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Manually compute optimal parameters
+		opt_params = Optimizer.get_optimal_parameters(results.backtest_results, optimization_metric, results.parameter_sets,
+			optimization_metric_ascending, time_resolution)
+
+		# Check results
+		self.assertEqual(opt_params, results.optimal_parameters)
+		self.assertEqual(12, len(results.backtest_results))
+		for i, result in enumerate(results.backtest_results):
+			self.assertEqual(i, result.backtest_id)
+
+	def test_tpe_optimizer_proposes_near_good_scenarios(self):
+		optimization_parameters = {
+			"x"    : [0.0, 1.0],
+			"y"    : [0.0, 1.0]
+		}
+		optimizer = TPEOptimizer(1, None, 0.0, [], "sharpe_ratio", False, optimization_parameters, "daily",
+			num_startup=5)
+
+		# Score previously evaluated points by their closeness to (0.2, 0.7)
+		random_state = np.random.RandomState(0)
+		optimizer.unit_points = list(random_state.uniform(size=(60, 2)))
+		optimization_metrics = {}
+		for i, point in enumerate(optimizer.unit_points):
+			optimization_metrics[i] = -np.sum((point - np.array([0.2, 0.7])) ** 2)
+
+		# Check proposals are much closer to the best region than the evaluated points
+		proposals = np.array([optimizer.propose(random_state, optimization_metrics) for i in range(50)])
+		proposal_distance = np.mean(np.sqrt(np.sum((proposals - [0.2, 0.7]) ** 2, axis=1)))
+		evaluated_distance = np.mean(np.sqrt(np.sum((np.array(optimizer.unit_points) - [0.2, 0.7]) ** 2, axis=1)))
+		self.assertTrue(proposal_distance < 0.6 * evaluated_distance)
+
+	def test_differential_evolution_optimizer_as_expected(self):
+		# Initialize differential evolution optimizer values
+		optimization_metric = "sharpe_ratio"
+		optimization_metric_ascending = True
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.25, -0.25],
+			"close_long"        : [0.4, 0.4]
+		}
+		optimizer_options = {'population_size': 6, 'max_generations': 4, 'seed': 11}
+		time_resolution = "daily"
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "DifferentialEvolutionOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			optimization_metric, optimization_metric_ascending, optimization_parameters, time_resolution,
+			optimizer_options=optimizer_options)
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Manually compute optimal parameters
+		opt_params = Optimizer.get_optimal_parameters(results.backtest_results, optimization_metric, results.parameter_sets,
+			optimization_metric_ascending, time_resolution)
+
+		# Check results, every evaluated parameter set is unique thanks to the evaluation cache
+		self.assertEqual(opt_params, results.optimal_parameters)
+		self.assertTrue(len(results.backtest_results) == len(results.parameter_sets))
+		self.assertTrue(len(results.parameter_sets) <= 6 * (optimizer.generations_run + 1))
+		unique_sets = set(tuple(sorted(p.items())) for p in results.parameter_sets)
+		self.assertEqual(len(unique_sets), len(results.parameter_sets))
+
+	def test_successive_halving_optimizer_as_expected(self):
+		# Load a longer range of market data, the lowest fidelity only backtests a ninth of it
+		start_date = pd.to_datetime('2015-06-01')
+		data = self.load_market_data(start_date, self.history_window)
+
+		# Initialize successive halving optimizer values
+		optimization_metric = "sharpe_ratio"
+		optimization_metric_ascending = True
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.1, 0.4, 2]
+		}
+		time_resolution = "daily"
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "SuccessiveHalvingOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			optimization_metric, optimization_metric_ascending, optimization_parameters, time_resolution,
+			optimizer_options={'eta': 3, 'min_fraction': 1.0 / 9})
+		results = optimizer.run(data, start_date, self.end_date)
+		optimizer.close()
+
+		# Check the candidates were eliminated at increasing fidelities
+		self.assertEqual([1.0 / 9, 1.0 / 3, 1.0], optimizer.fidelities)
+		self.assertEqual(18, len(results.fidelities))
+		self.assertEqual(12, results.fidelities.count(1.0 / 9))
+		self.assertEqual(4, results.fidelities.count(1.0 / 3))
+		self.assertEqual(2, results.fidelities.count(1.0))
+
+		# Check the optimum was chosen among the candidates evaluated on the full date range
+		full_results = [r for r, f in zip(results.backtest_results, results.fidelities) if f == 1.0]
+		full_parameter_sets = [results.parameter_sets[r.backtest_id] for r in full_results]
+		opt_params = Optimizer.get_optimal_parameters(full_results, optimization_metric, full_parameter_sets,
+			optimization_metric_ascending, time_resolution)
+		self.assertEqual(opt_params, results.optimal_parameters)
+		self.assertEqual(max(r.cash.index[-1] for r in full_results), data['SPY'].index[-1])
+
+	def test_grid_search_optimizer_memoizes_effective_parameter_sets(self):
+		# Windows are cast to int by the algorithm, leaving 2 x 2 effective parameter sets out of 5 x 3
+		optimization_parameters = {
+			"ma_long_window"    : [10, 11, 5],
+			"ma_short_window"   : [2, 3, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily")
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Check duplicates share the evaluation of their effective parameter set
+		self.assertEqual(15, len(results.backtest_results))
+		self.assertEqual(range(15), [r.backtest_id for r in results.backtest_results])
+		unique_cash_series = set(id(r.cash) for r in results.backtest_results)
+		self.assertEqual(4, len(unique_cash_series))
+
+	def test_grid_search_optimizer_canonicalizes_across_parameters(self):
+		optimization_parameters = {
+			"ma_long_window"    : [2, 4, 3, "int"],
+			"ma_short_window"   : [2, 4, 3, "int"]
+		}
+
+		# Setup optimizers for an algorithm canonicalizing its windows together and one canonicalizing them one by one
+		ordered_optimizer = GridSearchOptimizer(1, _OrderedWindowsAlgorithm(['SPY'], 20, None), 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily")
+		independent_optimizer = GridSearchOptimizer(1, TradingAlgorithm.create_trading_algorithm(
+			"support_files/MovingAverageDivergenceAlgorithm.py", ['SPY'], 20, None), 0.0, [0.0001], "sharpe_ratio",
+			True, optimization_parameters, "daily", worker_pool=ordered_optimizer.worker_pool)
+
+		# Check only parameter sets with the same canonical windows share their evaluations
+		grid = ordered_optimizer.optimization_parameter_sets
+		sources = ordered_optimizer.get_shared_positions()
+		for position, source in enumerate(sources):
+			self.assertEqual(ordered_optimizer.parameter_key(grid[position]),
+				ordered_optimizer.parameter_key(grid[source]))
+		self.assertEqual(6, len(set(sources)))
+		self.assertEqual(range(9), list(independent_optimizer.get_shared_positions()))
+
+		# Check shards keep the parameter sets sharing their evaluations together
+		shard_keys = [set(ordered_optimizer.parameter_key(parameters) for parameters in
+			ordered_optimizer.get_shard_grid(i, 2)) for i in range(2)]
+		self.assertEqual(set(), shard_keys[0] & shard_keys[1])
+		self.assertEqual(6, len(shard_keys[0] | shard_keys[1]))
+		ordered_optimizer.close()
+
+		# Check constraints are checked on the canonical windows either way
+		optimization_parameters["constraints"] = ["ma_short_window < ma_long_window"]
+		ordered_space = ParameterSpace(optimization_parameters, _OrderedWindowsAlgorithm(['SPY'], 20,
+			None).canonicalize_parameters)
+		self.assertEqual(6, np.sum(ordered_space.feasible_mask(np.arange(9))))
+		independent_space = ParameterSpace(optimization_parameters, independent_optimizer.trading_algorithm
+			.canonicalize_parameters, True)
+		self.assertEqual(3, np.sum(independent_space.feasible_mask(np.arange(9))))
+
+	def test_grid_search_optimizer_reuses_stored_backtests(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 3, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Setup and run the optimizer twice against the same store, then once with a different commission
+		store_uri = tempfile.mkdtemp()
+		try:
+			with BacktestResultStore(store_uri) as result_store:
+				all_results = []
+				for commission in [0.0, 0.0, 1.0]:
+					optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, commission,
+						[0.0001], "sharpe_ratio", True, optimization_parameters, "daily", result_store=result_store)
+					all_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+					optimizer.close()
+
+				# Check only the second run was served from the store
+				self.assertEqual(6, result_store.hits)
+				self.assertEqual(12, result_store.misses)
+		finally:
+			shutil.rmtree(store_uri)
+
+		# Check results
+		first_results, second_results, other_results = all_results
+		self.assertEqual(first_results.optimal_parameters, second_results.optimal_parameters)
+		self.assertEqual(range(6), [r.backtest_id for r in second_results.backtest_results])
+		for first, second in zip(first_results.backtest_results, second_results.backtest_results):
+			self.assertTrue(first.cash.equals(second.cash))
+
+		# Check the stored backtests depend on the engine's version and source, not only the algorithm's
+		fingerprint = BacktestResultStore.algorithm_fingerprint(self.trading_algorithm)
+		engine_version, engine_modules = BacktestResultStore.ENGINE_VERSION, BacktestResultStore.ENGINE_MODULES
+		try:
+			BacktestResultStore.ENGINE_VERSION += 1
+			self.assertNotEqual(fingerprint, BacktestResultStore.algorithm_fingerprint(self.trading_algorithm))
+			BacktestResultStore.ENGINE_VERSION = engine_version
+			BacktestResultStore.ENGINE_MODULES = [name for name in engine_modules if name != 'indicators']
+			self.assertNotEqual(fingerprint, BacktestResultStore.algorithm_fingerprint(self.trading_algorithm))
+		finally:
+			BacktestResultStore.ENGINE_VERSION, BacktestResultStore.ENGINE_MODULES = engine_version, engine_modules
+		self.assertEqual(fingerprint, BacktestResultStore.algorithm_fingerprint(self.trading_algorithm))
+
+	def test_random_search_optimizer_reuses_stored_backtests(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_evaluations': 10, 'batch_size': 4, 'seed': 7}
+
+		# Setup and run the optimizer twice, reopening the store in between
+		store_uri = tempfile.mkdtemp()
+		try:
+			all_results = []
+			for i in range(2):
+				with BacktestResultStore(store_uri, flush_size=4) as result_store:
+					optimizer = of.create_optimizer(2, "RandomSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+						"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options=optimizer_options,
+						result_store=result_store)
+					all_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+					optimizer.close()
+
+			# Check the second run was served from the store, which packed its results into a blob per batch
+			self.assertEqual(10, result_store.hits)
+			self.assertEqual(0, result_store.misses)
+			with BacktestResultStore(store_uri) as result_store:
+				num_rows = result_store.connection.execute('SELECT COUNT(*) FROM backtests').fetchone()[0]
+			self.assertEqual(10, num_rows)
+			self.assertEqual(3, len(os.listdir(os.path.join(store_uri, 'blobs'))))
+		finally:
+			shutil.rmtree(store_uri)
+
+		# Check results
+		first_results, second_results = all_results
+		self.assertEqual(first_results.optimal_parameters, second_results.optimal_parameters)
+		for first, second in zip(first_results.backtest_results, second_results.backtest_results):
+			self.assertEqual(first.backtest_id, second.backtest_id)
+			self.assertTrue(first.cash.equals(second.cash))
+
+	def test_tpe_optimizer_reuses_stored_backtests(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"ma_short_window"   : [2, 5, 0, "int"],
+			"open_long"         : [-0.5, -0.1],
+			"close_long"        : [0.1, 0.8]
+		}
+		optimizer_options = {'max_evaluations': 12, 'batch_size': 3, 'seed': 7, 'num_startup': 12}
+
+		# Run the optimizer twice with several scenarios in flight, its random startup proposals repeat in the store
+		store_uri = tempfile.mkdtemp()
+		try:
+			all_results = []
+			for i in range(2):
+				with BacktestResultStore(store_uri, flush_size=4) as result_store:
+					optimizer = of.create_optimizer(2, "TPEOptimizer", self.trading_algorithm, 0.0, [0.0001],
+						"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options=optimizer_options,
+						result_store=result_store)
+					all_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+					optimizer.close()
+
+			# Check the second run was served from the store
+			self.assertEqual(12, result_store.hits)
+			self.assertEqual(0, result_store.misses)
+		finally:
+			shutil.rmtree(store_uri)
+
+		# Check results
+		first_results, second_results = all_results
+		self.assertEqual(first_results.optimal_parameters, second_results.optimal_parameters)
+		self.assertEqual(list(first_results.parameter_sets), list(second_results.parameter_sets))
+
+	def test_stochastic_optimizers_share_duplicate_proposals(self):
+		# Float windows are cast to int by the algorithm, so only six effective parameter sets exist
+		optimization_parameters = {
+			"ma_long_window"    : [10, 12.9],
+			"ma_short_window"   : [2, 3.9],
+			"open_long"         : [-0.25, -0.25],
+			"close_long"        : [0.4, 0.4]
+		}
+
+		# Setup and run the TPE search, only backtests of new effective parameter sets look up the store
+		store_uri = tempfile.mkdtemp()
+		try:
+			with BacktestResultStore(store_uri) as result_store:
+				optimizer = of.create_optimizer(2, "TPEOptimizer", self.trading_algorithm, 0.0, [0.0001],
+					"sharpe_ratio", False, optimization_parameters, "daily", optimizer_options={'max_evaluations': 20,
+					'batch_size': 3, 'seed': 3}, result_store=result_store)
+				results = optimizer.run(self.data, self.start_date, self.end_date)
+				optimizer.close()
+		finally:
+			shutil.rmtree(store_uri)
+
+		# Check results
+		self.assertEqual(20, len(results.backtest_results))
+		self.assertTrue(result_store.misses <= 6)
+		for parameters, result in zip(results.parameter_sets, results.backtest_results):
+			first_id = [optimizer.parameter_key(p) for p in results.parameter_sets].index(
+				optimizer.parameter_key(parameters))
+			self.assertTrue(result.cash.equals(results.backtest_results[first_id].cash))
+
+		# Check differential evolution only evaluates each effective parameter set once
+		optimizer = of.create_optimizer(2, "DifferentialEvolutionOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily", optimizer_options={'population_size': 8,
+			'max_generations': 3, 'seed': 3})
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+		parameter_keys = [optimizer.parameter_key(parameters) for parameters in results.parameter_sets]
+		self.assertEqual(len(set(parameter_keys)), len(parameter_keys))
+		self.assertTrue(len(parameter_keys) <= 6)
+
+	def test_grid_search_optimizer_resumes_from_checkpoint(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 3, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		temp_uri = tempfile.mkdtemp()
+		checkpoint_uri = os.path.join(temp_uri, 'checkpoint')
+		try:
+			# Run the optimizer, then cut its checkpoint short in the middle of the fifth scenario
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options={
+				"checkpoint_uri": checkpoint_uri})
+			expected_results = optimizer.run(self.data, self.start_date, self.end_date)
+			optimizer.close()
+
+			checkpoint = OptimizationCheckpoint(checkpoint_uri, resume=True)
+			offsets = sorted(checkpoint.offsets.values()[0].values())
+			checkpoint.close()
+			with open(checkpoint_uri, 'r+b') as f:
+				f.truncate(offsets[4] + 100)
+
+			# Resume the optimizer, which only runs the scenarios missing from the checkpoint
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", True, optimization_parameters, "daily", optimizer_options={
+				"checkpoint_uri": checkpoint_uri, "resume": True})
+			results = optimizer.run(self.data, self.start_date, self.end_date)
+			optimizer.close()
+
+			# Check the checkpoint holds every scenario once
+			checkpoint = OptimizationCheckpoint(checkpoint_uri, resume=True)
+			self.assertEqual(6, len(checkpoint.offsets.values()[0]))
+			self.assertEqual(os.path.getsize(checkpoint_uri), checkpoint.size)
+			self.assertEqual(sorted(checkpoint.offsets.values()[0].values())[:4], offsets[:4])
+			checkpoint.close()
+		finally:
+			shutil.rmtree(temp_uri)
+
+		# Check results
+		self.assertEqual(expected_results.optimal_parameters, results.optimal_parameters)
+		self.assertEqual(range(6), [r.backtest_id for r in results.backtest_results])
+		for expected, result in zip(expected_results.backtest_results, results.backtest_results):
+			self.assertTrue(expected.cash.equals(result.cash))
+
+	def test_grid_search_optimizer_shares_indicators(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 11],
+			"ma_short_window"   : [2, 5, 4],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily")
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+
+		# Check each distinct moving average is only computed once for the 44 scenarios
+		self.assertEqual(44, len(results.backtest_results))
+		self.assertEqual(11 + 4, len(optimizer.indicator_cache.file_names))
+		optimizer.close()
+		self.assertIsNone(optimizer.indicator_cache)
+
+		# Check the shared indicators trade the same as indicators computed from the history window
+		for backtest_id in [0, 21, 43]:
+			trading_algorithm = TradingAlgorithm.create_trading_algorithm(self.algorithm_uri, self.tickers,
+				self.history_window, results.parameter_sets[backtest_id])
+			backtester = Backtester(backtest_id, trading_algorithm, 10000, 0.0, [0.0001])
+			backtest_results = backtester.run(self.data, self.start_date, self.end_date)
+			self.assertTrue(np.allclose(backtest_results.portfolio_value,
+				results.backtest_results[backtest_id].portfolio_value))
+
+	def test_indicator_cache_matches_history_window(self):
+		# Load market data, the long moving averages span more than the history window
+		history_window = 5
+		data = self.load_market_data(self.start_date, history_window)
+
+		# Check every cached indicator value matches the value computed from the history window ending at it
+		ticker_data = data['SPY']
+		for indicator in [('rolling_mean', 'Close', 30), ('rolling_std', 'Close', 30), ('exponential_mean', 'Close', 30),
+			('rolling_mean', 'Close', 3)]:
+			cached = indicators.compute_indicator(ticker_data, indicator, history_window + 1)
+			for position in range(1, len(ticker_data)):
+				window_data = ticker_data[max(0, position - history_window):position + 1]
+				self.assertTrue(np.isclose(cached[position], indicators.current_indicator(window_data, indicator)))
+
+		optimization_parameters = {
+			"ma_long_window"    : [30, 30, 1],
+			"ma_short_window"   : [2, 3, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Create trading algorithm
+		trading_algorithm = TradingAlgorithm.create_trading_algorithm(self.algorithm_uri, self.tickers,
+			history_window, None)
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", True, optimization_parameters, "daily")
+		results = optimizer.run(data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Check the optimizer trades like backtests of the same parameters
+		for backtest_id, parameters in enumerate(results.parameter_sets):
+			trading_algorithm = TradingAlgorithm.create_trading_algorithm(self.algorithm_uri, self.tickers,
+				history_window, parameters)
+			backtester = Backtester(backtest_id, trading_algorithm, 10000, 0.0, [0.0001])
+			backtest_results = backtester.run(data, self.start_date, self.end_date)
+			self.assertTrue(np.allclose(backtest_results.portfolio_value,
+				results.backtest_results[backtest_id].portfolio_value))
+
+	def test_sorted_metric_indices(self):
+		optimization_metrics = [0.5, np.nan, -1.0, 2.0, 0.5, np.inf]
+
+		# Check failed metrics rank last in both directions and ties keep their order
+		self.assertEqual([2, 0, 4, 3, 5, 1], Optimizer.get_sorted_metric_indices(optimization_metrics, 6, True))
+		self.assertEqual([5, 3, 0, 4, 2, 1], Optimizer.get_sorted_metric_indices(optimization_metrics, 6, False))
+		self.assertEqual([2, 0], Optimizer.get_sorted_metric_indices(optimization_metrics, 2, True))
+		self.assertEqual([5, 3, 0], Optimizer.get_sorted_metric_indices(optimization_metrics, 3, False))
+
+		# Check the top results of many scenarios match a full sort
+		optimization_metrics = np.random.RandomState(0).normal(size=100000)
+		optimization_metrics[::7] = np.nan
+		top_indices = Optimizer.get_sorted_metric_indices(optimization_metrics, 10, False)
+		finite_indices = np.flatnonzero(~np.isnan(optimization_metrics))
+		expected = finite_indices[np.argsort(-optimization_metrics[finite_indices], kind='mergesort')][:10]
+		self.assertEqual(expected.tolist(), top_indices)
+
+	def test_pareto_front_indices(self):
+		# Two objectives to maximize and one to minimize
+		sharpe_ratios = [1.0, 2.0, 2.0, 0.5, np.nan, 2.0]
+		max_drawdowns = [-0.1, -0.3, -0.2, -0.1, -0.05, -0.2]
+		turnovers = [3.0, 1.0, 2.0, 1.0, 1.0, 2.0]
+
+		# Check dominated scenarios and failed metrics are dropped while equal scenarios are kept
+		self.assertEqual([0, 2, 5], compute_optimizer_metric.pareto_front_indices([sharpe_ratios, max_drawdowns],
+			[False, False]))
+		self.assertEqual([0, 1, 2, 3, 5], compute_optimizer_metric.pareto_front_indices(
+			[sharpe_ratios, max_drawdowns, turnovers], [False, False, True]))
+
+		# Check the front of many scenarios matches a brute force dominance check
+		for num_objectives, num_scenarios in [(2, 400), (3, 400), (3, 3000), (4, 1000)]:
+			objectives = np.round(np.random.RandomState(num_objectives).normal(size=(num_objectives, num_scenarios)),
+				1)
+			expected = []
+			for i in range(objectives.shape[1]):
+				no_worse = (objectives <= objectives[:, [i]]).all(axis=0)
+				better = (objectives < objectives[:, [i]]).any(axis=0)
+				if not (no_worse & better).any():
+					expected.append(i)
+			self.assertEqual(expected, compute_optimizer_metric.pareto_front_indices(objectives,
+				[True] * num_objectives))
+
+		# Check large fronts with many ties, where the halves of the front are merged on the remaining objectives
+		for num_objectives, num_scenarios in [(3, 3000), (4, 2000)]:
+			objectives = np.round(np.random.RandomState(num_objectives).dirichlet(np.ones(num_objectives),
+				num_scenarios).T * 30)
+			expected = []
+			for i in range(objectives.shape[1]):
+				no_worse = (objectives <= objectives[:, [i]]).all(axis=0)
+				better = (objectives < objectives[:, [i]]).any(axis=0)
+				if not (no_worse & better).any():
+					expected.append(i)
+			self.assertTrue(len(expected) > 200)
+			self.assertEqual(expected, compute_optimizer_metric.pareto_front_indices(objectives,
+				[True] * num_objectives))
+
+	def test_grid_search_optimizer_multiple_objectives(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 6, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [-0.2, 0.4, 3]
+		}
+		objectives = ["sharpe_ratio", "max_drawdown", "turnover"]
+		objectives_ascending = [False, False, True]
+
+		# Setup and run the optimizer in both result modes
+		all_results = []
+		for result_mode in ['full', 'summary']:
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+				objectives, objectives_ascending, optimization_parameters, "daily",
+				optimizer_options={'result_mode': result_mode})
+			all_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+			optimizer.close()
+		results, summary_results = all_results
+
+		# Check the front matches the one of the separately computed metrics
+		objective_metrics = [[compute_optimizer_metric.compute_optimizer_metric(objective, r, "daily")
+			for r in results.backtest_results] for objective in objectives]
+		pareto_front = compute_optimizer_metric.pareto_front_indices(objective_metrics, objectives_ascending)
+		self.assertEqual(pareto_front, results.pareto_front)
+		self.assertEqual(pareto_front, summary_results.pareto_front)
+		self.assertTrue(0 < len(pareto_front) < len(results.backtest_results))
+		self.assertEqual([results.parameter_sets[i] for i in pareto_front], results.pareto_parameter_sets)
+
+		# Check the optimal parameters have the best Sharpe ratio on the front
+		sharpe_ratios = results.get_optimization_metrics("sharpe_ratio", "daily")
+		best_idx = pareto_front[int(np.nanargmax(sharpe_ratios[pareto_front]))]
+		self.assertEqual(results.parameter_sets[best_idx], results.optimal_parameters)
+		self.assertEqual(results.optimal_parameters, summary_results.optimal_parameters)
+
+	def test_grid_search_optimizer_shards_merge(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 6, 3],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [-0.2, 0.4, 3]
+		}
+		objectives = ["sharpe_ratio", "max_drawdown"]
+		objectives_ascending = [False, False]
+
+		with WorkerPool(2, self.algorithm_uri) as worker_pool:
+			for result_mode in ['full', 'summary']:
+				options = {'result_mode': result_mode, 'top_n_results': 3}
+
+				# Run the whole grid, then the same grid in three shards
+				optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+					objectives, objectives_ascending, optimization_parameters, "daily", worker_pool=worker_pool,
+					optimizer_options=options)
+				expected_results = optimizer.run(self.data, self.start_date, self.end_date)
+
+				shard_results = []
+				for shard in ['0/3', '1/3', '2/3']:
+					optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+						objectives, objectives_ascending, optimization_parameters, "daily", worker_pool=worker_pool,
+						optimizer_options=dict(options, shard=shard))
+					shard_results.append(optimizer.run(self.data, self.start_date, self.end_date))
+				results = OptimizationResults.merge(shard_results, objectives, objectives_ascending, "daily")
+
+				# Check the shards are disjoint slices of the grid and merge back into the whole grid
+				self.assertEqual(27, sum(len(r.parameter_sets) for r in shard_results))
+				self.assertTrue(all(len(r.parameter_sets) > 0 for r in shard_results))
+				self.assertEqual(list(expected_results.parameter_sets), list(results.parameter_sets))
+				self.assertEqual(expected_results.optimal_parameters, results.optimal_parameters)
+				self.assertEqual(expected_results.pareto_front, results.pareto_front)
+				self.assertEqual([r.backtest_id for r in expected_results.backtest_results],
+					[r.backtest_id for r in results.backtest_results])
+				self.assertEqual([r.portfolio_value.iloc[-1] for r in expected_results.backtest_results],
+					[r.portfolio_value.iloc[-1] for r in results.backtest_results])
+
+		# Check overlapping, missing and mismatched shards are rejected
+		self.assertEqual([(i, 3) for i in range(3)], [r.shard for r in shard_results])
+		self.assertRaises(ValueError, OptimizationResults.merge, [shard_results[0], shard_results[0]], objectives,
+			objectives_ascending, "daily")
+		self.assertRaises(ValueError, OptimizationResults.merge, shard_results[:2], objectives,
+			objectives_ascending, "daily")
+		self.assertRaises(ValueError, OptimizationResults.merge, [expected_results], objectives,
+			objectives_ascending, "daily")
+		other_space = ParameterSpace(dict(optimization_parameters, close_long=[-0.2, 0.6, 3]))
+		shard_results[2].parameter_sets = ParameterGrid(other_space, shard_results[2].parameter_sets.indices)
+		self.assertRaises(ValueError, OptimizationResults.merge, shard_results, objectives,
+			objectives_ascending, "daily")
+		self.assertRaises(ValueError, GridSearchOptimizer.parse_shard, '3/3')
+
+	def test_optimization_results_cache_metrics(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 4],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily")
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Check the cached metrics match the metric of every single backtest
+		sharpe_ratios = results.get_optimization_metrics("sharpe_ratio", "daily")
+		self.assertIs(sharpe_ratios, results.get_optimization_metrics("Sharpe_Ratio", "Daily"))
+		for sharpe_ratio, backtest_result in zip(sharpe_ratios, results.backtest_results):
+			self.assertAlmostEqual(compute_optimizer_metric.compute_optimizer_metric("sharpe_ratio", backtest_result,
+				"daily"), sharpe_ratio, places=10)
+
+		# Check the ranking agrees with the optimal parameters
+		top_indices = results.get_top_n_indices(3, "sharpe_ratio", False, "daily")
+		self.assertEqual(results.optimal_parameters, results.parameter_sets[top_indices[0]])
+		self.assertEqual(sorted(sharpe_ratios[~np.isnan(sharpe_ratios)], reverse=True)[:3],
+			sharpe_ratios[top_indices].tolist())
+
+	def test_optimization_results_columnar_archive(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 4],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Setup and run the optimizer
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily")
+		results = optimizer.run(self.data, self.start_date, self.end_date)
+		optimizer.close()
+
+		# Store the results and the scenarios alone in small chunks
+		archive_dir = tempfile.mkdtemp()
+		try:
+			archive = ResultsArchive(results.write_columnar(os.path.join(archive_dir, 'results')))
+			chunked_archive = ResultsArchive(ResultsArchive.write(os.path.join(archive_dir, 'chunked'),
+				results.backtest_results, chunk_size=5))
+
+			# Check the parameter table and its metrics
+			parameters = archive.parameters()
+			self.assertEqual(len(results.parameter_sets), len(parameters))
+			self.assertEqual(list(results.parameter_sets[5].values()),
+				[parameters[name][5] for name in results.parameter_sets[5].keys()])
+			self.assertTrue(np.allclose(results.get_optimization_metrics("sharpe_ratio", "daily"),
+				parameters['sharpe_ratio'], equal_nan=True))
+			self.assertEqual(results.optimal_parameters, results.parameter_sets[archive.optimal_index])
+
+			# Check single columns and scenarios read back like the original results
+			for stored in [archive, chunked_archive]:
+				self.assertEqual(len(results.backtest_results), stored.num_scenarios)
+				log_returns = stored.column('log_returns', [7, 3])
+				self.assertTrue(np.allclose(results.backtest_results[7].log_returns.values, log_returns[0],
+					equal_nan=True))
+				self.assertTrue(np.allclose(results.backtest_results[3].log_returns.values, log_returns[1],
+					equal_nan=True))
+				self.assertEqual(list(range(len(results.backtest_results))), stored.backtest_ids().tolist())
+
+				scenario = stored.scenario(6)
+				self.assertEqual(results.backtest_results[6].backtest_id, scenario.backtest_id)
+				self.assertTrue(np.allclose(results.backtest_results[6].portfolio_value.values,
+					scenario.portfolio_value.values))
+				self.assertEqual([len(t) for t in results.backtest_results[6].transactions],
+					[len(t) for t in scenario.transactions])
+				self.assertEqual(sum(len(t) for r in results.backtest_results for t in r.transactions),
+					len(stored.transactions()))
+		finally:
+			shutil.rmtree(archive_dir)
+
+	def test_grid_search_optimizer_spills_results_to_disk(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 4],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Run the same grid in memory and spilled to disk
+		sink_dir = tempfile.mkdtemp()
+		try:
+			with WorkerPool(2) as worker_pool:
+				optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+					"sharpe_ratio", False, optimization_parameters, "daily", worker_pool=worker_pool)
+				results = optimizer.run(self.data, self.start_date, self.end_date)
+				optimizer.close()
+
+				optimizer = of.create_optimizer(2, "GridSearchOptimizer", self.trading_algorithm, 0.0, [0.0001],
+					"sharpe_ratio", False, optimization_parameters, "daily", worker_pool=worker_pool,
+					optimizer_options={'result_sink_uri': sink_dir, 'top_n_results': 3})
+				sink_results = optimizer.run(self.data, self.start_date, self.end_date)
+				optimizer.run(self.data, self.start_date, self.end_date)
+				optimizer.close()
+
+			# Check every run got a sink, which the optimizer closed without deleting its files
+			sink = sink_results.backtest_results
+			self.assertTrue(isinstance(sink, MemmapResultSink))
+			self.assertEqual(2, len(optimizer.result_sinks))
+			self.assertTrue(all(s.transactions_file is None for s in optimizer.result_sinks))
+			self.assertEqual(2, len(os.listdir(sink_dir)))
+
+			# Check the sink only keeps the top results in memory and reads the others back from disk
+			self.assertEqual(results.optimal_parameters, sink_results.optimal_parameters)
+			self.assertEqual(3, len(sink.top_results))
+			self.assertIn(list(results.parameter_sets).index(results.optimal_parameters), sink.top_results)
+			self.assertTrue(np.allclose(results.get_optimization_metrics("sharpe_ratio", "daily"),
+				sink_results.get_optimization_metrics("sharpe_ratio", "daily"), equal_nan=True))
+			self.assertTrue(np.allclose(results.get_optimization_metrics("sharpe_ratio", "daily"), sink.metrics,
+				equal_nan=True))
+			for result, sink_result in zip(results.backtest_results, sink):
+				self.assertEqual(result.backtest_id, sink_result.backtest_id)
+				self.assertTrue(result.portfolio_value.equals(sink_result.portfolio_value))
+				self.assertEqual([len(t) for t in result.transactions], [len(t) for t in sink_result.transactions])
+
+			# Pickled results refer to the files of the sink
+			loaded_results = pickle.loads(pickle.dumps(sink_results))
+			self.assertTrue(results.backtest_results[4].cash.equals(loaded_results.backtest_results[4].cash))
+
+			# Check closed sinks and results on other dates than the sink's are rejected
+			self.assertRaises(ValueError, sink.put, 0, results.backtest_results[0])
+			self.trading_algorithm.set_parameters(results.optimal_parameters)
+			short_data = dict((ticker, ticker_data[:'2016-4-30']) for ticker, ticker_data in self.data.iteritems())
+			short_result = Backtester(1, self.trading_algorithm, 10000, 0.0, [0.0001]).run(short_data, self.start_date,
+				pd.to_datetime('2016-4-30'))
+			date_sink = MemmapResultSink(os.path.join(sink_dir, 'dates'), 2)
+			date_sink[0] = results.backtest_results[0]
+			self.assertRaises(ValueError, date_sink.put, 1, short_result)
+			date_sink.remove()
+
+			# Check copies for concurrent runs track their own sinks
+			self.assertEqual([], optimizer.spawn().result_sinks)
+			self.assertEqual(2, len(optimizer.result_sinks))
+
+			# Check the optimizer deletes the files of its sinks on request
+			optimizer.remove_result_sinks()
+			self.assertEqual([], os.listdir(sink_dir))
+		finally:
+			shutil.rmtree(sink_dir)
+
+	def test_parameter_space_typed_grid_values(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 12, 5, "int"],
+			"ma_type"           : {"categorical": ["simple", "exponential"]},
+			"learning_rate"     : [0.001, 0.1, 3, "log"]
+		}
+		parameter_space = ParameterSpace(optimization_parameters)
+		grid_values = dict((d.name, d.grid_values()) for d in parameter_space.dimensions)
+
+		# Check results
+		self.assertEqual([10, 11, 12], grid_values['ma_long_window'])
+		self.assertEqual(["simple", "exponential"], grid_values['ma_type'])
+		self.assertTrue(np.allclose([0.001, 0.01, 0.1], grid_values['learning_rate']))
+		self.assertEqual(18, len(GridSearchOptimizer.get_param_sets(optimization_parameters)))
+
+	def test_parameter_space_constraints(self):
+		optimization_parameters = {
+			"ma_long_window"    : [2, 6, 5],
+			"ma_short_window"   : [2, 6, 5],
+			"open_long"         : [-0.4, 0.4, 3],
+			"close_long"        : [-0.4, 0.4, 3],
+			"constraints"       : ["ma_short_window < ma_long_window", "open_long <= close_long"]
+		}
+
+		# Check infeasible grid points are pruned
+		dis_params = GridSearchOptimizer.get_param_sets(optimization_parameters)
+		self.assertEqual(10 * 6, len(dis_params))
+		for params in dis_params:
+			self.assertTrue(params['ma_short_window'] < params['ma_long_window'])
+			self.assertTrue(params['open_long'] <= params['close_long'])
+
+		# Check sampled parameter sets are feasible
+		parameter_space = ParameterSpace(optimization_parameters)
+		for params in parameter_space.sample(200, np.random.RandomState(1)):
+			self.assertTrue(params['ma_short_window'] < params['ma_long_window'])
+			self.assertTrue(params['open_long'] <= params['close_long'])
+
+		# Check constraints on unknown parameters are rejected
+		with self.assertRaises(ValueError):
+			ParameterSpace({"ma_long_window": [2, 6, 5], "constraints": ["ma_long_window > ma_window"]})
+
+		# Check constraints hold on the parameter values the trading algorithm runs with
+		trading_algorithm = TradingAlgorithm.create_trading_algorithm(
+			"support_files/MovingAverageDivergenceAlgorithm.py", ['SPY'], 20, None)
+		optimization_parameters = {
+			"ma_long_window"    : [4.9, 5.9, 2],
+			"ma_short_window"   : [4.6, 4.6, 1],
+			"open_long"         : [-0.4, -0.4, 1],
+			"close_long"        : [0.4, 0.4, 1],
+			"constraints"       : ["ma_short_window < ma_long_window"]
+		}
+		self.assertEqual(2, len(GridSearchOptimizer.get_param_sets(optimization_parameters)))
+		dis_params = GridSearchOptimizer.get_param_sets(optimization_parameters,
+			trading_algorithm.canonicalize_parameters)
+		self.assertEqual([5.9], [params['ma_long_window'] for params in dis_params])
+		self.assertFalse(ParameterSpace(optimization_parameters, trading_algorithm.canonicalize_parameters).is_feasible(
+			{'ma_long_window': 4.9, 'ma_short_window': 4.6, 'open_long': -0.4, 'close_long': 0.4}))
+
+	def test_parameter_space_index_decoding(self):
+		optimization_parameters = {
+			"ma_long_window"    : [10, 12, 3, "int"],
+			"ma_short_window"   : [2, 4, 3, "int"],
+			"close_long"        : [0.1, 0.4, 2],
+			"constraints"       : ["ma_short_window < 4"]
+		}
+		parameter_space = ParameterSpace(optimization_parameters)
+
+		# Check flat indices decode in the order of the cartesian product, the last dimension varying fastest
+		expected = list(itertools.product(*parameter_space.axes))
+		self.assertEqual(len(expected), parameter_space.grid_size)
+		for index, values in enumerate(expected):
+			self.assertEqual(dict(zip(parameter_space.names, values)), parameter_space.decode(index))
+		with self.assertRaises(IndexError):
+			parameter_space.decode(parameter_space.grid_size)
+
+		# Check feasible indices are yielded lazily in chunks
+		chunks = list(parameter_space.iter_feasible_indices(5))
+		self.assertEqual(4, len(chunks))
+		feasible_params = [parameter_space.decode(i) for i in np.concatenate(chunks)]
+		self.assertEqual(GridSearchOptimizer.get_param_sets(optimization_parameters), feasible_params)
+
+	def test_parameter_grid_is_lazy(self):
+		# A grid of 100 million points is addressed without being enumerated
+		grid = GridSearchOptimizer.get_parameter_grid({
+			"ma_long_window"    : [1, 100, 100, "int"],
+			"ma_short_window"   : [1, 100, 100, "int"],
+			"open_long"         : [0.0, 1.0, 100],
+			"close_long"        : [0.0, 1.0, 100]
+		})
+
+		# Check results
+		self.assertEqual(10 ** 8, len(grid))
+		self.assertEqual({"close_long": 0.0, "ma_long_window": 1, "ma_short_window": 1, "open_long": 0.0}, grid[0])
+		self.assertEqual({"close_long": 1.0, "ma_long_window": 100, "ma_short_window": 100, "open_long": 1.0}, grid[-1])
+		self.assertEqual(2, grid[10 ** 4 + 10 ** 2]['ma_long_window'])
+		self.assertEqual(2, grid[10 ** 4 + 10 ** 2]['ma_short_window'])
+
+	def test_parameter_space_sampling(self):
+		parameter_space = ParameterSpace({
+			"ma_long_window"    : [10, 20, 0, "int"],
+			"close_long"        : [0.1, 0.8],
+			"learning_rate"     : [0.001, 0.1, 0, "log"],
+			"unused"            : []
+		})
+		parameter_sets = parameter_space.sample(1000, np.random.RandomState(0))
+
+		# Check results
+		self.assertEqual(['close_long', 'learning_rate', 'ma_long_window'], parameter_space.names)
+		long_windows = set(p['ma_long_window'] for p in parameter_sets)
+		self.assertEqual(set(range(10, 21)), long_windows)
+		learning_rates = np.array([p['learning_rate'] for p in parameter_sets])
+		self.assertTrue(np.all((0.001 <= learning_rates) & (learning_rates <= 0.1)))
+		self.assertTrue(0.3 < np.mean(learning_rates < 0.01) < 0.7)
+
+		# Parameter values map onto unit points which map back onto them
+		for parameters in parameter_sets[:20]:
+			self.assertEqual(parameters['ma_long_window'],
+				parameter_space.from_unit(parameter_space.to_unit(parameters))['ma_long_window'])
+			self.assertAlmostEqual(parameters['learning_rate'],
+				parameter_space.from_unit(parameter_space.to_unit(parameters))['learning_rate'])
+
+		# Samples of a trust region stay inside of its box
+		lower, upper = parameter_space.trust_region(parameter_sets[:2], 0.1)
+		unit_points = np.array(parameter_space.sample_unit_points(100, np.random.RandomState(0), (lower, upper)))
+		self.assertTrue(np.all((lower <= unit_points) & (unit_points <= upper)))
+
 if __name__ == '__main__':
     unittest.main()
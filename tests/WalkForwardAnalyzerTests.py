@@ -1,10 +1,189 @@
 from tests_import import *
 import unittest
+import copy
+import pandas as pd
+import market_data
+from TradingAlgorithm import TradingAlgorithm
+from TradeDecisions import TradeDecisions
+from Backtester import Backtester
+from WalkForwardAnalyzer import WalkForwardAnalyzer
+from WorkerPool import WorkerPool
+import optimizer_factory as of
+from analytics import compute_optimizer_metric
+
+
+class _StatelessTrendAlgorithm(TradingAlgorithm):
+
+	def __init__(self, tickers, history_window, params):
+		super(_StatelessTrendAlgorithm, self).__init__(tickers, history_window, params)
+
+		# Only holds a position while the last close is above its moving average, whatever happened before
+		self.stateless_signals = True
+
+	def trade_decision(self, data):
+		trade_decisions = TradeDecisions()
+
+		for ticker in self.tickers:
+			closes = data[ticker]['Close'].values
+			above = closes[-1] > (1 + self.parameters['margin']) * closes[-int(self.parameters['ma_window']):].mean()
+			if above and not self.position_is_open[ticker]:
+				trade_decisions.add(ticker, 'open', long_or_short='long', position_percent=0.99 / len(self.tickers))
+				self.position_is_open[ticker] = True
+			elif not above and self.position_is_open[ticker]:
+				trade_decisions.add(ticker, 'close', position_percent=0.0)
+				self.position_is_open[ticker] = False
+
+		return trade_decisions
 
 
 class WalkForwardAnalyzerTests(unittest.TestCase):
     def test_walk_forward_analyzer(self):
 		self.assertTrue(False, 'Not implemented!')
 
+    def test_walk_forward_analyzer_parallel_windows(self):
+		# Initialize market data loading values
+		tickers = ['SPY']
+		ticker_types = ['']
+		data_sources = ['CSV']
+		start_date = pd.to_datetime('2014-01-01')
+		end_date = pd.to_datetime('2015-06-15')
+		history_window = 20
+		csv_data_uri = "support_files"
+
+		# Load market data, including the in-sample periods before the start date
+		data = market_data.load_market_data(tickers, ticker_types, data_sources, start_date, end_date,
+			6 * 21 + history_window, csv_data_uri)
+
+		algorithm_uri = "support_files/MovingAverageDivergenceAlgorithm.py"
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Create trading algorithm
+		trading_algorithm = TradingAlgorithm.create_trading_algorithm(algorithm_uri, tickers,
+			history_window, None)
+
+		# Run the windows one after another and all at once on the same worker pool
+		all_results = []
+		with WorkerPool(2, algorithm_uri) as worker_pool:
+			for parallel_windows in [False, True]:
+				optimizer = of.create_optimizer(2, "GridSearchOptimizer", trading_algorithm, 0.0, [0.0001],
+					"sharpe_ratio", False, optimization_parameters, "daily", worker_pool=worker_pool)
+				backtester = Backtester(-1, copy.deepcopy(trading_algorithm), 10000, 0.0, [0.0001])
+				walk_forward_analyzer = WalkForwardAnalyzer(6, 3, "monthly", optimizer, backtester,
+					parallel_windows=parallel_windows)
+				walk_forward_analyzer.run(data, start_date, end_date, 10000)
+				optimizer.close()
+				all_results.append(walk_forward_analyzer.results)
+		results, parallel_results = all_results
+
+		# Check results
+		self.assertTrue(len(results.optimization_results) > 3)
+		self.assertEqual([r.optimal_parameters for r in results.optimization_results],
+			[r.optimal_parameters for r in parallel_results.optimization_results])
+		for result, parallel_result in zip(results.backtest_results, parallel_results.backtest_results):
+			self.assertTrue(result.cash.equals(parallel_result.cash))
+
+    def test_walk_forward_analyzer_reuses_return_streams(self):
+		# Initialize market data loading values
+		tickers = ['SPY']
+		ticker_types = ['']
+		data_sources = ['CSV']
+		start_date = pd.to_datetime('2014-01-01')
+		end_date = pd.to_datetime('2015-06-15')
+		history_window = 20
+		csv_data_uri = "support_files"
+
+		# Load market data, including the in-sample periods before the start date
+		data = market_data.load_market_data(tickers, ticker_types, data_sources, start_date, end_date,
+			6 * 21 + history_window, csv_data_uri)
+
+		algorithm_uri = "support_files/MovingAverageDivergenceAlgorithm.py"
+		optimization_parameters = {
+			"ma_long_window"    : [10, 20, 3],
+			"ma_short_window"   : [2, 5, 2],
+			"open_long"         : [-0.25, -0.25, 1],
+			"close_long"        : [0.4, 0.4, 1]
+		}
+
+		# Create trading algorithm and treat its signals as stateless
+		trading_algorithm = TradingAlgorithm.create_trading_algorithm(algorithm_uri, tickers,
+			history_window, None)
+		trading_algorithm.stateless_signals = True
+
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", trading_algorithm, 0.0, [0.0001],
+			["sharpe_ratio", "max_drawdown"], [False, False], optimization_parameters, "daily")
+		backtester = Backtester(-1, copy.deepcopy(trading_algorithm), 10000, 0.0, [0.0001])
+		walk_forward_analyzer = WalkForwardAnalyzer(6, 3, "monthly", optimizer, backtester,
+			reuse_return_streams=True)
+		walk_forward_analyzer.run(data, start_date, end_date, 10000)
+		optimizer.close()
+		results = walk_forward_analyzer.results
+		sample_periods = walk_forward_analyzer.create_sample_periods(data, start_date, end_date, 6, 3, "monthly")
+
+		# Check every window's metrics against backtest results sliced to its tradable in-sample dates
+		self.assertEqual(len(results.optimization_results), len(sample_periods))
+		for periods, optimization_results in zip(sample_periods, results.optimization_results):
+			in_start_date, in_end_date = periods['in']
+			first_date = WalkForwardAnalyzer.first_tradable_date(data, in_start_date, in_end_date, history_window)
+			sharpe_ratios = optimization_results.get_optimization_metrics("sharpe_ratio", "daily")
+			for backtest_result, sharpe_ratio in zip(optimization_results.backtest_results, sharpe_ratios):
+				expected = compute_optimizer_metric.optimizer_analytics.sharpe_ratio(
+					backtest_result.log_returns[first_date:in_end_date][1:], "daily")
+				self.assertAlmostEqual(sharpe_ratio, expected)
+
+			optimal_idx = list(optimization_results.parameter_sets).index(optimization_results.optimal_parameters)
+			self.assertIn(optimal_idx, optimization_results.pareto_front)
+
+		# Stateful trading algorithms can not reuse return streams
+		trading_algorithm.stateless_signals = False
+		optimizer = of.create_optimizer(2, "GridSearchOptimizer", trading_algorithm, 0.0, [0.0001],
+			"sharpe_ratio", False, optimization_parameters, "daily")
+		walk_forward_analyzer = WalkForwardAnalyzer(6, 3, "monthly", optimizer, backtester,
+			reuse_return_streams=True)
+		self.assertRaises(ValueError, walk_forward_analyzer.run, data, start_date, end_date, 10000)
+		optimizer.close()
+
+    def test_walk_forward_analyzer_reused_return_streams_match_sequential(self):
+		# Initialize market data loading values
+		tickers = ['SPY']
+		ticker_types = ['']
+		data_sources = ['CSV']
+		start_date = pd.to_datetime('2014-01-01')
+		end_date = pd.to_datetime('2015-06-15')
+		history_window = 20
+		csv_data_uri = "support_files"
+
+		# Load market data, including the in-sample periods before the start date
+		data = market_data.load_market_data(tickers, ticker_types, data_sources, start_date, end_date,
+			6 * 21 + history_window, csv_data_uri)
+
+		optimization_parameters = {
+			"ma_window"         : [5, 20, 4],
+			"margin"            : [-0.01, 0.01, 3]
+		}
+
+		# Run the windows one after another and from the return streams of one span with a stateless algorithm
+		trading_algorithm = _StatelessTrendAlgorithm(tickers, history_window, None)
+		all_results = []
+		for reuse_return_streams in [False, True]:
+			optimizer = of.create_optimizer(2, "GridSearchOptimizer", trading_algorithm, 0.0, [0.0001],
+				"sharpe_ratio", False, optimization_parameters, "daily")
+			backtester = Backtester(-1, copy.deepcopy(trading_algorithm), 10000, 0.0, [0.0001])
+			walk_forward_analyzer = WalkForwardAnalyzer(6, 3, "monthly", optimizer, backtester,
+				reuse_return_streams=reuse_return_streams)
+			walk_forward_analyzer.run(data, start_date, end_date, 10000)
+			optimizer.close()
+			all_results.append(walk_forward_analyzer.results)
+		results, reused_results = all_results
+
+		# Check both modes pick the same parameters in every window
+		self.assertTrue(len(results.optimization_results) > 3)
+		self.assertEqual([r.optimal_parameters for r in results.optimization_results],
+			[r.optimal_parameters for r in reused_results.optimization_results])
+
 if __name__ == '__main__':
     unittest.main()
@@ -16,6 +16,9 @@ class MovingAverageDivergenceAlgorithm(TradingAlgorithm):
         self.prev_ma_long = 0.0
         self.prev_ma_short = 0.0
 
+        # Windows are cast to int one by one, see canonicalize_parameters
+        self.independent_canonical_parameters = True
+
     def set_parameters(self, parameters):
         TradingAlgorithm.set_parameters(self, parameters)
 
@@ -26,13 +29,28 @@ class MovingAverageDivergenceAlgorithm(TradingAlgorithm):
         #self.open_short = parameters['open_short']
         #self.close_short = parameters['close_short']
 
+    def canonicalize_parameters(self, parameters):
+        parameters = TradingAlgorithm.canonicalize_parameters(self, parameters)
+
+        # Moving average windows are only used as whole numbers of observations
+        parameters['ma_long_window'] = int(parameters['ma_long_window'])
+        parameters['ma_short_window'] = int(parameters['ma_short_window'])
+
+        return parameters
+
+    def indicators(self, parameters):
+        parameters = self.canonicalize_parameters(parameters)
+
+        return [('rolling_mean', 'Close', parameters['ma_long_window']),
+            ('rolling_mean', 'Close', parameters['ma_short_window'])]
+
     def trade_decision(self, data):
         trade_decisions = TradeDecisions()
 
         for ticker in self.tickers:
             # Compute moving average difference
-            ma_long = data[ticker][-self.ma_long_window:]['Close'].mean()
-            ma_short = data[ticker][-self.ma_short_window:]['Close'].mean()
+            ma_long = self.indicator(ticker, data[ticker], ('rolling_mean', 'Close', self.ma_long_window))
+            ma_short = self.indicator(ticker, data[ticker], ('rolling_mean', 'Close', self.ma_short_window))
             ma_diff = ma_long - ma_short
 
             # Monitor moving average crosses
@@ -11,6 +11,7 @@ lib_paths =\
         os.path.abspath('../tradesimpy/optimizers/'),
         os.path.abspath('../tradesimpy/optimizers/analytics/'),
         os.path.abspath('../tradesimpy/walk_forward_analyzer/'),
+        os.path.abspath('../tradesimpy/monte_carlo/'),
         os.path.abspath('../tradesimpy/configurations/'),
         os.path.abspath('../tradesimpy/trading_algorithm/'),
     ]
@@ -0,0 +1,177 @@
+import os
+import uuid
+import copy
+import inspect
+import contextlib
+import hashlib
+import sqlite3
+import threading
+import pickle
+import pandas as pd
+import logging as log
+from datetime import datetime
+
+
+class BacktestResultStore(object):
+
+    # Completed backtests are written in batches, one blob and one index transaction per batch
+    FLUSH_SIZE = 256
+
+    # Bumping the engine version invalidates every stored backtest, e.g. when an upgraded dependency changes results
+    ENGINE_VERSION = 1
+
+    # Modules of the backtesting engine, editing their source also invalidates every stored backtest
+    ENGINE_MODULES = ['Backtester', 'BacktestResults', 'TradeDecision', 'TradeDecisions', 'TradingAlgorithm',
+        'indicators']
+
+    def __init__(self, store_uri, flush_size=None):
+        # Completed backtests are indexed in SQLite, their pickled results are packed into a directory of blobs
+        self.store_uri = store_uri
+        self.blob_uri = os.path.join(store_uri, 'blobs')
+        if not os.path.isdir(self.blob_uri):
+            os.makedirs(self.blob_uri)
+
+        # Optimizers running concurrently, e.g. walk forward windows, share the store
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(os.path.join(store_uri, 'index.sqlite'), check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS backtests (scenario_key TEXT NOT NULL, kind TEXT NOT NULL, '
+            'blob_name TEXT NOT NULL, created TEXT NOT NULL, blob_offset INTEGER NOT NULL DEFAULT 0, '
+            'PRIMARY KEY (scenario_key, kind))')
+
+        # Stores written before results were packed hold one result per blob, at offset zero
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(backtests)')]
+        if 'blob_offset' not in columns:
+            self.connection.execute('ALTER TABLE backtests ADD COLUMN blob_offset INTEGER NOT NULL DEFAULT 0')
+        self.connection.commit()
+
+        self.flush_size = flush_size or BacktestResultStore.FLUSH_SIZE
+        self.pending = {}
+        self.algorithm_fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+    def scenario_key(self, trading_algorithm, parameters, data_fingerprint, start_date, end_date, cash, commission,
+        ticker_spreads):
+        # Scenarios are identified by everything which can change the outcome of a backtest
+        key = hashlib.sha1()
+        key.update(self._algorithm_fingerprint(trading_algorithm))
+        key.update(repr(sorted(trading_algorithm.canonicalize_parameters(parameters).items())))
+        key.update(data_fingerprint)
+        key.update(repr((str(start_date), str(end_date), float(cash), float(commission), list(ticker_spreads))))
+
+        return key.hexdigest()
+
+    def get(self, scenario_key, kinds, backtest_id):
+        # Return the first stored result of the given kinds, or None if the scenario was never run
+        for kind in kinds:
+            with self.lock:
+                result = self.pending.get((scenario_key, kind))
+                if result is None:
+                    row = self.connection.execute('SELECT blob_name, blob_offset FROM backtests '
+                        'WHERE scenario_key = ? AND kind = ?', (scenario_key, kind)).fetchone()
+
+            # Results which are not written yet are copied, their backtest ids belong to the runs which put them
+            if result is not None:
+                result = copy.copy(result)
+            elif row is None:
+                continue
+            else:
+                blob_uri = os.path.join(self.blob_uri, row[0])
+                if not os.path.isfile(blob_uri):
+                    log.warning('The stored backtest %s is missing its blob' % scenario_key)
+                    continue
+
+                with open(blob_uri, 'rb') as f:
+                    f.seek(row[1])
+                    result = pickle.load(f)
+
+            result.backtest_id = backtest_id
+            with self.lock:
+                self.hits += 1
+            return kind, result
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, scenario_key, kind, result):
+        # Results are held until a batch of them is complete
+        with self.lock:
+            self.pending[(scenario_key, kind)] = result
+            if len(self.pending) >= self.flush_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+
+            # Pack the batch into one blob before indexing it, renaming so readers never see a partial blob
+            blob_name = '%s.p' % uuid.uuid4().hex
+            temp_uri = os.path.join(self.blob_uri, '%s.tmp%d' % (blob_name, os.getpid()))
+            rows = []
+            created = str(datetime.now())
+            with open(temp_uri, 'wb') as f:
+                for (scenario_key, kind), result in self.pending.iteritems():
+                    rows.append((scenario_key, kind, blob_name, created, f.tell()))
+                    pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_uri, os.path.join(self.blob_uri, blob_name))
+
+            self.connection.executemany('INSERT OR REPLACE INTO backtests (scenario_key, kind, blob_name, created, '
+                'blob_offset) VALUES (?, ?, ?, ?, ?)', rows)
+            self.connection.commit()
+            self.pending = {}
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def open_store(store_uri):
+        # Yield the store when one is configured and None otherwise, the store is closed however the block exits
+        if store_uri is None:
+            yield None
+            return
+
+        with BacktestResultStore(store_uri) as result_store:
+            yield result_store
+
+    def _algorithm_fingerprint(self, trading_algorithm):
+        # Only read the algorithm's source once per store
+        algorithm_key = (type(trading_algorithm), tuple(trading_algorithm.tickers), trading_algorithm.history_window)
+        if algorithm_key not in self.algorithm_fingerprints:
+            self.algorithm_fingerprints[algorithm_key] = BacktestResultStore.algorithm_fingerprint(trading_algorithm)
+
+        return self.algorithm_fingerprints[algorithm_key]
+
+    @staticmethod
+    def algorithm_fingerprint(trading_algorithm):
+        # Editing the source of the algorithm, its base classes or the engine invalidates its stored backtests
+        cls = type(trading_algorithm)
+        source_files = [inspect.getsourcefile(base) for base in inspect.getmro(cls) if base is not object]
+        source_files += [inspect.getsourcefile(__import__(name)) for name in BacktestResultStore.ENGINE_MODULES]
+
+        sources = []
+        for source_file in sorted(set(os.path.abspath(source_file) for source_file in source_files)):
+            with open(source_file, 'rb') as f:
+                sources.append(f.read())
+
+        return hashlib.sha1(repr((BacktestResultStore.ENGINE_VERSION, cls.__name__, sources,
+            list(trading_algorithm.tickers), trading_algorithm.history_window))).hexdigest()
+
+    @staticmethod
+    def data_fingerprint(data):
+        fingerprint = hashlib.sha1()
+        for ticker in sorted(data.keys()):
+            fingerprint.update(ticker)
+            fingerprint.update(repr(list(data[ticker].columns)))
+            fingerprint.update(pd.util.hash_pandas_object(data[ticker], index=True).values.tostring())
+
+        return fingerprint.hexdigest()
@@ -3,33 +3,68 @@ import numpy as np
 import pickle
 import logging as log
 from datetime import datetime
+import ResultsArchive as ra
 
 
 class BacktestResults(object):
 
+    # Series derived from the base series on first access, they are left out of pickles
+    DERIVED_SERIES = ('portfolio_value', 'profit_and_loss', 'discrete_returns', 'log_returns')
+
     def __init__(self, backtest_id, cash_series, invested_series, fees_series, transactions_series):
         self.backtest_id = backtest_id
 
-        # Save base time series
-        self.cash = pd.Series(cash_series.values(), cash_series.keys()).sort_index()
-        self.invested = pd.Series(invested_series.values(), invested_series.keys()).sort_index()
-        self.fees = pd.Series(fees_series.values(), fees_series.keys()).sort_index()
-        self.transactions = pd.Series(transactions_series.values(), transactions_series.keys()).sort_index()
+        # Save base time series, sorting their dates once for all of them
+        dates = pd.Index(sorted(cash_series.keys()))
+        self.cash = pd.Series([cash_series[d] for d in dates], dates)
+        self.invested = pd.Series([invested_series[d] for d in dates], dates)
+        self.fees = pd.Series([fees_series[d] for d in dates], dates)
+        self.transactions = pd.Series([transactions_series[d] for d in dates], dates)
+
+        self._derived_series = {}
+
+    @property
+    def portfolio_value(self):
+        return self._derived('portfolio_value', lambda: self.cash + self.invested)
+
+    @property
+    def profit_and_loss(self):
+        return self._derived('profit_and_loss', lambda: self.portfolio_value - self.portfolio_value.shift(1))
 
-        # Add portfolio value series
-        self.portfolio_value = pd.Series(self.cash + self.invested, cash_series.keys()).sort_index()
+    @property
+    def discrete_returns(self):
+        return self._derived('discrete_returns', lambda: self.profit_and_loss / self.portfolio_value.shift(1))
 
-        # Add profit and loss series
-        self.profit_and_loss = pd.Series(self.portfolio_value - self.portfolio_value.shift(1), cash_series.keys()).sort_index()
+    @property
+    def log_returns(self):
+        return self._derived('log_returns', lambda: np.log(self.portfolio_value / self.portfolio_value.shift(1)))
 
-        # Add discrete returns series
-        self.discrete_returns = pd.Series(self.profit_and_loss / self.portfolio_value.shift(1), cash_series.keys()).sort_index()
+    def _derived(self, name, compute):
+        # The derived series share the sorted dates of the base series, so they are neither reindexed nor sorted
+        if name not in self._derived_series:
+            self._derived_series[name] = compute()
 
-        # Add log returns series
-        self.log_returns = pd.Series(np.log(self.portfolio_value / self.portfolio_value.shift(1)), cash_series.keys()).sort_index()
+        return self._derived_series[name]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_derived_series'] = {}
+
+        return state
+
+    def __setstate__(self, state):
+        # Results pickled before the series were derived lazily still carry them as attributes
+        self.__dict__.update(state)
+        for name in BacktestResults.DERIVED_SERIES:
+            self.__dict__.pop(name, None)
+        if '_derived_series' not in self.__dict__:
+            self._derived_series = {}
 
     def save_pickle(self, file_uri):
         log.info('Storing the results...')
         pickle.dump(self, open('%s/backtest_results_%s.p' % (file_uri, datetime.now()), "wb"))
         log.info('Results stored!')
         print
+
+    def save_columnar(self, file_uri):
+        return ra.ResultsArchive.write('%s/backtest_results_%s' % (file_uri, datetime.now()), [self])
@@ -0,0 +1,195 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import BacktestResults as br
+import logging as log
+
+
+class ResultsArchive(object):
+
+    # Series stored per scenario, the equity and log return matrices are stored next to the base series so metrics
+    # can be read without rebuilding any results
+    SERIES = ('cash', 'invested', 'fees', 'portfolio_value', 'log_returns')
+    TRANSACTION_FIELDS = ('position', 'share_count', 'share_price')
+
+    def __init__(self, archive_uri):
+        # Only the index is read up front, the chunks are decompressed one column at a time when accessed
+        self.archive_uri = archive_uri
+        with open(os.path.join(archive_uri, 'index.json'), 'r') as f:
+            index = json.load(f)
+
+        self.num_scenarios = index['num_scenarios']
+        self.chunk_size = index['chunk_size']
+        self.dates = pd.to_datetime(index['dates'])
+        self.optimal_index = index['optimal_index']
+
+    @staticmethod
+    def write(archive_uri, backtest_results, parameter_sets=None, parameter_metrics=None, optimal_index=None,
+        chunk_size=1024):
+        # Scenarios are stored as rows of compressed matrices, chunk by chunk, along with tables of their
+        # transactions and of the parameter sets
+        if not os.path.isdir(archive_uri):
+            os.makedirs(archive_uri)
+
+        # Shorter series, e.g. of multi-fidelity optimizers, are padded with NaN on the dates of the longest ones
+        dates = None
+        for backtest_result in backtest_results:
+            if dates is None:
+                dates = backtest_result.cash.index
+            elif not backtest_result.cash.index.equals(dates):
+                dates = dates.union(backtest_result.cash.index)
+        if dates is None:
+            dates = pd.DatetimeIndex([])
+
+        for chunk, start in enumerate(range(0, len(backtest_results), chunk_size)):
+            ResultsArchive._write_chunk(os.path.join(archive_uri, 'chunk_%05d.npz' % chunk), \
+                backtest_results[start:start + chunk_size], start, dates)
+
+        # The parameter table has one row per parameter set, their metrics are extra columns
+        columns = {}
+        if parameter_sets is not None:
+            parameter_sets = list(parameter_sets)
+            names = sorted(set(name for parameters in parameter_sets for name in parameters))
+            for name in names:
+                columns['parameter_' + name] = ResultsArchive._column([parameters.get(name) for parameters in \
+                    parameter_sets])
+        for name, values in (parameter_metrics or {}).iteritems():
+            columns['metric_' + name] = np.asarray(values, dtype=float)
+        np.savez_compressed(os.path.join(archive_uri, 'parameters.npz'), **columns)
+
+        with open(os.path.join(archive_uri, 'index.json'), 'w') as f:
+            json.dump({
+                'num_scenarios':    len(backtest_results),
+                'chunk_size':       chunk_size,
+                'dates':            [d.isoformat() for d in dates],
+                'optimal_index':    optimal_index
+            }, f)
+
+        log.info('Stored %d scenarios in %s' % (len(backtest_results), archive_uri))
+        return archive_uri
+
+    def column(self, name, scenarios=None):
+        # Read one series of the given scenarios, or of all of them, only decompressing that series' chunks
+        if name not in ResultsArchive.SERIES:
+            raise ValueError("The results archive has no series %s." % name)
+
+        rows = np.arange(self.num_scenarios) if scenarios is None else np.asarray(scenarios, dtype=np.int64)
+        matrix = np.empty((len(rows), len(self.dates)))
+        for chunk, positions in self._chunk_positions(rows):
+            with np.load(self._chunk_uri(chunk)) as chunk_file:
+                matrix[positions] = chunk_file[name][rows[positions] - chunk * self.chunk_size]
+
+        return matrix
+
+    def backtest_ids(self):
+        backtest_ids = []
+        for chunk in range(self._num_chunks()):
+            with np.load(self._chunk_uri(chunk)) as chunk_file:
+                backtest_ids.append(chunk_file['backtest_id'])
+
+        return np.concatenate(backtest_ids) if len(backtest_ids) > 0 else np.array([], dtype=np.int64)
+
+    def parameters(self):
+        # The parameter table along with the metric columns, one row per parameter set
+        with np.load(os.path.join(self.archive_uri, 'parameters.npz')) as parameters_file:
+            columns = dict((name, parameters_file[name]) for name in parameters_file.files)
+
+        table = pd.DataFrame(dict((name[len('parameter_'):], values) for name, values in columns.iteritems() \
+            if name.startswith('parameter_')))
+        for name, values in sorted(columns.iteritems()):
+            if name.startswith('metric_'):
+                table[name[len('metric_'):]] = values
+
+        return table
+
+    def transactions(self, scenarios=None):
+        # The transactions table of the given scenarios, or of all of them
+        rows = np.arange(self.num_scenarios) if scenarios is None else np.asarray(scenarios, dtype=np.int64)
+        tables = []
+        for chunk, positions in self._chunk_positions(rows):
+            with np.load(self._chunk_uri(chunk)) as chunk_file:
+                names = ('scenario', 'date', 'ticker') + ResultsArchive.TRANSACTION_FIELDS
+                table = pd.DataFrame(dict((name, chunk_file['transaction_' + name]) for name in names), columns=names)
+            tables.append(table[table['scenario'].isin(rows[positions])])
+
+        if len(tables) == 0:
+            return pd.DataFrame(columns=('scenario', 'date', 'ticker') + ResultsArchive.TRANSACTION_FIELDS)
+
+        table = pd.concat(tables, ignore_index=True)
+        table['date'] = self.dates[table['date'].values]
+        return table
+
+    def scenario(self, scenario):
+        # Rebuild the results of one scenario from its chunk only
+        chunk = scenario // self.chunk_size
+        with np.load(self._chunk_uri(chunk)) as chunk_file:
+            row = scenario - chunk * self.chunk_size
+            backtest_id = int(chunk_file['backtest_id'][row])
+            series = dict((name, chunk_file[name][row]) for name in ('cash', 'invested', 'fees'))
+
+        valid = ~np.isnan(series['cash'])
+        dates = self.dates[valid]
+        transactions = dict((date, {}) for date in dates)
+        for record in self.transactions([scenario]).itertuples(index=False):
+            transactions[record.date][record.ticker] = dict((name, getattr(record, name)) for name in \
+                ResultsArchive.TRANSACTION_FIELDS)
+
+        return br.BacktestResults(backtest_id, dict(zip(dates, series['cash'][valid])), \
+            dict(zip(dates, series['invested'][valid])), dict(zip(dates, series['fees'][valid])), transactions)
+
+    def _num_chunks(self):
+        return int(np.ceil(float(self.num_scenarios) / self.chunk_size))
+
+    def _chunk_uri(self, chunk):
+        return os.path.join(self.archive_uri, 'chunk_%05d.npz' % chunk)
+
+    def _chunk_positions(self, rows):
+        # Group the positions of the requested rows by the chunk holding them
+        if len(rows) > 0 and (rows.min() < 0 or rows.max() >= self.num_scenarios):
+            raise IndexError("The results archive holds %d scenarios." % self.num_scenarios)
+
+        chunks = rows // self.chunk_size
+        for chunk in np.unique(chunks):
+            yield chunk, np.flatnonzero(chunks == chunk)
+
+    @staticmethod
+    def _write_chunk(chunk_uri, backtest_results, first_scenario, dates):
+        columns = {'backtest_id': np.array([result.backtest_id for result in backtest_results], dtype=np.int64)}
+        for name in ResultsArchive.SERIES:
+            columns[name] = np.vstack([ResultsArchive._aligned(getattr(result, name), dates).astype(float) \
+                for result in backtest_results])
+
+        # One row per transaction, dates are stored as positions into the archive's dates
+        records = []
+        for row, result in enumerate(backtest_results):
+            positions = dates.get_indexer(result.transactions.index)
+            for position, transactions in zip(positions, result.transactions.values):
+                for ticker, transaction in transactions.iteritems():
+                    records.append((first_scenario + row, position, ticker) + tuple(transaction[name] for name in \
+                        ResultsArchive.TRANSACTION_FIELDS))
+
+        records = zip(*records) if len(records) > 0 else [[]] * (3 + len(ResultsArchive.TRANSACTION_FIELDS))
+        columns['transaction_scenario'] = np.array(records[0], dtype=np.int64)
+        columns['transaction_date'] = np.array(records[1], dtype=np.int64)
+        columns['transaction_ticker'] = ResultsArchive._column(records[2])
+        for name, values in zip(ResultsArchive.TRANSACTION_FIELDS, records[3:]):
+            columns['transaction_' + name] = np.array(values, dtype=float)
+
+        np.savez_compressed(chunk_uri, **columns)
+
+    @staticmethod
+    def _aligned(series, dates):
+        if series.index.equals(dates):
+            return series.values
+
+        return series.reindex(dates).values
+
+    @staticmethod
+    def _column(values):
+        # Object columns would need pickling, so mixed or text values are stored as strings
+        column = np.array(values)
+        if column.dtype == object:
+            column = column.astype(str)
+
+        return column
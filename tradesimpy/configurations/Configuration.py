@@ -25,6 +25,8 @@ class Configuration(object):
         self.ticker_spreads = config_data['ticker_spreads']
         self.commission = float(config_data['commission'])
         self.history_window = int(config_data['history_window'])
+        self.result_store_uri = config_data.get('result_store_uri')
+        self.results_format = config_data.get('results_format', 'pickle')
 
         # Validate input parameters
         if(not self.results_uri):
@@ -49,6 +51,8 @@ class Configuration(object):
             raise ValueError("Input data_sources in Configuration is invalid.")
         if(len(self.tickers) != len(self.ticker_types) and len(self.ticker) != len(self.ticker_series_names) and len(self.tickers) != len(self.data_sources)):
             raise ValueError("Input tickers, ticker_types, ticker_series_names, and data_source in Configuration must be equal in count.")
+        if(self.results_format not in ('pickle', 'columnar')):
+            raise ValueError("Input results_format in Configuration must be pickle or columnar.")
         if(self.start_date > self.end_date):
             raise ValueError("Input start_date must be less than or equal to end_date.")
 
@@ -75,3 +79,5 @@ class Configuration(object):
             print('                                  %s' % (data_source))
         print('Commission:                       %s' % (self.commission))
         print('History window:                   %s' % (self.history_window))
+        print('Result store URI:                 %s' % (self.result_store_uri))
+        print('Results format:                   %s' % (self.results_format))
@@ -0,0 +1,49 @@
+from Configuration import Configuration
+import json
+
+
+class MonteCarloConfiguration(Configuration):
+    def __init__(self, config_uri):
+        super(MonteCarloConfiguration, self).__init__(config_uri)
+
+        # Read config data
+        with open(config_uri, mode='r') as f:
+            config_data = json.loads(f.read())
+
+        # Define data members
+        self.cash = float(config_data['cash'])
+        self.algorithm_parameters = config_data['algorithm_parameters']
+        self.num_processors = int(config_data['num_processors'])
+        self.num_simulations = int(config_data.get('num_simulations', 10000))
+        self.simulation_method = config_data.get('simulation_method', 'bootstrap')
+        self.block_length = int(config_data.get('block_length', 1))
+        self.seed = config_data.get('seed')
+
+        # Validate input parameters
+        if(not self.cash):
+            raise ValueError("Input cash in Configuration is invalid.")
+        if(not self.algorithm_parameters):
+            raise ValueError("Input algorithm_parameters in MonteCarloConfiguration is invalid.")
+        if(not self.num_processors):
+            raise ValueError("Input num_processors in MonteCarloConfiguration is invalid.")
+        if(self.num_simulations < 1):
+            raise ValueError("Input num_simulations in MonteCarloConfiguration is invalid.")
+        if(self.simulation_method not in ('bootstrap', 'permutation')):
+            raise ValueError("Input simulation_method in MonteCarloConfiguration is invalid.")
+        if(self.block_length < 1):
+            raise ValueError("Input block_length in MonteCarloConfiguration is invalid.")
+
+    def __str__(self):
+        super(MonteCarloConfiguration, self).__str__()
+
+        print('Cash:                             %s' % (self.cash))
+        print('Algorithm parameters:')
+        for name, value in self.algorithm_parameters.iteritems():
+            print('                                  %s : %s' % (name, value))
+        print('Number of processors:             %s' % (self.num_processors))
+        print('Number of simulations:            %s' % (self.num_simulations))
+        print('Simulation method:                %s' % (self.simulation_method))
+        print('Block length:                     %s' % (self.block_length))
+        print('Seed:                             %s' % (self.seed))
+        print('***************************************************************************')
+        print
@@ -14,8 +14,16 @@ class OptimizationConfiguration(Configuration):
         self.num_processors = int(config_data['num_processors'])
         self.optimizer_name = config_data['optimizer_name']
         self.optimization_metric = config_data['optimization_metric']
-        self.optimization_metric_ascending = bool(config_data['optimization_metric_ascending'])
+        self.optimization_metric_ascending = config_data['optimization_metric_ascending']
         self.optimization_parameters = config_data['optimization_parameters']
+        self.optimizer_options = config_data.get('optimizer_options', {})
+        self.distributed_workers = config_data.get('distributed_workers')
+
+        # Several metrics may be optimized together, each with its own ascending flag
+        if isinstance(self.optimization_metric_ascending, list):
+            self.optimization_metric_ascending = [bool(ascending) for ascending in self.optimization_metric_ascending]
+        else:
+            self.optimization_metric_ascending = bool(self.optimization_metric_ascending)
 
         # Validate input parameters
         if(not self.num_processors):
@@ -39,5 +47,12 @@ class OptimizationConfiguration(Configuration):
         print('Optimization parameters:')
         for name, value in self.optimization_parameters.iteritems():
             print('                                  %s : %s' % (name, value))
+        print('Optimizer options:')
+        for name, value in self.optimizer_options.iteritems():
+            print('                                  %s : %s' % (name, value))
+        if self.distributed_workers is not None:
+            print('Distributed workers:')
+            for name, value in self.distributed_workers.iteritems():
+                print('                                  %s : %s' % (name, '********' if name == 'authkey' else value))
         print('**************************************************************************')
         print
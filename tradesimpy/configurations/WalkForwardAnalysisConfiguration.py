@@ -15,11 +15,21 @@ class WalkForwardAnalysisConfiguration(Configuration):
         self.num_processors = int(config_data['num_processors'])
         self.optimizer_name = config_data['optimizer_name']
         self.optimization_metric = config_data['optimization_metric']
-        self.optimization_metric_ascending = bool(config_data['optimization_metric_ascending'])
+        self.optimization_metric_ascending = config_data['optimization_metric_ascending']
         self.optimization_parameters = config_data['optimization_parameters']
+        self.optimizer_options = config_data.get('optimizer_options', {})
+        self.distributed_workers = config_data.get('distributed_workers')
         self.in_sample_periods = int(config_data['in_sample_periods'])
         self.out_of_sample_periods = int(config_data['out_of_sample_periods'])
         self.sample_period = config_data['sample_period']
+        self.parallel_windows = bool(config_data.get('parallel_windows', False))
+        self.reuse_return_streams = bool(config_data.get('reuse_return_streams', False))
+
+        # Several metrics may be optimized together, each with its own ascending flag
+        if isinstance(self.optimization_metric_ascending, list):
+            self.optimization_metric_ascending = [bool(ascending) for ascending in self.optimization_metric_ascending]
+        else:
+            self.optimization_metric_ascending = bool(self.optimization_metric_ascending)
 
         # Validate input parameters
         if(not self.cash):
@@ -52,8 +62,17 @@ class WalkForwardAnalysisConfiguration(Configuration):
         print('Optimization parameters:')
         for name, value in self.optimization_parameters.iteritems():
             print('                                  %s : %s' % (name, value))
+        print('Optimizer options:')
+        for name, value in self.optimizer_options.iteritems():
+            print('                                  %s : %s' % (name, value))
+        if self.distributed_workers is not None:
+            print('Distributed workers:')
+            for name, value in self.distributed_workers.iteritems():
+                print('                                  %s : %s' % (name, '********' if name == 'authkey' else value))
         print('In-sample periods:                %s' % (self.in_sample_periods))
         print('Out-of-sample periods:            %s' % (self.out_of_sample_periods))
         print('Sample period:                    %s' % (self.sample_period))
+        print('Parallel windows:                 %s' % (self.parallel_windows))
+        print('Reuse return streams:             %s' % (self.reuse_return_streams))
         print('***************************************************************************')
         print
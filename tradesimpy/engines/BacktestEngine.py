@@ -1,5 +1,6 @@
 from backtest_engine_import import *
 from Backtester import Backtester
+from BacktestResultStore import BacktestResultStore
 from TradingAlgorithm import TradingAlgorithm
 import market_data as market_data
 import logger
@@ -25,6 +26,26 @@ class BacktestEngine(object):
         trading_algorithm = TradingAlgorithm.create_trading_algorithm(config.algorithm_uri, config.tickers, \
             config.history_window, config.algorithm_parameters)
 
+        # Reuse the results of an identical backtest run before
+        if config.result_store_uri is not None:
+            with BacktestResultStore(config.result_store_uri) as result_store:
+                scenario_key = result_store.scenario_key(trading_algorithm, config.algorithm_parameters, \
+                    BacktestResultStore.data_fingerprint(data), config.start_date, config.end_date, config.cash, \
+                    config.commission, config.ticker_spreads)
+                stored = result_store.get(scenario_key, ['full'], 0)
+                if stored is not None:
+                    log.info('Loaded the stored backtest!')
+                    print
+                    return stored[1]
+
+                results = self._run_backtester(config, trading_algorithm, data)
+                result_store.put(scenario_key, 'full', results)
+
+                return results
+
+        return self._run_backtester(config, trading_algorithm, data)
+
+    def _run_backtester(self, config, trading_algorithm, data):
         # Setup and run the backtester
         backtester = Backtester(0, trading_algorithm, config.cash, config.commission, config.ticker_spreads)
         log.info('Running the backtester...')
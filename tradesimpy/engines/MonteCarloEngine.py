@@ -0,0 +1,33 @@
+from monte_carlo_engine_import import *
+from BacktestEngine import BacktestEngine
+from MonteCarloSimulator import MonteCarloSimulator
+import logger
+import logging as log
+
+
+class MonteCarloEngine(object):
+
+    def __init__(self):
+        pass
+
+    def run(self, config, backtest_results=None):
+        # Backtest the configured trading algorithm unless the results to simulate are handed over
+        if backtest_results is None:
+            backtest_results = BacktestEngine().run(config)
+        else:
+            logger.init_logger(config.log_uri)
+
+        # Setup and run the simulator, its worker pool is shut down once the paths are simulated
+        simulator = MonteCarloSimulator(config.num_processors, config.num_simulations, config.simulation_method, \
+            config.block_length, config.time_resolution, config.seed)
+        log.info('Running the Monte Carlo simulator...')
+        try:
+            results = simulator.run(backtest_results)
+        finally:
+            simulator.close()
+        log.info('Ran Monte Carlo simulator!')
+        print
+
+        results.log_summary()
+
+        return results
@@ -2,7 +2,9 @@ from optimization_engine_import import *
 from OptimizationConfiguration import OptimizationConfiguration
 from Optimizer import Optimizer
 from TradingAlgorithm import TradingAlgorithm
+from BacktestResultStore import BacktestResultStore
 import optimizer_factory as of
+import worker_pool_factory as wpf
 import market_data as market_data
 import logger
 import logging as log
@@ -27,13 +29,22 @@ class OptimizationEngine(object):
         trading_algorithm = TradingAlgorithm.create_trading_algorithm(config.algorithm_uri, config.tickers, \
             config.history_window)
 
-        # Setup and run the optimizer
-        optimizer = of.create_optimizer(config.num_processors, config.optimizer_name, trading_algorithm, config.commission,
-            config.ticker_spreads, config.optimization_metric, config.optimization_metric_ascending,
-            config.optimization_parameters, config.time_resolution)
-        log.info('Running the optimizer...')
-        optimizer.run(data, config.start_date, config.end_date)
-        log.info('Ran optimizer!')
-        print
+        # Consult the store of completed backtests when one is configured, start the worker pool pre-warmed with the
+        # trading algorithm, both are shut down once the optimizer is done
+        with BacktestResultStore.open_store(config.result_store_uri) as result_store, \
+            wpf.create_worker_pool(config.num_processors, config.algorithm_uri, \
+            config.distributed_workers) as worker_pool:
+            # Setup and run the optimizer
+            optimizer = of.create_optimizer(config.num_processors, config.optimizer_name, trading_algorithm,
+                config.commission, config.ticker_spreads, config.optimization_metric,
+                config.optimization_metric_ascending, config.optimization_parameters, config.time_resolution,
+                worker_pool=worker_pool, optimizer_options=config.optimizer_options, result_store=result_store)
+            log.info('Running the optimizer...')
+            try:
+                optimizer.run(data, config.start_date, config.end_date)
+            finally:
+                optimizer.close()
+            log.info('Ran optimizer!')
+            print
 
         return optimizer.results
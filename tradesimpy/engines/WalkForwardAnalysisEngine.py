@@ -1,8 +1,10 @@
 from walk_forward_analysis_engine_import import *
 from WalkForwardAnalyzer import WalkForwardAnalyzer
 from TradingAlgorithm import TradingAlgorithm
+from BacktestResultStore import BacktestResultStore
 import Backtester as b
 import optimizer_factory as of
+import worker_pool_factory as wpf
 import market_data as market_data
 import exceptions as ex
 import logger
@@ -32,22 +34,32 @@ class WalkForwardAnalysisEngine(object):
         trading_algorithm = TradingAlgorithm.create_trading_algorithm(config.algorithm_uri, config.tickers, \
             config.history_window)
 
-        # Create the optimizer
-        optimizer = of.create_optimizer(config.num_processors, config.optimizer_name, trading_algorithm, config.commission, \
-            config.ticker_spreads, config.optimization_metric, config.optimization_metric_ascending, config.optimization_parameters,
-            config.time_resolution)
+        # Consult the store of completed backtests when one is configured, start the worker pool once, it is reused
+        # by the optimizer for every in-sample period
+        with BacktestResultStore.open_store(config.result_store_uri) as result_store, \
+            wpf.create_worker_pool(config.num_processors, config.algorithm_uri, \
+            config.distributed_workers) as worker_pool:
+            # Create the optimizer
+            optimizer = of.create_optimizer(config.num_processors, config.optimizer_name, trading_algorithm, \
+                config.commission, config.ticker_spreads, config.optimization_metric, \
+                config.optimization_metric_ascending, config.optimization_parameters, config.time_resolution, \
+                worker_pool=worker_pool, optimizer_options=config.optimizer_options, result_store=result_store)
 
-        # Create the backtester
-        backtester = b.Backtester(-1, trading_algorithm, config.cash, config.commission, config.ticker_spreads)
+            # Create the backtester
+            backtester = b.Backtester(-1, trading_algorithm, config.cash, config.commission, config.ticker_spreads)
 
-        # Setup and run the walk forward analyzer
-        walk_forward_analyzer = WalkForwardAnalyzer(config.in_sample_periods, config.out_of_sample_periods, config.sample_period, \
-            optimizer, backtester)
+            # Setup and run the walk forward analyzer
+            walk_forward_analyzer = WalkForwardAnalyzer(config.in_sample_periods, config.out_of_sample_periods, \
+                config.sample_period, optimizer, backtester, parallel_windows=config.parallel_windows, \
+                reuse_return_streams=config.reuse_return_streams)
 
-        log.info('Running the walk forward analyzer...')
-        walk_forward_analyzer.run(data, config.start_date, config.end_date, config.cash)
-        log.info('Ran the walk forward analyzer!')
-        print
+            log.info('Running the walk forward analyzer...')
+            try:
+                walk_forward_analyzer.run(data, config.start_date, config.end_date, config.cash)
+            finally:
+                optimizer.close()
+            log.info('Ran the walk forward analyzer!')
+            print
 
         return walk_forward_analyzer.results
 
@@ -0,0 +1,51 @@
+import pandas as pd
+import numpy as np
+import pickle
+import logging as log
+from datetime import datetime
+
+
+class MonteCarloResults(object):
+
+    def __init__(self, method, initial_value, final_equity, max_drawdown, sharpe_ratio, observed_final_equity,
+        observed_max_drawdown, observed_sharpe_ratio):
+        # One value per simulated path
+        self.method = method
+        self.initial_value = initial_value
+        self.final_equity = final_equity
+        self.max_drawdown = max_drawdown
+        self.sharpe_ratio = sharpe_ratio
+
+        # Metrics of the backtest the paths were simulated from
+        self.observed_final_equity = observed_final_equity
+        self.observed_max_drawdown = observed_max_drawdown
+        self.observed_sharpe_ratio = observed_sharpe_ratio
+
+    @property
+    def num_simulations(self):
+        return len(self.final_equity)
+
+    @property
+    def probability_of_loss(self):
+        return np.mean(self.final_equity < self.initial_value)
+
+    def percentiles(self, percentiles=(5, 25, 50, 75, 95)):
+        # Failed metrics, e.g. the Sharpe ratio of a flat path, are left out of the distributions
+        return pd.DataFrame({
+            'final_equity':     np.nanpercentile(self.final_equity, percentiles),
+            'max_drawdown':     np.nanpercentile(self.max_drawdown, percentiles),
+            'sharpe_ratio':     np.nanpercentile(self.sharpe_ratio, percentiles)
+        }, index=list(percentiles), columns=['final_equity', 'max_drawdown', 'sharpe_ratio'])
+
+    def log_summary(self):
+        log.info('Monte Carlo %s of %d paths, probability of loss %.1f%%' % (self.method, self.num_simulations, \
+            100 * self.probability_of_loss))
+        log.info('Observed final equity %.2f, max drawdown %.4f, Sharpe ratio %.4f' % (self.observed_final_equity, \
+            self.observed_max_drawdown, self.observed_sharpe_ratio))
+        log.info('Simulated percentiles:\n%s' % self.percentiles())
+
+    def save_pickle(self, file_uri):
+        log.info('Storing the results...')
+        pickle.dump(self, open('%s/monte_carlo_results_%s.p' % (file_uri, datetime.now()), "wb"))
+        log.info('Results stored!')
+        print
@@ -0,0 +1,104 @@
+from WorkerPool import WorkerPool
+from MonteCarloResults import MonteCarloResults
+import optimizer_analytics
+import numpy as np
+import logging as log
+
+
+def _simulate_block(block_args):
+    method, log_returns, segment_ids, num_paths, block_length, seed, initial_value, frequency = block_args
+    random_state = np.random.RandomState(seed)
+    num_observations = len(log_returns)
+
+    # Every simulated path is a row of column indices into the observed returns
+    if method == 'bootstrap':
+        # Draw blocks of consecutive returns with replacement and cut the paths to the observed length
+        num_blocks = int(np.ceil(float(num_observations) / block_length))
+        starts = random_state.randint(num_observations - block_length + 1, size=(num_paths, num_blocks))
+        columns = (starts[:, :, np.newaxis] + np.arange(block_length)).reshape(num_paths, -1)[:, :num_observations]
+    else:
+        # Shuffle the order of the trades, each trade keeps the order of its own returns
+        segment_ranks = random_state.uniform(size=(num_paths, segment_ids[-1] + 1)).argsort(axis=1).argsort(axis=1)
+        columns = np.argsort(segment_ranks[:, segment_ids] * num_observations + np.arange(num_observations), axis=1)
+    return_matrix = log_returns[columns]
+
+    # Equity paths start from the initial portfolio value so drawdowns include the first return
+    equity_matrix = initial_value * np.exp(np.cumsum(np.hstack([np.zeros((num_paths, 1)), return_matrix]), axis=1))
+
+    return equity_matrix[:, -1], optimizer_analytics.max_drawdown_matrix(equity_matrix), \
+        optimizer_analytics.sharpe_ratio_matrix(return_matrix, frequency)
+
+
+class MonteCarloSimulator(object):
+
+    METHODS = ('bootstrap', 'permutation')
+
+    def __init__(self, num_processors, num_simulations=10000, method='bootstrap', block_length=1, frequency='daily',
+        seed=None, paths_per_block=1000, worker_pool=None):
+        if method not in MonteCarloSimulator.METHODS:
+            raise ValueError("The Monte Carlo method %s is not supported." % method)
+        if num_simulations < 1:
+            raise ValueError("The MonteCarloSimulator must run at least one simulation.")
+        if block_length < 1:
+            raise ValueError("The MonteCarloSimulator block length must be at least one.")
+
+        # Data members
+        self.num_simulations = num_simulations
+        self.method = method
+        self.block_length = block_length
+        self.frequency = frequency
+        self.seed = seed
+        self.paths_per_block = paths_per_block
+
+        # Reuse the caller's worker pool when given, otherwise own a pool which lives across runs
+        self.owns_worker_pool = worker_pool is None
+        if self.owns_worker_pool:
+            self.worker_pool = WorkerPool(num_processors)
+        else:
+            self.worker_pool = worker_pool
+
+    def close(self):
+        if self.owns_worker_pool:
+            self.worker_pool.close()
+
+    def run(self, backtest_results):
+        log_returns, segment_ids = self.returns_and_segments(backtest_results)
+        if len(log_returns) == 0:
+            raise ValueError("The backtest results hold no returns to simulate.")
+
+        # Split the simulations into blocks of paths, each block is one matrix computed by a worker
+        initial_value = backtest_results.portfolio_value.values[0]
+        block_length = min(self.block_length, len(log_returns))
+        num_paths = [min(self.paths_per_block, self.num_simulations - start) \
+            for start in range(0, self.num_simulations, self.paths_per_block)]
+        block_seeds = np.random.RandomState(self.seed).randint(2 ** 31 - 1, size=len(num_paths))
+        block_args = [(self.method, log_returns, segment_ids, n, block_length, block_seed, initial_value, \
+            self.frequency) for n, block_seed in zip(num_paths, block_seeds)]
+
+        blocks = self.worker_pool.map(func=_simulate_block, iterable=block_args)
+        log.info('Simulated %d paths with the %s method' % (self.num_simulations, self.method))
+
+        # Save results along with the observed backtest's metrics
+        self.results = MonteCarloResults(self.method, initial_value,
+            np.concatenate([block[0] for block in blocks]),
+            np.concatenate([block[1] for block in blocks]),
+            np.concatenate([block[2] for block in blocks]),
+            backtest_results.portfolio_value.values[-1],
+            optimizer_analytics.max_drawdown(backtest_results.portfolio_value),
+            optimizer_analytics.sharpe_ratio(backtest_results.log_returns, self.frequency))
+
+        return self.results
+
+    @staticmethod
+    def returns_and_segments(backtest_results):
+        # The first log return is undefined, days without a portfolio value do not move it
+        log_returns = backtest_results.log_returns.values[1:]
+        log_returns = np.where(np.isfinite(log_returns), log_returns, 0.0)
+
+        # A trade starts with the return after the day of its transactions and lasts until the next transactions
+        has_transactions = np.array([len(transactions) > 0 for transactions in backtest_results.transactions.values])
+        segment_ids = np.cumsum(has_transactions)[:-1]
+        if len(segment_ids) > 0:
+            segment_ids -= segment_ids[0]
+
+        return log_returns, segment_ids
@@ -0,0 +1,21 @@
+from analytics import compute_optimizer_metric
+from analytics import optimizer_analytics
+
+
+class BacktestSummary(object):
+
+    def __init__(self, backtest_results, optimization_metric, frequency):
+        self.backtest_id = backtest_results.backtest_id
+
+        # Several objectives may be given, the scenario is ranked by the first one
+        if isinstance(optimization_metric, basestring):
+            optimization_metric = [optimization_metric]
+
+        # Only keep the handful of statistics needed to rank and report a scenario
+        self.objective_metrics = [compute_optimizer_metric.compute_optimizer_metric(objective, backtest_results, \
+            frequency) for objective in optimization_metric]
+        self.optimization_metric = self.objective_metrics[0]
+        self.final_equity = backtest_results.portfolio_value[-1]
+        self.sharpe_ratio = optimizer_analytics.sharpe_ratio(backtest_results.log_returns, frequency)
+        self.max_drawdown = optimizer_analytics.max_drawdown(backtest_results.portfolio_value)
+        self.trade_count = sum(len(transactions) for transactions in backtest_results.transactions)
@@ -0,0 +1,155 @@
+from Optimizer import Optimizer
+import numpy as np
+import logging as log
+
+
+class DifferentialEvolutionOptimizer(Optimizer):
+
+    def __init__(self, num_processors, trading_algorithm, commission, ticker_spreads, optimization_metric,
+        optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, result_mode='full',
+        top_n_results=1, population_size=None, max_generations=30, max_evaluations=None, mutation=0.8,
+        crossover=0.7, tolerance=1e-6, patience=5, seed=None, num_warm_start_seeds=0, trust_region_radius=0.2,
+        max_seed_drop=0.5, result_store=None):
+        super(DifferentialEvolutionOptimizer, self).__init__(num_processors, trading_algorithm, optimization_metric,
+            optimization_metric_ascending, optimization_parameters, frequency, commission=commission,
+            ticker_spreads=ticker_spreads, worker_pool=worker_pool, result_mode=result_mode,
+            top_n_results=top_n_results, result_store=result_store)
+
+        # Data members
+        self.parameter_space = self.create_parameter_space()
+        self.population_size = population_size or max(8, 5 * len(self.parameter_space.dimensions))
+        self.max_generations = max_generations
+        self.max_evaluations = max_evaluations
+        self.mutation = mutation
+        self.crossover = crossover
+        self.tolerance = tolerance
+        self.patience = patience
+        self.seed = seed
+        self.optimization_parameter_sets = []
+        self.evaluated_ids = {}
+        self.generations_run = 0
+        self.num_warm_start_seeds = num_warm_start_seeds
+        self.trust_region_radius = trust_region_radius
+        self.max_seed_drop = max_seed_drop
+
+        if self.population_size < 4:
+            raise ValueError("The DifferentialEvolutionOptimizer population must hold at least four individuals.")
+
+    def run(self, data, start_date, end_date):
+        random_state = np.random.RandomState(self.seed)
+
+        # Initialize the evaluation cache, individuals decoding to already evaluated parameters are not re-run
+        self.optimization_parameter_sets = []
+        self.evaluated_ids = {}
+        evaluations = []
+        scores = []
+
+        # The budget counts every individual of every generation, early stopping and individuals which were already
+        # evaluated leave part of it unused
+        num_scenarios = self.population_size * (self.max_generations + 1)
+        self.start_progress(num_scenarios if self.max_evaluations is None else min(num_scenarios, \
+            self.max_evaluations))
+
+        # Seed the initial population with the previous run's top parameter sets, the rest of it is drawn from
+        # their trust region unless they lost too much of their quality
+        seed_points = np.array([self.parameter_space.to_unit(parameters) for parameters, metric in \
+            self.warm_start_seeds[:self.population_size]]).reshape(-1, len(self.parameter_space.dimensions))
+        seed_scores = self._evaluate_population(seed_points, data, start_date, end_date, evaluations, scores)
+        region = self.warm_start_region(evaluations)
+
+        # Evaluate the initial population
+        population = np.array(self.parameter_space.sample_unit_points(self.population_size - len(seed_points), \
+            random_state, region)).reshape(-1, len(self.parameter_space.dimensions))
+        population_scores = self._evaluate_population(population, data, start_date, end_date, evaluations, scores)
+        population = np.concatenate([seed_points, population])
+        population_scores = np.concatenate([seed_scores, population_scores])
+        best_score = population_scores.max()
+        stale_generations = 0
+
+        self.generations_run = 0
+        for generation in range(self.max_generations):
+            if self.max_evaluations is not None and len(evaluations) >= self.max_evaluations:
+                break
+
+            # Create trial individuals by DE/rand/1 mutation and binomial crossover
+            trials = self._trial_population(population, random_state, region)
+            trial_scores = self._evaluate_population(trials, data, start_date, end_date, evaluations, scores)
+
+            # Greedy one-to-one selection never loses an individual's best, keeping the elite in the population
+            improved = (trial_scores >= population_scores) & np.isfinite(trial_scores)
+            population[improved] = trials[improved]
+            population_scores[improved] = trial_scores[improved]
+            self.generations_run = generation + 1
+
+            # Stop early once the best individual stops improving or the population has converged
+            if population_scores.max() > best_score:
+                best_score = population_scores.max()
+                stale_generations = 0
+            else:
+                stale_generations += 1
+
+            finite_scores = population_scores[np.isfinite(population_scores)]
+            converged = len(finite_scores) == len(population_scores) and \
+                (finite_scores.max() - finite_scores.min()) <= self.tolerance * (abs(finite_scores.mean()) + 1e-12)
+            if converged or stale_generations >= self.patience:
+                log.info('Differential evolution stopped early after %d generations' % self.generations_run)
+                break
+
+        self.finish_progress()
+        log.info('Differential evolution evaluated %d unique parameter sets' % len(evaluations))
+
+        # Find optimal parameters and save results
+        return self.build_results(evaluations, data, start_date, end_date)
+
+    def _trial_population(self, population, random_state, region=None):
+        num_individuals, num_dimensions = population.shape
+        trials = np.empty_like(population)
+        lower, upper = region if region is not None else (0.0, 1.0)
+
+        for i in range(num_individuals):
+            # Pick three distinct individuals other than the target
+            candidates = [j for j in range(num_individuals) if j != i]
+            a, b, c = population[random_state.choice(candidates, 3, replace=False)]
+            mutant = np.clip(a + self.mutation * (b - c), lower, upper)
+
+            # Cross the mutant with the target, always taking at least one dimension from the mutant
+            cross = random_state.uniform(size=num_dimensions) < self.crossover
+            cross[random_state.randint(num_dimensions)] = True
+            trials[i] = np.where(cross, mutant, population[i])
+
+        return trials
+
+    def _evaluate_population(self, population, data, start_date, end_date, evaluations, scores):
+        # Decode individuals and only dispatch effective parameter sets which were not evaluated before
+        individual_keys = []
+        new_parameter_sets = []
+        for unit_point in population:
+            parameters = self.parameter_space.from_unit(unit_point)
+            key = self.parameter_key(parameters)
+            individual_keys.append(key)
+
+            # Infeasible individuals are never backtested and never win a selection
+            if not self.parameter_space.is_feasible(parameters):
+                individual_keys[-1] = None
+                continue
+
+            if key not in self.evaluated_ids:
+                self.evaluated_ids[key] = len(evaluations) + len(new_parameter_sets)
+                new_parameter_sets.append(parameters)
+
+        # Evaluate the new individuals in parallel
+        if len(new_parameter_sets) > 0:
+            new_evaluations = self.evaluate(new_parameter_sets, data, start_date, end_date, len(evaluations))
+            evaluations.extend(new_evaluations)
+            self.optimization_parameter_sets.extend(new_parameter_sets)
+            scores.extend(self._score(evaluation) for evaluation in new_evaluations)
+
+        return np.array([scores[self.evaluated_ids[key]] if key is not None else -np.inf for key in individual_keys])
+
+    def _score(self, evaluation):
+        # Scores are always maximized, failed metrics never win a selection
+        metric = self.evaluation_metric(evaluation)
+        if np.isnan(metric):
+            return -np.inf
+
+        return -metric if self.optimization_metric_ascending else metric
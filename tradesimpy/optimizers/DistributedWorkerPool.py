@@ -0,0 +1,472 @@
+import os
+import sys
+import time
+import Queue
+import socket
+import threading
+import collections
+import cPickle as pickle
+import multiprocessing as mp
+import logging as log
+from multiprocessing.connection import Listener, Client
+from WorkerPool import _init_worker
+
+
+def run_worker(address, authkey, worker_name=None, lib_paths=None):
+    # Register with the work queue, which hands over the algorithm to pre-warm with. Hosts may lay out the package
+    # differently, so the import paths are set up by each worker rather than taken from the work queue
+    worker_name = worker_name or '%s:%d' % (socket.gethostname(), os.getpid())
+    connection = Client(address, authkey=authkey)
+    connection.send(('register', worker_name))
+    algorithm_uri, heartbeat_interval = connection.recv()
+    _init_worker(lib_paths or [], algorithm_uri)
+
+    # Heartbeats are sent from their own connection, so long running tasks are not mistaken for lost ones
+    stopped = threading.Event()
+    heartbeat_thread = threading.Thread(target=_send_heartbeats, args=(address, authkey, worker_name, \
+        heartbeat_interval, stopped))
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+
+    try:
+        while True:
+            connection.send(('get', worker_name))
+            message = connection.recv()
+            if message[0] == 'stop':
+                break
+            elif message[0] == 'task':
+                task_id, payload = message[1:]
+                connection.send(('result', worker_name, task_id) + _execute(payload))
+                connection.recv()
+    except (EOFError, IOError):
+        log.warning('Worker %s lost its work queue' % worker_name)
+    finally:
+        stopped.set()
+        connection.close()
+
+def _send_heartbeats(address, authkey, worker_name, heartbeat_interval, stopped):
+    try:
+        connection = Client(address, authkey=authkey)
+        while not stopped.is_set():
+            connection.send(('heartbeat', worker_name))
+            connection.recv()
+            stopped.wait(heartbeat_interval)
+        connection.close()
+    except (EOFError, IOError):
+        pass
+
+def _execute(payload):
+    func, args = pickle.loads(payload)
+
+    # Errors are sent back to the parent, falling back to their description if they can not be pickled
+    try:
+        return True, pickle.dumps(func(*args), pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        try:
+            return False, pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False, pickle.dumps(RuntimeError(repr(e)), pickle.HIGHEST_PROTOCOL)
+
+def _apply_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+class DistributedAsyncResult(object):
+
+    def __init__(self, callback=None, completed=None):
+        self.callback = callback
+        self.completed = completed
+        self.event = threading.Event()
+        self.success = None
+        self.value = None
+
+    def ready(self):
+        return self.event.is_set()
+
+    def successful(self):
+        if not self.ready():
+            raise ValueError("The result is not ready.")
+
+        return self.success
+
+    def wait(self, timeout=None):
+        # Wait in short steps so the parent stays responsive to interrupts
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.ready() and (deadline is None or time.time() < deadline):
+            self.event.wait(0.1 if deadline is None else min(0.1, max(0.0, deadline - time.time())))
+
+    def get(self, timeout=None):
+        self.wait(timeout)
+        if not self.ready():
+            raise mp.TimeoutError
+
+        if self.success:
+            return self.value
+        else:
+            raise self.value
+
+    def _set(self, success, value):
+        self.success = success
+        self.value = value
+
+        # Like multiprocessing, callbacks are only called for successful tasks
+        if success and self.callback is not None:
+            self.callback(value)
+
+        self.event.set()
+        if self.completed is not None:
+            self.completed.put(self)
+
+
+class DistributedTask(object):
+
+    def __init__(self, payload, async_result):
+        self.payload = payload
+        self.async_result = async_result
+        self.attempts = 0
+
+
+class DistributedWorkerPool(object):
+
+    LOCAL_HOSTS = ('localhost', '127.0.0.1')
+
+    def __init__(self, num_processors, algorithm_uri=None, host='localhost', port=0, authkey=None,
+        num_local_workers=0, heartbeat_interval=1.0, heartbeat_timeout=10.0, max_attempts=3):
+        # Workers unpickle the tasks they are sent, so a work queue reachable from other hosts needs a secret authkey
+        if authkey is None and host not in self.LOCAL_HOSTS:
+            raise ValueError("An authkey is required to serve the work queue on host '%s'." % host)
+
+        # The processor count is the number of workers expected over all hosts, so it is not capped locally
+        self.num_processors = num_processors
+        self.algorithm_uri = algorithm_uri
+        self.host = host
+        self.port = port
+        self.authkey = os.urandom(32) if authkey is None else str(authkey)
+        self.num_local_workers = num_local_workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+        # Work queue state, shared by the threads serving the workers' connections
+        self.condition = threading.Condition()
+        self.tasks = {}
+        self.pending = collections.deque()
+        self.leases = {}
+        self.last_seen = {}
+        self.next_task_id = 0
+        self.stopping = False
+
+        self.listener = None
+        self.address = None
+        self.local_workers = []
+        self.threads = []
+
+    def start(self):
+        # The work queue is only started once and then reused until the pool is closed
+        if self.listener is None:
+            self.stopping = False
+            self.listener = Listener((self.host, self.port), authkey=self.authkey)
+            self.address = self.listener.address
+            log.info('Serving the work queue on %s:%d...' % self.address)
+
+            # Start local workers before any thread of the work queue, since they are forked. They share the host of
+            # the work queue, so they also share its import paths
+            connect_address = ('localhost' if self.address[0] in ('', '0.0.0.0') else self.address[0], self.address[1])
+            for i in range(self.num_local_workers):
+                worker = mp.Process(target=run_worker, args=(connect_address, self.authkey, None, list(sys.path)))
+                worker.daemon = True
+                worker.start()
+                self.local_workers.append(worker)
+
+            for target in (self._accept_connections, self._reap_lost_workers):
+                thread = threading.Thread(target=target)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+            # Tasks submitted right away should find the local workers registered
+            if not self.wait_for_workers(self.num_local_workers, self.heartbeat_timeout):
+                log.warning('Only %d of %d local workers joined the work queue' % (self.num_workers,
+                    self.num_local_workers))
+
+        return self
+
+    @property
+    def is_running(self):
+        return self.listener is not None
+
+    @property
+    def num_workers(self):
+        with self.condition:
+            return len(self.last_seen)
+
+    def wait_for_workers(self, num_workers, timeout=None):
+        # Returns whether the given number of workers joined the work queue in time
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while len(self.last_seen) < num_workers and (deadline is None or time.time() < deadline):
+                self.condition.wait(0.1 if deadline is None else min(0.1, max(0.0, deadline - time.time())))
+
+            return len(self.last_seen) >= num_workers
+
+    def map(self, func, iterable, chunksize=None):
+        items = list(iterable)
+        if chunksize is None:
+            chunksize = max(1, -(-len(items) // (4 * self.num_processors)))
+
+        return list(self.imap(func, items, chunksize))
+
+    def imap(self, func, iterable, chunksize=1):
+        self.start()
+
+        # Only keep a bounded number of chunks in flight, so large iterables are not all pickled at once
+        in_flight = collections.deque()
+        for chunk in self._chunks(iterable, chunksize):
+            in_flight.append(self._submit(_apply_chunk, (func, chunk)))
+            if len(in_flight) >= 2 * self.num_processors:
+                for value in in_flight.popleft().get():
+                    yield value
+
+        while len(in_flight) > 0:
+            for value in in_flight.popleft().get():
+                yield value
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        self.start()
+
+        # Yield the chunks in the order they complete
+        completed = Queue.Queue()
+        num_in_flight = 0
+        for chunk in self._chunks(iterable, chunksize):
+            self._submit(_apply_chunk, (func, chunk), completed=completed)
+            num_in_flight += 1
+            if num_in_flight >= 2 * self.num_processors:
+                for value in completed.get().get():
+                    yield value
+                num_in_flight -= 1
+
+        for i in range(num_in_flight):
+            for value in completed.get().get():
+                yield value
+
+    def apply_async(self, func, args=(), callback=None):
+        return self.start()._submit(func, args, callback)
+
+    def close(self, timeout=None):
+        # Let the workers finish all submitted tasks before shutting them down, but stop waiting once the timeout
+        # passed or no worker was connected for longer than the heartbeat timeout
+        if self.listener is not None:
+            log.info('Closing the work queue...')
+            deadline = None if timeout is None else time.time() + timeout
+            idle_since = None
+            with self.condition:
+                while len(self.tasks) > 0 and (deadline is None or time.time() < deadline):
+                    if len(self.last_seen) > 0:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.time()
+                    elif time.time() - idle_since > self.heartbeat_timeout:
+                        break
+                    self.condition.wait(0.1)
+                num_unfinished = len(self.tasks)
+
+            if num_unfinished > 0:
+                log.warning('Terminating the work queue with %d unfinished tasks' % num_unfinished)
+            self._shutdown(terminate=num_unfinished > 0)
+
+    def terminate(self):
+        if self.listener is not None:
+            log.info('Terminating the work queue...')
+            self._shutdown(terminate=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def _submit(self, func, args, callback=None, completed=None):
+        async_result = DistributedAsyncResult(callback, completed)
+        payload = pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL)
+
+        with self.condition:
+            task_id = self.next_task_id
+            self.next_task_id += 1
+            self.tasks[task_id] = DistributedTask(payload, async_result)
+            self.pending.append(task_id)
+            self.condition.notify_all()
+
+        return async_result
+
+    def _chunks(self, iterable, chunksize):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+
+        if len(chunk) > 0:
+            yield chunk
+
+    def _accept_connections(self):
+        while not self.stopping:
+            try:
+                connection = self.listener.accept()
+            except (EOFError, IOError, mp.AuthenticationError):
+                continue
+
+            thread = threading.Thread(target=self._serve_connection, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve_connection(self, connection):
+        worker_name = None
+
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'register':
+                    worker_name = message[1]
+                    self._touch(worker_name)
+                    log.info('Worker %s joined the work queue' % worker_name)
+                    connection.send((self.algorithm_uri, self.heartbeat_interval))
+                elif message[0] == 'heartbeat':
+                    self._touch(message[1], registered_only=True)
+                    connection.send(('ok',))
+                elif message[0] == 'get':
+                    connection.send(self._lease(message[1]))
+                elif message[0] == 'result':
+                    self._complete(*message[1:])
+                    connection.send(('ok',))
+        except (EOFError, IOError):
+            pass
+        finally:
+            connection.close()
+
+            # The tasks of a worker whose connection dropped are handed to the other workers
+            if worker_name is not None and not self.stopping:
+                self._release_worker(worker_name)
+
+    def _touch(self, worker_name, registered_only=False):
+        # Late heartbeats of a worker which was already released do not bring it back
+        with self.condition:
+            if not registered_only or worker_name in self.last_seen:
+                self.last_seen[worker_name] = time.time()
+                self.condition.notify_all()
+
+    def _lease(self, worker_name):
+        with self.condition:
+            self.last_seen[worker_name] = time.time()
+
+            # Hold the request for a while when there is no work, then let the worker ask again
+            deadline = time.time() + 1.0
+            while len(self.pending) == 0 and not self.stopping and time.time() < deadline:
+                self.condition.wait(max(0.0, deadline - time.time()))
+
+            if self.stopping:
+                return ('stop',)
+            if len(self.pending) == 0:
+                return ('wait',)
+
+            task_id = self.pending.popleft()
+            self.leases[task_id] = worker_name
+            return ('task', task_id, self.tasks[task_id].payload)
+
+    def _complete(self, worker_name, task_id, success, value):
+        with self.condition:
+            # The first result wins, e.g. when a worker thought to be lost finishes after all
+            if task_id not in self.tasks:
+                return
+
+            task = self.tasks.pop(task_id)
+            self.leases.pop(task_id, None)
+            if task_id in self.pending:
+                self.pending.remove(task_id)
+            self.condition.notify_all()
+
+        try:
+            value = pickle.loads(value)
+        except Exception as e:
+            success, value = False, e
+
+        task.async_result._set(success, value)
+
+    def _release_worker(self, worker_name):
+        failed_tasks = []
+
+        with self.condition:
+            self.last_seen.pop(worker_name, None)
+            lost_task_ids = [task_id for task_id, leasee in self.leases.items() if leasee == worker_name]
+            for task_id in lost_task_ids:
+                del self.leases[task_id]
+                task = self.tasks[task_id]
+                task.attempts += 1
+
+                # Give up on tasks which keep losing their workers, they probably crash them
+                if task.attempts >= self.max_attempts:
+                    del self.tasks[task_id]
+                    failed_tasks.append(task)
+                else:
+                    self.pending.appendleft(task_id)
+            self.condition.notify_all()
+
+        if len(lost_task_ids) > 0:
+            log.warning('Lost worker %s, reassigning %d tasks' % (worker_name, len(lost_task_ids) - len(failed_tasks)))
+
+        for task in failed_tasks:
+            task.async_result._set(False, RuntimeError("The task lost its worker %d times." % self.max_attempts))
+
+    def _reap_lost_workers(self):
+        # Workers which stop sending heartbeats, e.g. on a hung host, are treated as lost
+        while not self.stopping:
+            time.sleep(self.heartbeat_interval)
+
+            with self.condition:
+                now = time.time()
+                lost_workers = [worker_name for worker_name, last_seen in self.last_seen.items() \
+                    if now - last_seen > self.heartbeat_timeout]
+
+            for worker_name in lost_workers:
+                self._release_worker(worker_name)
+
+    def _shutdown(self, terminate):
+        with self.condition:
+            self.stopping = True
+            unfinished_tasks = self.tasks.values()
+            self.tasks = {}
+            self.condition.notify_all()
+
+        # Nobody is left to run the unfinished tasks, so their results fail instead of waiting forever
+        for task in unfinished_tasks:
+            task.async_result._set(False, RuntimeError("The work queue was shut down before the task completed."))
+
+        # Local workers stop on their next request for work
+        for worker in self.local_workers:
+            if terminate:
+                worker.terminate()
+            worker.join(5 * self.heartbeat_interval + 1.0)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+        # Wake up the thread accepting connections so it notices the shutdown, without waiting for its handshake
+        try:
+            socket.create_connection(self.address).close()
+        except socket.error:
+            pass
+
+        for thread in self.threads:
+            thread.join()
+
+        self.listener.close()
+        self.listener = None
+        self.local_workers = []
+        self.threads = []
+        self.tasks = {}
+        self.pending.clear()
+        self.leases = {}
+        self.last_seen = {}
@@ -1,85 +1,373 @@
-from Optimizer import Optimizer
-import Backtester as b
-from OptimizationResults import OptimizationResults
-import itertools
+from Optimizer import Optimizer, _backtest_chunk
+from ParameterSpace import ParameterSpace, ParameterGrid
+from BacktestResultStore import BacktestResultStore
+from OptimizationCheckpoint import OptimizationCheckpoint
+from ResultSink import ResultSink
+from MemmapResultSink import MemmapResultSink
 import numpy as np
-import multiprocessing as mp
+import Queue
+import logging as log
+import hashlib
+import tempfile
+import os
+import copy
 
 
-def _backtest(backtest_args):
-    # Extract backtest arguments
-    backtest_id, parameters, trading_algorithm, commission, ticker_spreads, data, start_date, end_date = backtest_args
-
-    # Setup the trading algorithm and backtester
-    trading_algorithm.set_parameters(parameters)
-    backtester = b.Backtester(backtest_id, trading_algorithm, 10000, commission, ticker_spreads)
-
-    return backtester.run(data, start_date, end_date)
-
 class GridSearchOptimizer(Optimizer):
 
+    SCAN_SIZE = 1000000
+    MAX_CHUNK_SIZE = 256
+    TARGET_CHUNK_SECONDS = 1.0
+
     def __init__(self, num_processors, trading_algorithm, commission, ticker_spreads, optimization_metric,
-        optimization_metric_ascending, optimization_parameters, frequency):
+        optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, result_mode='full',
+        top_n_results=1, chunk_size=None, result_store=None, shard=None, checkpoint_uri=None, resume=False,
+        result_sink_uri=None):
         super(GridSearchOptimizer, self).__init__(num_processors, trading_algorithm, optimization_metric,
-            optimization_metric_ascending, optimization_parameters, frequency)
+            optimization_metric_ascending, optimization_parameters, frequency, commission=commission,
+            ticker_spreads=ticker_spreads, worker_pool=worker_pool, result_mode=result_mode,
+            top_n_results=top_n_results, result_store=result_store)
 
         # Data members
-        self.commission = commission
-        self.ticker_spreads = ticker_spreads
-        self.optimization_parameter_sets = self.get_param_sets(self.optimization_parameters)
+        self.chunk_size = chunk_size
+        self.checkpoint_uri = checkpoint_uri
+        self.resume = resume
+        self.checkpoint = None
+        self.owns_checkpoint = True
+        self.result_sink_uri = result_sink_uri
+        self.result_sinks = []
+        self.optimization_parameter_sets = self.get_feasible_grid(self.create_parameter_space())
+
+        # A shard only runs its own deterministic slice of the grid, see OptimizationResults.merge
+        self.grid_size = len(self.optimization_parameter_sets)
+        self.shard = GridSearchOptimizer.parse_shard(shard)
+        if self.shard is not None:
+            self.optimization_parameter_sets = self.get_shard_grid(*self.shard)
         self.num_paramameter_sets = len(self.optimization_parameter_sets)
 
     def run(self, data, start_date, end_date):
-        # Prepare input data for running parallel backtests
-        backtest_args = itertools.izip(
-            range(len(self.optimization_parameter_sets)),
-            self.optimization_parameter_sets,
-            itertools.repeat(self.trading_algorithm),
-            itertools.repeat(self.commission),
-            itertools.repeat(self.ticker_spreads),
-            itertools.repeat(data),
-            itertools.repeat(start_date),
-            itertools.repeat(end_date)
-        )
-
-        # Run all backtest scenarios in parallel
-        pool = mp.Pool(processes=self.num_processors)
-        backtest_results = pool.map(func=_backtest, iterable=backtest_args)
-
-        # Find optimal parameters
-        optimal_parameters = Optimizer.get_optimal_parameters(backtest_results, self.optimization_metric, \
-            self.optimization_parameter_sets, self.optimization_metric_ascending, self.frequency)
-
-        # Save results
-        self.results = OptimizationResults(backtest_results, optimal_parameters, self.optimization_parameter_sets)
-
-        return self.results
+        grid = self.optimization_parameter_sets
 
-    # Generate parameter sets for each scenario
-    @staticmethod
-    def get_param_sets(parameter_spaces):
-        discrete_param_spaces = []
-        param_names = []
-        param_sets = []
-
-        # Discretize each parameter space
-        for key, value in parameter_spaces.iteritems():
-            # Skip unused parameters
-            if len(value) == 0:
+        # Only run one scenario per effective parameter set, duplicates share its evaluation
+        sources = self.get_shared_positions()
+        run_positions = np.flatnonzero(sources == np.arange(len(grid)))
+        if len(run_positions) < len(grid):
+            log.info('Skipping %d duplicate effective parameter sets' % (len(grid) - len(run_positions)))
+
+        # Reuse the scenarios completed by earlier runs
+        evaluations = self.create_result_sink(len(grid))
+        if self.result_store is not None:
+            stored_evaluations, scenario_keys = self.load_stored_evaluations(run_positions, (grid[position] for \
+                position in run_positions), data, start_date, end_date)
+            for position, evaluation in stored_evaluations.iteritems():
+                evaluations[position] = evaluation
+            run_positions = np.array([position for position in run_positions if position in scenario_keys], \
+                dtype=np.int64)
+
+        # Skip the scenarios checkpointed before an interruption
+        if self.checkpoint_uri is not None:
+            run_key = self._checkpoint_run_key(data, start_date, end_date)
+            run_positions = self._load_checkpointed_evaluations(run_positions, evaluations, run_key)
+
+        # Compute the indicators shared by the scenarios once
+        trading_algorithm = self.indicator_trading_algorithm((grid[position] for position in run_positions), data)
+
+        # Stream the scenarios back as they complete, folding each into the running best. The full result mode still
+        # keeps every result, in memory unless a result sink directory spills them to disk, only the summary result
+        # mode keeps the memory flat
+        self.running_best = None
+        optimization_metrics = {}
+        progress = self.create_progress(len(run_positions))
+        for evaluation in self.stream_evaluations(run_positions, trading_algorithm, data, start_date, end_date, \
+            progress):
+            optimization_metrics[evaluation.backtest_id] = self.update_running_best(evaluation)
+            evaluations.put(evaluation.backtest_id, evaluation, optimization_metrics[evaluation.backtest_id])
+
+            # Store each scenario as soon as it completes
+            if self.result_store is not None:
+                self.result_store.put(scenario_keys[evaluation.backtest_id], self._result_kind(), evaluation)
+            if self.checkpoint is not None:
+                self.checkpoint.append(run_key, grid.grid_index(evaluation.backtest_id), evaluation)
+
+        progress.finish()
+        if self.checkpoint is not None:
+            self.checkpoint.flush()
+
+        # Share the memoized evaluations with the duplicate parameter sets
+        for position in np.flatnonzero(sources != np.arange(len(grid))):
+            evaluation = copy.copy(evaluations[sources[position]])
+            evaluation.backtest_id = int(position)
+            evaluations.put(position, evaluation, optimization_metrics.get(sources[position]))
+        evaluations.flush()
+
+        # Find optimal parameters and save results, shards record which slice of the grid they hold
+        results = self.build_results(evaluations, data, start_date, end_date)
+        if self.shard is not None:
+            results.shard = self.shard
+            results.grid_size = self.grid_size
+
+        return results
+
+    def create_result_sink(self, num_results):
+        # Full results are spilled to disk when a sink directory is configured, summaries are small enough to keep
+        if self.result_sink_uri is None or self.result_mode == 'summary':
+            return ResultSink([None] * num_results)
+
+        # Every run writes to its own directory, so concurrent walk forward windows never share their files. The
+        # sinks are closed with the optimizer, their directories are kept for the results reading from them
+        if not os.path.isdir(self.result_sink_uri):
+            os.makedirs(self.result_sink_uri)
+        sink_uri = tempfile.mkdtemp(prefix='results_', dir=self.result_sink_uri)
+
+        result_sink = MemmapResultSink(sink_uri, num_results, self.evaluation_metric, \
+            self.optimization_metric_ascending, self.top_n_results)
+        self.result_sinks.append(result_sink)
+
+        return result_sink
+
+    def remove_result_sinks(self):
+        # Delete the directories of all result sinks, once their results are persisted elsewhere or no longer needed
+        for result_sink in self.result_sinks:
+            result_sink.remove()
+        self.result_sinks = []
+
+    def stream_evaluations(self, run_positions, trading_algorithm, data, start_date, end_date, progress=None):
+        # Schedule the most expensive scenarios first, so they do not straggle at the end of the run
+        costs = self.get_scenario_costs(run_positions)
+        order = np.argsort(-costs, kind='mergesort')
+        run_positions = run_positions[order]
+        cumulative_costs = np.concatenate([[0.0], np.cumsum(costs[order])])
+
+        # Workers receive chunks of grid indices rather than parameter sets, a couple of chunks per worker at a time
+        completed = Queue.Queue()
+        async_results = []
+        max_in_flight = 2 * self.worker_pool.num_processors
+        measured_seconds = measured_costs = 0.0
+        start = num_in_flight = 0
+        while start < len(run_positions) or num_in_flight > 0:
+            while start < len(run_positions) and num_in_flight < max_in_flight:
+                stop = min(start + self.get_chunk_size(cumulative_costs, start, measured_seconds, measured_costs), \
+                    len(run_positions))
+                chunk_cost = cumulative_costs[stop] - cumulative_costs[start]
+                async_results.append(self.worker_pool.apply_async(_backtest_chunk, (self._chunk_args( \
+                    run_positions[start:stop], trading_algorithm, data, start_date, end_date),), \
+                    lambda result, chunk_cost=chunk_cost: completed.put((result, chunk_cost))))
+                start = stop
+                num_in_flight += 1
+
+            try:
+                (chunk_evaluations, durations, worker_name), chunk_cost = completed.get(timeout=0.1)
+            except Queue.Empty:
+                # Failed chunks never call back, so raise their errors here
+                for async_result in async_results:
+                    if async_result.ready() and not async_result.successful():
+                        async_result.get()
+                async_results = [async_result for async_result in async_results if not async_result.ready()]
                 continue
 
-            discrete_param_spaces.append(list(np.linspace(value[0], value[1], value[2])))
-            param_names.append(key)
+            num_in_flight -= 1
+            measured_seconds += sum(durations)
+            measured_costs += chunk_cost
+            for evaluation in chunk_evaluations:
+                yield evaluation
+
+            # The caller has folded the chunk into its running best by now
+            if progress is not None:
+                progress.update([evaluation.backtest_id for evaluation in chunk_evaluations], durations, worker_name, \
+                    self.running_best)
+
+    def get_scenario_costs(self, run_positions):
+        # Scenarios cost the same, unless the trading algorithm estimates otherwise
+        grid = self.optimization_parameter_sets
+        if len(run_positions) == 0 or self.trading_algorithm.scenario_cost(grid[run_positions[0]]) is None:
+            return np.ones(len(run_positions))
+
+        return np.array([self.trading_algorithm.scenario_cost(grid[position]) for position in run_positions], \
+            dtype=float)
+
+    def get_chunk_size(self, cumulative_costs, start, measured_seconds, measured_costs):
+        if self.chunk_size is not None:
+            return self.chunk_size
+
+        # Hand out single scenarios until their cost is measured
+        if measured_costs == 0:
+            return 1
+
+        # Chunks shrink towards the end of the run, so the workers finish together
+        num_remaining = len(cumulative_costs) - 1 - start
+        max_chunk_size = min(GridSearchOptimizer.MAX_CHUNK_SIZE, \
+            max(1, num_remaining // (2 * self.worker_pool.num_processors)))
+        if measured_seconds <= 0:
+            return max_chunk_size
+
+        # Otherwise fill chunks with the scenarios expected to run for the target duration
+        target_cost = cumulative_costs[start] + GridSearchOptimizer.TARGET_CHUNK_SECONDS * measured_costs / \
+            measured_seconds
+        chunk_size = np.searchsorted(cumulative_costs, target_cost, side='left') - start
+
+        return int(min(max(chunk_size, 1), max_chunk_size))
+
+    def spawn(self):
+        # Copies append to the same checkpoint, which stays open until this optimizer is closed
+        if self.checkpoint_uri is not None:
+            self._open_checkpoint()
+
+        # Copies track and close the result sinks of their own runs
+        optimizer = super(GridSearchOptimizer, self).spawn()
+        optimizer.owns_checkpoint = False
+        optimizer.result_sinks = []
+
+        return optimizer
 
-        # Generate all unique parameter sets
-        temp_param_sets = list(itertools.product(*discrete_param_spaces))
+    def close(self):
+        super(GridSearchOptimizer, self).close()
 
-        # Build proper output structure
-        for p in temp_param_sets:
-            params = {}
-            for i in range(0, len(p)):
-                params[param_names[i]] = p[i]
+        for result_sink in self.result_sinks:
+            result_sink.close()
 
-            param_sets.append(params)
+        if self.checkpoint is not None and self.owns_checkpoint:
+            self.checkpoint.close()
+            self.checkpoint = None
 
-        return param_sets
+    def get_shared_positions(self):
+        grid = self.optimization_parameter_sets
+
+        # Point every grid position at the position whose evaluation it shares, the first duplicate always runs
+        sources = np.arange(len(grid), dtype=np.int64)
+        first_positions = {}
+        for positions, grid_indices, representatives in self.iter_representatives(grid):
+            # Find the representatives among the feasible grid points
+            if grid.indices is None:
+                representative_positions = representatives
+                found = np.ones(len(positions), dtype=bool)
+            else:
+                representative_positions = np.searchsorted(grid.indices, representatives)
+                found = representative_positions < len(grid.indices)
+                found[found] = grid.indices[representative_positions[found]] == representatives[found]
+
+            sources[positions[found]] = representative_positions[found]
+
+            # Representatives violating a constraint are never run, so their first feasible duplicate runs instead
+            for position, representative in zip(positions[~found], representatives[~found]):
+                sources[position] = first_positions.setdefault(representative, position)
+
+        return sources
+
+    def get_shard_grid(self, shard_index, num_shards):
+        grid = self.optimization_parameter_sets
+
+        # Deal the scenarios to the shards by their effective parameter set, so duplicates stay in the same shard
+        shard_indices = []
+        for positions, grid_indices, representatives in self.iter_representatives(grid):
+            shard_indices.append(grid_indices[representatives % num_shards == shard_index])
+
+        shard_grid = ParameterGrid(grid.parameter_space, np.concatenate(shard_indices or \
+            [np.array([], dtype=np.int64)]))
+        if len(shard_grid) == 0:
+            raise ValueError("The shard %d/%d has no parameter sets to run." % (shard_index, num_shards))
+
+        return shard_grid
+
+    def iter_representatives(self, grid):
+        # Yield blocks of grid positions, their grid indices and the grid index of the first parameter set which
+        # canonicalizes the same, see TradingAlgorithm.independent_canonical_parameters
+        parameter_space = grid.parameter_space
+        if parameter_space.canonicalize is None or parameter_space.canonicalize_per_axis:
+            axis_representatives = parameter_space.axis_representatives()
+        else:
+            axis_representatives = None
+            first_indices = {}
+
+        for start in xrange(0, len(grid), GridSearchOptimizer.SCAN_SIZE):
+            positions = np.arange(start, min(start + GridSearchOptimizer.SCAN_SIZE, len(grid)), dtype=np.int64)
+            grid_indices = grid.grid_indices(positions)
+
+            # Parameters canonicalized on their own are re-encoded axis by axis, otherwise every parameter set is
+            # canonicalized and memoized
+            if axis_representatives is not None:
+                representatives = parameter_space.representative_indices(grid_indices, axis_representatives)
+            else:
+                representatives = np.array([first_indices.setdefault(self.parameter_key( \
+                    parameter_space.decode(int(grid_index))), grid_index) for grid_index in grid_indices], \
+                    dtype=np.int64)
+
+            yield positions, grid_indices, representatives
+
+    def _load_checkpointed_evaluations(self, run_positions, evaluations, run_key):
+        checkpointed_evaluations = self._open_checkpoint().load(run_key)
+
+        remaining_positions = []
+        for position, grid_index in zip(run_positions, self.optimization_parameter_sets.grid_indices(run_positions)):
+            evaluation = checkpointed_evaluations.get(int(grid_index))
+            if evaluation is None:
+                remaining_positions.append(position)
+            else:
+                evaluation.backtest_id = int(position)
+                evaluations[position] = evaluation
+
+        if len(remaining_positions) < len(run_positions):
+            log.info('Loaded %d checkpointed backtests' % (len(run_positions) - len(remaining_positions)))
+
+        return np.array(remaining_positions, dtype=np.int64)
+
+    def _open_checkpoint(self):
+        # The checkpoint is opened once, later runs of the optimizer, e.g. walk forward periods, append to it
+        if self.checkpoint is None:
+            self.checkpoint = OptimizationCheckpoint(self.checkpoint_uri, self.resume)
+            self.resume = True
+
+        return self.checkpoint
+
+    def _checkpoint_run_key(self, data, start_date, end_date):
+        # Runs are identified by everything which gives the grid indices of their scenarios a different outcome
+        run_key = hashlib.sha1()
+        run_key.update(BacktestResultStore.algorithm_fingerprint(self.trading_algorithm))
+        run_key.update(self.data_fingerprint(data))
+        run_key.update(repr((self._result_kind(), sorted(self.optimization_parameters.items()), str(start_date), \
+            str(end_date), float(self.commission), list(self.ticker_spreads))))
+
+        return run_key.digest()
+
+    def _chunk_args(self, positions, trading_algorithm, data, start_date, end_date):
+        grid = self.optimization_parameter_sets
+
+        return (positions, grid.grid_indices(positions), grid.parameter_space, trading_algorithm, self.commission,
+            self.ticker_spreads, data, start_date, end_date, self.objectives, self.frequency,
+            self.result_mode)
+
+    @staticmethod
+    def parse_shard(shard):
+        # Shards are given as 'i/N' or (i, N), counting from 0
+        if shard is None:
+            return None
+        if isinstance(shard, basestring):
+            shard = shard.split('/')
+
+        try:
+            shard_index, num_shards = [int(value) for value in shard]
+        except ValueError:
+            raise ValueError("The shard %s is not of the form i/N." % (shard,))
+        if not 0 <= shard_index < num_shards:
+            raise ValueError("The shard index %d is not within 0 to %d." % (shard_index, num_shards - 1))
+
+        return shard_index, num_shards
+
+    # Generate the lazily decoded parameter set of each scenario
+    @staticmethod
+    def get_parameter_grid(parameter_spaces, canonicalize=None, canonicalize_per_axis=False):
+        return GridSearchOptimizer.get_feasible_grid(ParameterSpace(parameter_spaces, canonicalize, \
+            canonicalize_per_axis))
+
+    @staticmethod
+    def get_feasible_grid(parameter_space):
+        # Without constraints every grid point is a scenario, otherwise only keep the indices of feasible points
+        if len(parameter_space.constraints) == 0:
+            return ParameterGrid(parameter_space)
+
+        feasible_indices = list(parameter_space.iter_feasible_indices(GridSearchOptimizer.SCAN_SIZE))
+        return ParameterGrid(parameter_space, np.concatenate(feasible_indices or [np.array([], dtype=np.int64)]))
+
+    # Generate parameter sets for each scenario
+    @staticmethod
+    def get_param_sets(parameter_spaces, canonicalize=None, canonicalize_per_axis=False):
+        return list(GridSearchOptimizer.get_parameter_grid(parameter_spaces, canonicalize, canonicalize_per_axis))
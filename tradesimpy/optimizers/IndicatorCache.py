@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import logging as log
+import indicators
+
+
+class IndicatorCache(object):
+
+    def __init__(self, data):
+        # Indicator series are computed once in the parent and memory-mapped read-only by every worker
+        self.data = data
+        self.cache_uri = None
+        self.file_names = {}
+        self.indices = dict((ticker, ticker_data.index) for ticker, ticker_data in data.iteritems())
+        self.series = {}
+
+    def update(self, trading_algorithm, parameter_sets):
+        # Only compute the indicators which are not cached yet, so work grows with the distinct indicators. Like the
+        # algorithm itself, every value only sees the history window ending at it
+        history_length = trading_algorithm.history_window + 1
+        num_computed = 0
+        for parameters in parameter_sets:
+            for indicator in trading_algorithm.indicators(parameters):
+                for ticker in trading_algorithm.tickers:
+                    key = (ticker, indicator, history_length)
+                    if key in self.file_names:
+                        continue
+
+                    if self.cache_uri is None:
+                        self.cache_uri = tempfile.mkdtemp(prefix='tradesimpy_indicators_')
+
+                    file_name = 'indicator_%d.npy' % len(self.file_names)
+                    np.save(os.path.join(self.cache_uri, file_name), \
+                        indicators.compute_indicator(self.data[ticker], indicator, history_length))
+                    self.file_names[key] = file_name
+                    num_computed += 1
+
+        if num_computed > 0:
+            log.info('Cached %d new indicator series' % num_computed)
+
+    def lookup(self, ticker, indicator, history_length, current_datetime):
+        # Return None when the indicator or the date-time is not cached so the caller can compute it instead
+        key = (ticker, indicator, history_length)
+        if key not in self.file_names:
+            return None
+
+        try:
+            position = self.indices[ticker].get_loc(current_datetime)
+        except KeyError:
+            return None
+
+        if key not in self.series:
+            self.series[key] = np.load(os.path.join(self.cache_uri, self.file_names[key]), mmap_mode='r')
+
+        return self.series[key][position]
+
+    def close(self):
+        self.series = {}
+        if self.cache_uri is not None and os.path.isdir(self.cache_uri):
+            shutil.rmtree(self.cache_uri)
+
+    def __deepcopy__(self, memo):
+        # The cached series are read-only, so copies of a trading algorithm share them
+        return self
+
+    def __getstate__(self):
+        # Workers only receive the file layout, the data and the mapped series stay behind
+        state = self.__dict__.copy()
+        state['data'] = None
+        state['series'] = {}
+
+        return state
@@ -0,0 +1,178 @@
+from BacktestResults import BacktestResults
+from ResultsArchive import ResultsArchive
+import os
+import heapq
+import shutil
+import cPickle as pickle
+import numpy as np
+
+
+class MemmapResultSink(object):
+
+    def __init__(self, sink_uri, num_results, metric=None, ascending=False, top_n=1):
+        # Every series is a memory-mapped matrix with one row per scenario, only the optimization metrics and a heap
+        # of the top full results stay in memory. Once closed, or when unpickled, the sink holds no open files and
+        # reads its rows from the files on demand, the files are only deleted by remove
+        self.sink_uri = sink_uri
+        self.num_results = num_results
+        self.metric = metric
+        self.ascending = ascending
+        self.top_n = top_n
+
+        if not os.path.isdir(sink_uri):
+            os.makedirs(sink_uri)
+
+        self.backtest_ids = np.full(num_results, -1, dtype=np.int64)
+        self.metrics = np.full(num_results, np.nan)
+        self.top_heap = []
+        self.top_results = {}
+
+        # Transactions are appended to one file of pickled records, only their offsets stay in memory
+        self.transaction_offsets = np.full(num_results, -1, dtype=np.int64)
+        self.transactions_file = open(os.path.join(sink_uri, 'transactions.p'), 'w+b')
+
+        # The matrices are created once the dates of the first scenario are known
+        self.dates = None
+        self.matrices = {}
+
+    def __len__(self):
+        return self.num_results
+
+    def __iter__(self):
+        for position in xrange(self.num_results):
+            yield self[position]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in xrange(*position.indices(self.num_results))]
+        if position < 0:
+            position += self.num_results
+        if position < 0 or position >= self.num_results:
+            raise IndexError("The result sink holds %d scenarios." % self.num_results)
+
+        if position in self.top_results:
+            return self.top_results[position]
+
+        # Scenarios which were never stored read as missing, like the empty slots of an in-memory sink
+        if self.backtest_ids[position] < 0:
+            return None
+
+        return self._rebuild(position)
+
+    def __setitem__(self, position, backtest_result):
+        self.put(position, backtest_result)
+
+    def put(self, position, backtest_result, metric=None):
+        # The optimization metric of the result may be handed over when the caller already computed it
+        if self.transactions_file is None:
+            raise ValueError("The result sink %s is closed." % self.sink_uri)
+        if self.dates is None:
+            self._create_matrices(backtest_result.cash.index)
+
+        # Every row is stored on the dates of the first scenario, results on other dates would lose or gain values
+        if not backtest_result.cash.index.equals(self.dates):
+            raise ValueError("The dates of backtest %d do not match the dates of the result sink." \
+                % backtest_result.backtest_id)
+
+        for name in ResultsArchive.SERIES:
+            self.matrices[name][position] = getattr(backtest_result, name).values
+        self.backtest_ids[position] = backtest_result.backtest_id
+
+        transactions = dict((date, transactions) for date, transactions in backtest_result.transactions.iteritems() \
+            if len(transactions) > 0)
+        self.transactions_file.seek(0, os.SEEK_END)
+        self.transaction_offsets[position] = self.transactions_file.tell()
+        pickle.dump(transactions, self.transactions_file, pickle.HIGHEST_PROTOCOL)
+
+        if self.metric is not None:
+            self._push_top_result(position, backtest_result, self.metric(backtest_result) if metric is None else \
+                metric)
+
+    def series_matrix(self, series_name, start=0, stop=None):
+        # Only the requested block of rows is read into memory
+        if self.dates is None:
+            return np.empty((len(xrange(*slice(start, stop).indices(self.num_results))), 0))
+
+        return np.array(self._matrix(series_name)[start:stop])
+
+    def flush(self):
+        if self.transactions_file is not None:
+            for matrix in self.matrices.itervalues():
+                matrix.flush()
+            self.transactions_file.flush()
+
+    def close(self):
+        # Release the files, the results stay readable from them
+        if self.transactions_file is not None:
+            self.flush()
+            self.transactions_file.close()
+            self.transactions_file = None
+            self.matrices = {}
+
+    def remove(self):
+        # Delete the files of the sink, e.g. once its results were persisted elsewhere
+        self.close()
+        if os.path.isdir(self.sink_uri):
+            shutil.rmtree(self.sink_uri)
+
+    def __getstate__(self):
+        # Pickles only refer to the files of the sink, they are read on demand when loaded
+        self.flush()
+        state = self.__dict__.copy()
+        state['metric'] = None
+        state['matrices'] = {}
+        state['transactions_file'] = None
+
+        return state
+
+    def _create_matrices(self, dates):
+        self.dates = dates
+        for name in ResultsArchive.SERIES:
+            self.matrices[name] = np.memmap(self._matrix_uri(name), dtype=np.float64, mode='w+', \
+                shape=(self.num_results, len(dates)))
+
+    def _matrix_uri(self, name):
+        return os.path.join(self.sink_uri, '%s.f8' % name)
+
+    def _matrix(self, name):
+        # A closed sink maps its matrices read-only for as long as they are read
+        if name in self.matrices:
+            return self.matrices[name]
+
+        return np.memmap(self._matrix_uri(name), dtype=np.float64, mode='r', shape=(self.num_results, \
+            len(self.dates)))
+
+    def _push_top_result(self, position, backtest_result, metric):
+        # Keep the full results of the best scenarios, failed metrics never make it into the heap
+        self.metrics[position] = metric
+        if np.isnan(metric):
+            return
+
+        if position in self.top_results:
+            self.top_results[position] = backtest_result
+            return
+
+        score = -metric if self.ascending else metric
+        if len(self.top_heap) < self.top_n:
+            heapq.heappush(self.top_heap, (score, position))
+            self.top_results[position] = backtest_result
+        elif score > self.top_heap[0][0]:
+            dropped_position = heapq.heapreplace(self.top_heap, (score, position))[1]
+            del self.top_results[dropped_position]
+            self.top_results[position] = backtest_result
+
+    def _rebuild(self, position):
+        # Rebuild the results of a scenario from its rows
+        series = dict((name, np.array(self._matrix(name)[position])) for name in ('cash', 'invested', 'fees'))
+
+        transactions = dict((date, {}) for date in self.dates)
+        if self.transactions_file is not None:
+            self.transactions_file.seek(self.transaction_offsets[position])
+            transactions.update(pickle.load(self.transactions_file))
+        else:
+            with open(os.path.join(self.sink_uri, 'transactions.p'), 'rb') as transactions_file:
+                transactions_file.seek(self.transaction_offsets[position])
+                transactions.update(pickle.load(transactions_file))
+
+        return BacktestResults(int(self.backtest_ids[position]), dict(zip(self.dates, series['cash'])), \
+            dict(zip(self.dates, series['invested'])), dict(zip(self.dates, series['fees'])), transactions)
@@ -0,0 +1,90 @@
+import os
+import time
+import struct
+import threading
+import cPickle as pickle
+import logging as log
+
+
+class OptimizationCheckpoint(object):
+
+    # Every record is the length of its pickled evaluation, its grid index and the key of its run
+    RECORD_HEADER = struct.Struct('<QQ20s')
+
+    def __init__(self, checkpoint_uri, resume=False, flush_interval=10.0):
+        # Completed scenarios are appended to one file, a resumed run skips the scenarios found in it
+        self.checkpoint_uri = checkpoint_uri
+        self.flush_interval = flush_interval
+        self.offsets = {}
+
+        # Optimizers running concurrently, e.g. walk forward windows, share the checkpoint
+        self.lock = threading.RLock()
+
+        if resume and os.path.isfile(checkpoint_uri):
+            self._index()
+            self.file = open(checkpoint_uri, 'r+b')
+            self.file.truncate(self.size)
+            self.file.seek(self.size)
+            log.info('Resuming from %d checkpointed scenarios' % sum(len(o) for o in self.offsets.itervalues()))
+        else:
+            self.file = open(checkpoint_uri, 'wb')
+            self.size = 0
+
+        self.last_flush = time.time()
+
+    def load(self, run_key):
+        # Read the evaluations checkpointed for one run, by their grid index
+        with self.lock:
+            self.file.flush()
+            evaluations = {}
+            record_header = OptimizationCheckpoint.RECORD_HEADER
+            with open(self.checkpoint_uri, 'rb') as f:
+                for grid_index, offset in self.offsets.get(run_key, {}).iteritems():
+                    f.seek(offset)
+                    length = record_header.unpack(f.read(record_header.size))[0]
+                    evaluations[grid_index] = pickle.loads(f.read(length))
+
+        return evaluations
+
+    def append(self, run_key, grid_index, evaluation):
+        blob = pickle.dumps(evaluation, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.offsets.setdefault(run_key, {})[grid_index] = self.size
+            self.file.write(OptimizationCheckpoint.RECORD_HEADER.pack(len(blob), grid_index, run_key))
+            self.file.write(blob)
+            self.size += OptimizationCheckpoint.RECORD_HEADER.size + len(blob)
+
+        # Writes are buffered, they only reach the disk every flush interval
+        if time.time() - self.last_flush > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.last_flush = time.time()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.flush()
+                self.file.close()
+
+    def _index(self):
+        # Only read the record headers, a record cut short by a crash ends the checkpoint
+        self.size = 0
+        record_header = OptimizationCheckpoint.RECORD_HEADER
+        file_size = os.path.getsize(self.checkpoint_uri)
+        with open(self.checkpoint_uri, 'rb') as f:
+            while self.size + record_header.size <= file_size:
+                length, grid_index, run_key = record_header.unpack(f.read(record_header.size))
+                end = self.size + record_header.size + length
+                if end > file_size:
+                    break
+
+                self.offsets.setdefault(run_key, {})[grid_index] = self.size
+                self.size = end
+                f.seek(end)
+
+        if self.size < file_size:
+            log.warning('Dropping the incomplete last record of the checkpoint')
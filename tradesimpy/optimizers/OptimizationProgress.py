@@ -0,0 +1,103 @@
+import time
+import heapq
+import logging as log
+
+
+class OptimizationProgress(object):
+
+    def __init__(self, num_scenarios, num_processors, callback=None, log_interval=10.0, num_slowest=5):
+        # Progress of the scenarios run by an optimizer, logged periodically and handed to the callback on every update
+        self.num_scenarios = num_scenarios
+        self.num_processors = num_processors
+        self.callback = callback
+        self.log_interval = log_interval
+        self.num_slowest = num_slowest
+
+        self.num_completed = 0
+        self.busy_seconds = {}
+        self.slowest_scenarios = []
+        self.running_best = None
+        self.start_time = time.time()
+        self.last_log_time = self.start_time
+
+    @property
+    def elapsed_seconds(self):
+        return time.time() - self.start_time
+
+    @property
+    def scenarios_per_second(self):
+        elapsed_seconds = self.elapsed_seconds
+        if elapsed_seconds <= 0:
+            return 0.0
+
+        return self.num_completed / elapsed_seconds
+
+    @property
+    def eta_seconds(self):
+        # Unknown until the first scenarios complete, or when the number of scenarios is not known up front
+        scenarios_per_second = self.scenarios_per_second
+        if scenarios_per_second <= 0 or self.num_scenarios is None:
+            return None
+
+        return (self.num_scenarios - self.num_completed) / scenarios_per_second
+
+    @property
+    def worker_utilization(self):
+        # Fraction of the elapsed time each worker spent running scenarios
+        elapsed_seconds = self.elapsed_seconds
+        if elapsed_seconds <= 0:
+            return {}
+
+        return dict((worker_name, busy_seconds / elapsed_seconds) for worker_name, busy_seconds in \
+            self.busy_seconds.iteritems())
+
+    @property
+    def utilization(self):
+        # Workers which never reported still count as idle processors
+        elapsed_seconds = self.elapsed_seconds
+        num_workers = max(self.num_processors, len(self.busy_seconds))
+        if elapsed_seconds <= 0 or num_workers == 0 or len(self.busy_seconds) == 0:
+            return None
+
+        return sum(self.busy_seconds.itervalues()) / (elapsed_seconds * num_workers)
+
+    def update(self, backtest_ids, durations=None, worker_name=None, running_best=None):
+        self.num_completed += len(backtest_ids)
+        self.running_best = running_best
+
+        # Scenarios loaded from a result store or shared with a duplicate were not timed by any worker
+        if durations is not None:
+            self.busy_seconds[worker_name] = self.busy_seconds.get(worker_name, 0.0) + sum(durations)
+            for duration, backtest_id in zip(durations, backtest_ids):
+                if len(self.slowest_scenarios) < self.num_slowest:
+                    heapq.heappush(self.slowest_scenarios, (duration, backtest_id))
+                else:
+                    heapq.heappushpop(self.slowest_scenarios, (duration, backtest_id))
+
+        if self.callback is not None:
+            self.callback(self)
+
+        if time.time() - self.last_log_time >= self.log_interval:
+            self.log()
+
+    def finish(self):
+        self.log()
+
+    def log(self):
+        self.last_log_time = time.time()
+
+        if self.num_scenarios is None:
+            message = 'Completed %d scenarios, %.1f scenarios/s' % (self.num_completed, self.scenarios_per_second)
+        else:
+            message = 'Completed %d/%d scenarios, %.1f scenarios/s' % (self.num_completed, self.num_scenarios, \
+                self.scenarios_per_second)
+        if self.eta_seconds is not None and self.num_completed < self.num_scenarios:
+            message += ', ETA %.0fs' % self.eta_seconds
+        if self.utilization is not None:
+            message += ', utilization %.0f%%' % (100 * self.utilization)
+        if len(self.slowest_scenarios) > 0:
+            message += ', slowest %s' % ', '.join('#%d %.2fs' % (backtest_id, duration) for duration, backtest_id \
+                in sorted(self.slowest_scenarios, reverse=True))
+        if self.running_best is not None:
+            message += ', best %.4f (#%d)' % self.running_best
+        log.info(message)
@@ -1,17 +1,169 @@
+from analytics import compute_optimizer_metric
+from ParameterSpace import ParameterGrid
+from ResultsArchive import ResultsArchive
+import numpy as np
 import pickle
+import copy
 import logging as log
 from datetime import datetime
 
 
 class OptimizationResults(object):
 
-    def __init__(self, backtest_results, optimal_parameters, parameter_sets):
+    def __init__(self, backtest_results, optimal_parameters, parameter_sets, backtest_summaries=None, fidelities=None,
+        pareto_front=None):
+        # When summaries are given, the backtest results only hold the full results of the top scenarios. The backtest
+        # results may also be a result sink which spills the scenarios to disk, see MemmapResultSink
         self.backtest_results = backtest_results
         self.optimal_parameters = optimal_parameters
         self.parameter_sets = parameter_sets
+        self.backtest_summaries = backtest_summaries
 
-    def save_pickle(self, file_uri):
+        # Fraction of the date range each parameter set was last evaluated on by multi-fidelity optimizers
+        self.fidelities = fidelities
+
+        # Positions of the parameter sets not dominated on every objective, when optimizing several objectives
+        self.pareto_front = pareto_front
+
+        # Metric values of the backtest results, computed once per metric and frequency
+        self.optimization_metrics = {}
+
+        # The (shard index, number of shards) and the full grid's size of grid search shards, see merge
+        self.shard = None
+        self.grid_size = None
+
+    @property
+    def pareto_parameter_sets(self):
+        if self.pareto_front is None:
+            return None
+
+        return [self.parameter_sets[i] for i in self.pareto_front]
+
+    def get_optimization_metrics(self, optimization_metric, frequency):
+        key = (optimization_metric.lower(), frequency.lower())
+        if key not in self.optimization_metrics:
+            self.optimization_metrics[key] = compute_optimizer_metric.compute_optimizer_metrics(optimization_metric, \
+                self.backtest_results, frequency)
+
+        return self.optimization_metrics[key]
+
+    def cache_optimization_metrics(self, optimization_metric, frequency, optimization_metrics):
+        self.optimization_metrics[(optimization_metric.lower(), frequency.lower())] = optimization_metrics
+
+    def get_top_n_indices(self, num_results, optimization_metric, ascending, frequency):
+        return compute_optimizer_metric.sorted_metric_indices(self.get_optimization_metrics(optimization_metric, \
+            frequency), num_results, ascending)
+
+    def save_pickle(self, file_uri, name='optimization_results'):
         log.info('Storing the results...')
-    	pickle.dump(self, open('%s/optimization_results_%s.p' % (file_uri, datetime.now()), "wb"))
+    	pickle.dump(self, open('%s/%s_%s.p' % (file_uri, name, datetime.now()), "wb"))
         log.info('Results stored!')
     	print
+
+    def save_columnar(self, file_uri, name='optimization_results'):
+        return self.write_columnar('%s/%s_%s' % (file_uri, name, datetime.now()))
+
+    def write_columnar(self, archive_uri):
+        # Summaries carry the statistics of every scenario, otherwise the cached metrics of the backtest results
+        if self.backtest_summaries is not None:
+            parameter_metrics = dict((metric, [getattr(summary, metric) for summary in self.backtest_summaries]) \
+                for metric in ('optimization_metric', 'final_equity', 'sharpe_ratio', 'max_drawdown', 'trade_count'))
+        else:
+            parameter_metrics = dict((metric, optimization_metrics) for (metric, frequency), optimization_metrics \
+                in self.optimization_metrics.iteritems())
+
+        optimal_index = list(self.parameter_sets).index(self.optimal_parameters)
+        return ResultsArchive.write(archive_uri, self.backtest_results, self.parameter_sets, parameter_metrics, \
+            optimal_index)
+
+    @staticmethod
+    def load_pickle(file_uri):
+        with open(file_uri, 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def merge(shard_results, optimization_metric, ascending, frequency):
+        # Shards hold disjoint slices of one parameter grid, their scenarios are put back in grid order
+        if any(not isinstance(results.parameter_sets, ParameterGrid) or getattr(results, 'shard', None) is None \
+            for results in shard_results):
+            raise ValueError("Only the results of grid search shards can be merged.")
+
+        # Every shard of one grid has to be given exactly once, or the optimum would only be over part of the grid
+        num_shards = shard_results[0].shard[1]
+        if sorted(results.shard for results in shard_results) != [(i, num_shards) for i in range(num_shards)]:
+            raise ValueError("The shards to merge must be the shards 0 to %d of %d, each given once." \
+                % (num_shards - 1, num_shards))
+
+        parameter_space = shard_results[0].parameter_sets.parameter_space
+        if any(results.parameter_sets.parameter_space.definition != parameter_space.definition \
+            for results in shard_results):
+            raise ValueError("The shards to merge must share their parameter space.")
+
+        grid_size = shard_results[0].grid_size
+        if any(results.grid_size != grid_size for results in shard_results) or \
+            sum(len(results.parameter_sets) for results in shard_results) != grid_size:
+            raise ValueError("The shards to merge do not cover the grid of %d parameter sets." % grid_size)
+
+        grid_indices = np.concatenate([results.parameter_sets.grid_indices(np.arange(len(results.parameter_sets))) \
+            for results in shard_results])
+        order = np.argsort(grid_indices, kind='mergesort')
+        if np.any(np.diff(grid_indices[order]) == 0):
+            raise ValueError("The shards to merge overlap.")
+        parameter_sets = ParameterGrid(parameter_space, grid_indices[order])
+
+        # Map each shard's backtest ids onto the positions of the merged scenarios
+        offsets = np.cumsum([0] + [len(results.parameter_sets) for results in shard_results])
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+
+        renumber = lambda evaluation, shard: OptimizationResults._renumbered(evaluation, \
+            positions[offsets[shard] + evaluation.backtest_id])
+
+        objectives = [optimization_metric] if isinstance(optimization_metric, basestring) else list(optimization_metric)
+        if not isinstance(ascending, (list, tuple)):
+            ascending = [ascending] * len(objectives)
+
+        # Rank the merged scenarios on the shards' metrics, so nothing is recomputed
+        is_summary = [results.backtest_summaries is not None for results in shard_results]
+        if any(is_summary) and not all(is_summary):
+            raise ValueError("The shards to merge must share their result mode.")
+
+        if not is_summary[0]:
+            evaluations = [renumber(result, shard) for shard, results in enumerate(shard_results) \
+                for result in results.backtest_results]
+            objective_metrics = [np.concatenate([results.get_optimization_metrics(objective, frequency) \
+                for results in shard_results])[order] for objective in objectives]
+        else:
+            evaluations = [renumber(summary, shard) for shard, results in enumerate(shard_results) \
+                for summary in results.backtest_summaries]
+            objective_metrics = [np.array([summary.objective_metrics[i] for summary in evaluations], \
+                dtype=float)[order] for i in range(len(objectives))]
+        evaluations = [evaluations[i] for i in order]
+
+        optimal_idx, pareto_front = compute_optimizer_metric.optimal_index(objective_metrics, ascending)
+        optimal_parameters = parameter_sets[optimal_idx]
+
+        if not is_summary[0]:
+            merged_results = OptimizationResults(evaluations, optimal_parameters, parameter_sets, \
+                pareto_front=pareto_front)
+            for objective, optimization_metrics in zip(objectives, objective_metrics):
+                merged_results.cache_optimization_metrics(objective, frequency, optimization_metrics)
+        else:
+            # Keep the full results of the top scenarios over all shards
+            num_results = max(len(results.backtest_results) for results in shard_results)
+            top_results = dict((result.backtest_id, result) for result in (renumber(result, shard) \
+                for shard, results in enumerate(shard_results) for result in results.backtest_results))
+            top_ids = np.array(sorted(top_results), dtype=np.int64)
+            sorted_idices = top_ids[compute_optimizer_metric.sorted_metric_indices(objective_metrics[0][top_ids], \
+                num_results, ascending[0])]
+            merged_results = OptimizationResults([top_results[i] for i in sorted_idices], optimal_parameters, \
+                parameter_sets, evaluations, pareto_front=pareto_front)
+
+        return merged_results
+
+    @staticmethod
+    def _renumbered(evaluation, backtest_id):
+        evaluation = copy.copy(evaluation)
+        evaluation.backtest_id = int(backtest_id)
+
+        return evaluation
@@ -1,13 +1,83 @@
 from analytics import compute_optimizer_metric
+from WorkerPool import WorkerPool
+from BacktestSummary import BacktestSummary
+from IndicatorCache import IndicatorCache
+from OptimizationResults import OptimizationResults
+from OptimizationProgress import OptimizationProgress
+from BacktestResultStore import BacktestResultStore
+from ParameterSpace import ParameterSpace
+import Backtester as b
 import multiprocessing as mp
 import numpy as np
-import operator
+import logging as log
+import itertools
+import socket
+import time
+import copy
+import os
 
 
+# Every optimization scenario starts with the same cash
+BACKTEST_CASH = 10000
+
+def _backtest(backtest_args):
+    # Extract backtest arguments
+    backtest_id, parameters, trading_algorithm, commission, ticker_spreads, data, start_date, end_date = backtest_args
+
+    # Setup the trading algorithm and backtester, scenarios sharing a worker must not share the algorithm's state
+    trading_algorithm = copy.deepcopy(trading_algorithm)
+    trading_algorithm.set_parameters(parameters)
+    backtester = b.Backtester(backtest_id, trading_algorithm, BACKTEST_CASH, commission, ticker_spreads)
+
+    return backtester.run(data, start_date, end_date)
+
+def _backtest_summary(summary_args):
+    # Extract summary arguments
+    backtest_args, optimization_metric, frequency = summary_args
+
+    # Only send the summary of the backtest back to the parent process
+    return BacktestSummary(_backtest(backtest_args), optimization_metric, frequency)
+
+def _timed_evaluation(evaluation_args):
+    # Extract evaluation arguments
+    func, func_args = evaluation_args
+
+    # Time the scenario in the worker, so the parent can report each worker's utilization and the slowest scenarios
+    started = time.time()
+    evaluation = func(func_args)
+
+    return evaluation, time.time() - started, _worker_name()
+
+def _worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+def _backtest_chunk(chunk_args):
+    # Extract chunk arguments
+    backtest_ids, grid_indices, parameter_space, trading_algorithm, commission, ticker_spreads, data, start_date, \
+        end_date, optimization_metric, frequency, result_mode = chunk_args
+
+    # Decode the parameter sets in the worker, so only their grid indices are sent over
+    evaluations = []
+    durations = []
+    for backtest_id, grid_index in zip(backtest_ids, grid_indices):
+        backtest_args = (int(backtest_id), parameter_space.decode(int(grid_index)), trading_algorithm, commission, \
+            ticker_spreads, data, start_date, end_date)
+
+        started = time.time()
+        if result_mode == 'summary':
+            evaluations.append(_backtest_summary((backtest_args, optimization_metric, frequency)))
+        else:
+            evaluations.append(_backtest(backtest_args))
+        durations.append(time.time() - started)
+
+    # The durations let the parent size the next chunks and report each worker's utilization
+    return evaluations, durations, _worker_name()
+
 class Optimizer(object):
 
     def __init__(self, num_processors, trading_algorithm, optimization_metric, optimization_metric_ascending,
-        optimization_parameters, frequency):
+        optimization_parameters, frequency, commission=0.0, ticker_spreads=None, worker_pool=None,
+        result_mode='full', top_n_results=1, result_store=None):
 
         # Set processor count for parallelization
         if(num_processors > mp.cpu_count()):
@@ -15,11 +85,379 @@ class Optimizer(object):
         else:
             self.num_processors = num_processors
 
+        if result_mode not in ('full', 'summary'):
+            raise ValueError("The result mode %s is not supported." % result_mode)
+
         self.trading_algorithm = trading_algorithm
-        self.optimization_metric = optimization_metric
-        self.optimization_metric_ascending = optimization_metric_ascending
+        self.commission = commission
+        self.ticker_spreads = ticker_spreads
+
+        # Without given spreads every ticker trades at its quoted prices
+        if self.ticker_spreads is None and trading_algorithm is not None:
+            self.ticker_spreads = [0.0] * len(trading_algorithm.tickers)
+
+        # Several objectives may be optimized together, the first one drives the search and picks the optimum
+        if isinstance(optimization_metric, basestring):
+            self.objectives = [optimization_metric]
+        else:
+            self.objectives = list(optimization_metric)
+        if isinstance(optimization_metric_ascending, (list, tuple)):
+            self.objectives_ascending = [bool(ascending) for ascending in optimization_metric_ascending]
+        else:
+            self.objectives_ascending = [bool(optimization_metric_ascending)] * len(self.objectives)
+
+        if len(self.objectives) == 0 or len(self.objectives) != len(self.objectives_ascending):
+            raise ValueError("Every optimization metric needs its own ascending flag.")
+
+        self.optimization_metric = self.objectives[0]
+        self.optimization_metric_ascending = self.objectives_ascending[0]
         self.optimization_parameters = optimization_parameters
         self.frequency = frequency
+        self.result_mode = result_mode
+        self.top_n_results = top_n_results
+        self.result_store = result_store
+        self.data_fingerprints = None
+        self.indicator_cache = None
+
+        # The best first objective and backtest id seen so far by optimizers streaming their evaluations
+        self.running_best = None
+
+        # Stochastic optimizers may seed their search with the top parameter sets of the previous run, e.g. the
+        # previous walk forward window, and only search a trust region around them while the seeds still perform
+        self.num_warm_start_seeds = 0
+        self.trust_region_radius = 0.2
+        self.max_seed_drop = 0.5
+        self.warm_start_seeds = []
+
+        # Progress is logged every interval and handed to the callback as each evaluation completes, optimizers
+        # evaluating in batches report the progress of their whole run, see start_progress
+        self.progress_callback = None
+        self.progress_interval = 10.0
+        self.progress = None
+
+        # Reuse the caller's worker pool when given, otherwise own a pool which lives across runs
+        self.owns_worker_pool = worker_pool is None
+        if self.owns_worker_pool:
+            self.worker_pool = WorkerPool(self.num_processors)
+        else:
+            self.worker_pool = worker_pool
+
+    def close(self):
+        # Only shut down the worker pool if it was not handed over by the caller
+        if self.owns_worker_pool:
+            self.worker_pool.close()
+
+        if self.indicator_cache is not None:
+            self.indicator_cache.close()
+            self.indicator_cache = None
+
+    def spawn(self):
+        # A copy sharing the worker pool and configuration, with a run state of its own so copies can run concurrently
+        optimizer = copy.copy(self)
+        optimizer.owns_worker_pool = False
+        optimizer.indicator_cache = None
+        optimizer.running_best = None
+        optimizer.progress = None
+        optimizer.data_fingerprints = None
+
+        return optimizer
+
+    def evaluate(self, parameter_sets, data, start_date, end_date, first_backtest_id=0, backtest_ids=None):
+        if backtest_ids is None:
+            backtest_ids = range(first_backtest_id, first_backtest_id + len(parameter_sets))
+
+        # Only run one scenario per effective parameter set, duplicates share its evaluation
+        memo = {}
+        unique_ids = []
+        unique_parameter_sets = []
+        for backtest_id, parameters in zip(backtest_ids, parameter_sets):
+            key = self.parameter_key(parameters)
+            if key not in memo:
+                memo[key] = len(unique_ids)
+                unique_ids.append(backtest_id)
+                unique_parameter_sets.append(parameters)
+
+        if len(unique_ids) < len(backtest_ids):
+            log.info('Skipping %d duplicate effective parameter sets' % (len(backtest_ids) - len(unique_ids)))
+
+        # Reuse the scenarios completed by earlier runs
+        stored_evaluations = {}
+        if self.result_store is not None:
+            stored_evaluations, scenario_keys = self.load_stored_evaluations(unique_ids, unique_parameter_sets, data, \
+                start_date, end_date)
+        run_ids = [backtest_id for backtest_id in unique_ids if backtest_id not in stored_evaluations]
+        run_parameter_sets = [parameters for backtest_id, parameters in zip(unique_ids, unique_parameter_sets) \
+            if backtest_id not in stored_evaluations]
+
+        # Prepare input data for running parallel backtests
+        backtest_args = self._backtest_args(run_ids, run_parameter_sets, data, start_date, end_date)
+
+        # Run all backtest scenarios in parallel, only returning summaries if requested
+        if self.result_mode == 'summary':
+            func = _backtest_summary
+            backtest_args = itertools.izip(
+                backtest_args,
+                itertools.repeat(self.objectives),
+                itertools.repeat(self.frequency)
+            )
+        else:
+            func = _backtest
+
+        # Take the evaluations in the order they complete, so no worker waits on a slow scenario ahead of it
+        chunksize = max(1, int(np.ceil(len(run_ids) / (4.0 * self.worker_pool.num_processors))))
+        unique_positions = dict((backtest_id, i) for i, backtest_id in enumerate(unique_ids))
+        unique_evaluations = [stored_evaluations.get(backtest_id) for backtest_id in unique_ids]
+        for evaluation in stored_evaluations.itervalues():
+            self.update_running_best(evaluation)
+
+        progress = self.progress or self.create_progress(len(run_ids))
+        for evaluation, duration, worker_name in self.worker_pool.imap_unordered(_timed_evaluation, \
+            itertools.izip(itertools.repeat(func), backtest_args), chunksize):
+            unique_evaluations[unique_positions[evaluation.backtest_id]] = evaluation
+            self.update_running_best(evaluation)
+            progress.update([evaluation.backtest_id], [duration], worker_name, running_best=self.running_best)
+
+            # Store each scenario as soon as it completes
+            if self.result_store is not None:
+                self.result_store.put(scenario_keys[evaluation.backtest_id], self._result_kind(), evaluation)
+
+        # The progress of a whole run also counts the scenarios which did not have to be run against its budget
+        if self.progress is None:
+            progress.finish()
+        elif len(run_ids) < len(backtest_ids):
+            run_id_set = set(run_ids)
+            progress.update([backtest_id for backtest_id in backtest_ids if backtest_id not in run_id_set], \
+                running_best=self.running_best)
+
+        # Share the memoized evaluations with the duplicate parameter sets
+        evaluations = []
+        for backtest_id, parameters in zip(backtest_ids, parameter_sets):
+            evaluation = unique_evaluations[memo[self.parameter_key(parameters)]]
+            if evaluation.backtest_id != backtest_id:
+                evaluation = copy.copy(evaluation)
+                evaluation.backtest_id = backtest_id
+            evaluations.append(evaluation)
+
+        return evaluations
+
+    def parameter_key(self, parameters):
+        # Parameter sets which the trading algorithm treats the same are keyed the same
+        if self.trading_algorithm is None:
+            return tuple(sorted(parameters.items()))
+        canonical_parameters = self.trading_algorithm.canonicalize_parameters(parameters)
+
+        return tuple(sorted(canonical_parameters.items()))
+
+    def create_parameter_space(self):
+        # Parameter constraints are checked on the parameter sets the trading algorithm runs with
+        if self.trading_algorithm is None:
+            return ParameterSpace(self.optimization_parameters)
+
+        return ParameterSpace(self.optimization_parameters, self.trading_algorithm.canonicalize_parameters, \
+            self.trading_algorithm.canonicalizes_independently())
+
+    def load_stored_evaluations(self, backtest_ids, parameter_sets, data, start_date, end_date):
+        # Return the stored evaluations by backtest id, along with the scenario keys of those which were never run
+        data_fingerprint = self.data_fingerprint(data)
+
+        # Summaries can also be recovered from stored full results
+        kinds = [self._result_kind()]
+        if self.result_mode == 'summary':
+            kinds.append('full')
+
+        stored_evaluations = {}
+        scenario_keys = {}
+        for backtest_id, parameters in itertools.izip(backtest_ids, parameter_sets):
+            scenario_key = self.result_store.scenario_key(self.trading_algorithm, parameters, data_fingerprint,
+                start_date, end_date, BACKTEST_CASH, self.commission, self.ticker_spreads)
+            stored = self.result_store.get(scenario_key, kinds, int(backtest_id))
+
+            if stored is None:
+                scenario_keys[backtest_id] = scenario_key
+            elif stored[0] != self._result_kind():
+                stored_evaluations[backtest_id] = BacktestSummary(stored[1], self.objectives, self.frequency)
+            else:
+                stored_evaluations[backtest_id] = stored[1]
+
+        if len(stored_evaluations) > 0:
+            log.info('Loaded %d stored backtests' % len(stored_evaluations))
+
+        return stored_evaluations, scenario_keys
+
+    def data_fingerprint(self, data):
+        # The fingerprint of the last data set is kept, every run of an optimizer usually sees the same data
+        if self.data_fingerprints is None or self.data_fingerprints[0] is not data:
+            self.data_fingerprints = (data, BacktestResultStore.data_fingerprint(data))
+
+        return self.data_fingerprints[1]
+
+    def evaluate_async(self, backtest_id, parameters, data, start_date, end_date, callback):
+        # Run a single backtest scenario in the background, the callback receives its evaluation along with how long
+        # it took and the worker which ran it
+        backtest_args = next(self._backtest_args([backtest_id], [parameters], data, start_date, end_date))
+
+        if self.result_mode == 'summary':
+            return self.worker_pool.apply_async(_timed_evaluation, \
+                ((_backtest_summary, (backtest_args, self.objectives, self.frequency)),), callback)
+        else:
+            return self.worker_pool.apply_async(_timed_evaluation, ((_backtest, backtest_args),), callback)
+
+    def evaluation_metric(self, evaluation):
+        # Summaries already carry the optimization metric computed by the worker
+        if self.result_mode == 'summary':
+            return evaluation.optimization_metric
+        else:
+            return compute_optimizer_metric.compute_optimizer_metric(self.optimization_metric, evaluation, \
+                self.frequency)
+
+    def create_progress(self, num_scenarios):
+        return OptimizationProgress(num_scenarios, self.worker_pool.num_processors, self.progress_callback, \
+            self.progress_interval)
+
+    def start_progress(self, num_scenarios):
+        # Batches evaluated until finish_progress update one progress, the number of scenarios is the run's budget
+        # or None when only its time is limited
+        self.running_best = None
+        self.progress = self.create_progress(num_scenarios)
+
+        return self.progress
+
+    def finish_progress(self):
+        if self.progress is not None:
+            self.progress.finish()
+            self.progress = None
+
+    def update_running_best(self, evaluation):
+        # Returns the evaluation's optimization metric, so callers do not compute it again
+        optimization_metric = self.evaluation_metric(evaluation)
+        if np.isnan(optimization_metric):
+            return optimization_metric
+
+        if self.running_best is None or (optimization_metric < self.running_best[0] if \
+            self.optimization_metric_ascending else optimization_metric > self.running_best[0]):
+            self.running_best = (optimization_metric, evaluation.backtest_id)
+
+        return optimization_metric
+
+    def set_warm_start(self, optimization_results):
+        # Keep the optimum and the top parameter sets of a run along with their optimization metrics
+        if self.num_warm_start_seeds <= 0:
+            return
+
+        if optimization_results.backtest_summaries is not None:
+            optimization_metrics = np.array([summary.optimization_metric for summary in \
+                optimization_results.backtest_summaries], dtype=float)
+        else:
+            optimization_metrics = optimization_results.get_optimization_metrics(self.optimization_metric, \
+                self.frequency)
+
+        parameter_sets = optimization_results.parameter_sets
+        top_indices = Optimizer.get_sorted_metric_indices(optimization_metrics, self.num_warm_start_seeds, \
+            self.optimization_metric_ascending)
+        self.warm_start_seeds = [(parameter_sets[i], optimization_metrics[i]) for i in top_indices]
+        if optimization_results.optimal_parameters not in [parameters for parameters, metric in self.warm_start_seeds]:
+            optimal_idx = list(parameter_sets).index(optimization_results.optimal_parameters)
+            self.warm_start_seeds[-1] = (parameter_sets[optimal_idx], optimization_metrics[optimal_idx])
+
+    def warm_start_region(self, seed_evaluations):
+        # The trust region around the seeds, or None for a global search once the best seed lost too much of its
+        # optimization metric on the new run's data
+        if len(seed_evaluations) == 0:
+            return None
+
+        previous_metrics = np.array([metric for parameters, metric in self.warm_start_seeds], dtype=float)
+        metrics = np.array([self.evaluation_metric(evaluation) for evaluation in seed_evaluations], dtype=float)
+        if self.optimization_metric_ascending:
+            previous_metrics, metrics = -previous_metrics, -metrics
+        if np.isnan(metrics).all() or np.isnan(previous_metrics).all():
+            return None
+
+        previous_best = np.nanmax(previous_metrics)
+        drop = (previous_best - np.nanmax(metrics)) / max(abs(previous_best), 1e-12)
+        if drop > self.max_seed_drop:
+            log.info('Warm start seeds dropped by %.0f%%, searching globally' % (100 * drop))
+            return None
+
+        return self.parameter_space.trust_region([parameters for parameters, metric in self.warm_start_seeds], \
+            self.trust_region_radius)
+
+    def rebuild_backtest_results(self, data, start_date, end_date, backtest_ids):
+        # Re-run the requested scenarios in parallel to recover their full results
+        parameter_sets = [self.optimization_parameter_sets[i] for i in backtest_ids]
+        backtest_args = self._backtest_args(backtest_ids, parameter_sets, data, start_date, end_date)
+
+        return self.worker_pool.map(func=_backtest, iterable=backtest_args)
+
+    def build_results(self, evaluations, data, start_date, end_date):
+        # Compute every objective of all scenarios at once, summaries already carry the objectives
+        if self.result_mode == 'full':
+            objective_metrics = [compute_optimizer_metric.compute_optimizer_metrics(objective, evaluations, \
+                self.frequency) for objective in self.objectives]
+        else:
+            objective_metrics = [np.array([summary.objective_metrics[i] for summary in evaluations], dtype=float) \
+                for i in range(len(self.objectives))]
+
+        # With several objectives, the optimal parameters are the best on the first objective among the Pareto front
+        optimal_idx, pareto_front = compute_optimizer_metric.optimal_index(objective_metrics, self.objectives_ascending)
+        optimal_parameters = self.optimization_parameter_sets[optimal_idx]
+
+        if self.result_mode == 'full':
+            # Save results along with their metrics
+            self.results = OptimizationResults(evaluations, optimal_parameters, self.optimization_parameter_sets, \
+                pareto_front=pareto_front)
+            for objective, optimization_metrics in zip(self.objectives, objective_metrics):
+                self.results.cache_optimization_metrics(objective, self.frequency, optimization_metrics)
+        else:
+            # Rebuild the full results of the top scenarios only
+            num_results = min(self.top_n_results, len(evaluations))
+            sorted_idices = Optimizer.get_sorted_metric_indices(objective_metrics[0], num_results, \
+                self.optimization_metric_ascending)
+            backtest_results = self.rebuild_backtest_results(data, start_date, end_date, sorted_idices)
+
+            # Save results
+            self.results = OptimizationResults(backtest_results, optimal_parameters, \
+                self.optimization_parameter_sets, evaluations, pareto_front=pareto_front)
+
+        return self.results
+
+    def indicator_trading_algorithm(self, parameter_sets, data):
+        # Algorithms which do not declare indicators are sent to the workers as they are
+        parameter_sets = iter(parameter_sets)
+        first_parameters = next(parameter_sets, None)
+        if first_parameters is None or len(self.trading_algorithm.indicators(first_parameters)) == 0:
+            return self.trading_algorithm
+
+        # Indicators are cached per data set and extended with those of new parameter sets
+        if self.indicator_cache is None or self.indicator_cache.data is not data:
+            if self.indicator_cache is not None:
+                self.indicator_cache.close()
+            self.indicator_cache = IndicatorCache(data)
+        self.indicator_cache.update(self.trading_algorithm, itertools.chain([first_parameters], parameter_sets))
+
+        # Hand the workers a copy of the trading algorithm which reads the shared indicators
+        trading_algorithm = copy.copy(self.trading_algorithm)
+        trading_algorithm.indicator_cache = self.indicator_cache
+
+        return trading_algorithm
+
+    def _result_kind(self):
+        # Summaries depend on the metric they were ranked by
+        if self.result_mode == 'summary':
+            return 'summary/%s/%s' % (','.join(self.objectives), self.frequency)
+
+        return 'full'
+
+    def _backtest_args(self, backtest_ids, parameter_sets, data, start_date, end_date):
+        return itertools.izip(
+            backtest_ids,
+            parameter_sets,
+            itertools.repeat(self.indicator_trading_algorithm(parameter_sets, data)),
+            itertools.repeat(self.commission),
+            itertools.repeat(self.ticker_spreads),
+            itertools.repeat(data),
+            itertools.repeat(start_date),
+            itertools.repeat(end_date)
+        )
 
     @staticmethod
     def get_optimal_parameters(backtest_results, optimization_metric, optimization_parameter_sets, ascending, frequency):
@@ -35,17 +473,12 @@ class Optimizer(object):
 
     @staticmethod
     def get_sorted_optimal_indices(backtest_results, num_results, optimization_metric, ascending, frequency):
-        # Compute the optimization metric per backtest result
-        optimization_metrics = np.ndarray(len(backtest_results))
-        for result in backtest_results:
-            optimization_metrics[result.backtest_id] = compute_optimizer_metric.compute_optimizer_metric(optimization_metric, \
-                result, frequency)
+        # Compute the optimization metric of all backtest results at once
+        optimization_metrics = compute_optimizer_metric.compute_optimizer_metrics(optimization_metric, \
+            backtest_results, frequency)
 
-        # Sort optimizations metrics and save their indices
-        sorted_idices = []
-        if(ascending):
-            sorted_idices = [i[0] for i in sorted(enumerate(optimization_metrics), key=operator.itemgetter(1))]
-        else:
-            sorted_idices = [i[0] for i in sorted(enumerate(optimization_metrics), key=operator.itemgetter(1), reverse=True)]
+        return Optimizer.get_sorted_metric_indices(optimization_metrics, num_results, ascending)
 
-        return [sorted_idices[i] for i in range(num_results)]
\ No newline at end of file
+    @staticmethod
+    def get_sorted_metric_indices(optimization_metrics, num_results, ascending):
+        return compute_optimizer_metric.sorted_metric_indices(optimization_metrics, num_results, ascending)
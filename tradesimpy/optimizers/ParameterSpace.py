@@ -0,0 +1,338 @@
+import numpy as np
+import operator
+import re
+
+
+class ParameterDimension(object):
+
+    SCALES = ('float', 'int', 'log', 'categorical')
+
+    def __init__(self, name, space):
+        self.name = name
+
+        # A categorical space is given as {"categorical": [value, ...]}
+        if isinstance(space, dict):
+            if 'categorical' not in space or len(space['categorical']) == 0:
+                raise ValueError("The categorical parameter space of %s must list its values." % name)
+
+            self.values = list(space['categorical'])
+            self.start = 0
+            self.end = len(self.values) - 1
+            self.num = len(self.values)
+            self.scale = 'categorical'
+            return
+
+        # A numeric space is given as [start, end, count] with an optional scale of 'float', 'int' or 'log'
+        if len(space) < 2:
+            raise ValueError("The parameter space of %s must provide at least a start and an end." % name)
+
+        self.values = None
+        self.start = space[0]
+        self.end = space[1]
+        self.num = int(space[2]) if len(space) > 2 else 1
+        self.scale = space[3].lower() if len(space) > 3 else 'float'
+
+        if self.scale not in ParameterDimension.SCALES[:3]:
+            raise ValueError("The parameter scale %s of %s is not supported." % (self.scale, name))
+        if self.start > self.end:
+            raise ValueError("The parameter space of %s must start before it ends." % name)
+        if self.scale == 'log' and self.start <= 0:
+            raise ValueError("The log scaled parameter space of %s must be strictly positive." % name)
+
+    def grid_values(self):
+        # Discretize the parameter space, integer dimensions drop values which round to the same integer
+        if self.scale == 'categorical':
+            return list(self.values)
+        elif self.scale == 'int':
+            return sorted(set(int(round(v)) for v in np.linspace(self.start, self.end, self.num)))
+        elif self.scale == 'log':
+            return list(np.logspace(np.log10(self.start), np.log10(self.end), self.num))
+        else:
+            return list(np.linspace(self.start, self.end, self.num))
+
+    def from_unit(self, u):
+        # Map a point of the unit interval onto the parameter's range
+        if self.scale == 'categorical':
+            return self.values[min(int(u * len(self.values)), len(self.values) - 1)]
+        elif self.scale == 'int':
+            return int(min(np.floor(self.start + u * (self.end - self.start + 1)), self.end))
+        elif self.scale == 'log':
+            return float(np.exp(np.log(self.start) + u * (np.log(self.end) - np.log(self.start))))
+        else:
+            return float(self.start + u * (self.end - self.start))
+
+    def to_unit(self, value):
+        # Map a parameter value onto the middle of the unit interval slice which maps back onto it
+        if self.scale == 'categorical':
+            return (self.values.index(value) + 0.5) / len(self.values)
+        elif self.scale == 'int':
+            return (value - self.start + 0.5) / (self.end - self.start + 1)
+        elif self.end == self.start:
+            return 0.5
+        elif self.scale == 'log':
+            return float((np.log(value) - np.log(self.start)) / (np.log(self.end) - np.log(self.start)))
+        else:
+            return float(value - self.start) / (self.end - self.start)
+
+
+class ParameterConstraint(object):
+
+    OPERATORS = {
+        '<':    operator.lt,
+        '<=':   operator.le,
+        '>':    operator.gt,
+        '>=':   operator.ge,
+        '==':   operator.eq,
+        '!=':   operator.ne
+    }
+
+    def __init__(self, expression, names):
+        # A constraint compares two parameters, or a parameter and a number, e.g. "ma_short_window < ma_long_window"
+        match = re.match(r"^\s*([\w.+-]+)\s*(<=|>=|==|!=|<|>)\s*([\w.+-]+)\s*$", expression)
+        if match is None:
+            raise ValueError("The parameter constraint '%s' is invalid." % expression)
+
+        self.expression = expression
+        self.left = self._parse_operand(match.group(1), names)
+        self.compare = ParameterConstraint.OPERATORS[match.group(2)]
+        self.right = self._parse_operand(match.group(3), names)
+
+    def is_satisfied(self, parameters):
+        return self.compare(self._value(self.left, parameters), self._value(self.right, parameters))
+
+    def _parse_operand(self, operand, names):
+        if operand in names:
+            return ('name', operand)
+
+        try:
+            return ('number', float(operand))
+        except ValueError:
+            raise ValueError("The parameter constraint '%s' refers to the unknown parameter %s." \
+                % (self.expression, operand))
+
+    def _value(self, operand, parameters):
+        kind, value = operand
+        return parameters[value] if kind == 'name' else value
+
+
+class ParameterSpace(object):
+
+    MAX_REJECTION_ROUNDS = 100
+
+    def __init__(self, parameter_spaces, canonicalize=None, canonicalize_per_axis=False):
+        # Sort the dimensions by name so the space does not depend on the configuration's key order
+        self.dimensions = []
+        for name in sorted(parameter_spaces.keys()):
+            # Skip unused parameters and the constraints between parameters
+            if name == 'constraints' or len(parameter_spaces[name]) == 0:
+                continue
+
+            self.dimensions.append(ParameterDimension(name, parameter_spaces[name]))
+
+        self.constraints = [ParameterConstraint(expression, self.names) \
+            for expression in parameter_spaces.get('constraints', [])]
+
+        # Constraints hold on the parameter values the trading algorithm runs with, e.g. after casting to int, a
+        # canonicalization which maps every parameter on its own is applied to the axes rather than to each point
+        self.canonicalize = canonicalize
+        self.canonicalize_per_axis = canonicalize_per_axis
+
+        # Discretize every dimension so the grid can be addressed by a flat index, the last dimension varying fastest
+        self.axes = [dimension.grid_values() for dimension in self.dimensions]
+        self.radices = [len(axis) for axis in self.axes]
+        self.strides = []
+        stride = 1
+        for radix in reversed(self.radices):
+            self.strides.insert(0, stride)
+            stride *= radix
+        self.grid_size = stride if len(self.dimensions) > 0 else 0
+
+    def __getstate__(self):
+        # Workers only decode grid indices, bound canonicalization methods do not pickle
+        state = self.__dict__.copy()
+        state['canonicalize'] = None
+
+        return state
+
+    @property
+    def names(self):
+        return [dimension.name for dimension in self.dimensions]
+
+    @property
+    def definition(self):
+        # Spaces with the same definition have the same grid, e.g. to check shards split the same optimization
+        return (tuple(self.names), tuple(tuple(axis) for axis in self.axes), \
+            tuple(constraint.expression for constraint in self.constraints))
+
+    def is_feasible(self, parameters):
+        if self.canonicalize is not None and len(self.constraints) > 0:
+            parameters = self.canonicalize(parameters)
+
+        for constraint in self.constraints:
+            if not constraint.is_satisfied(parameters):
+                return False
+
+        return True
+
+    def decode(self, index):
+        # Decode a flat grid index into its parameter set
+        if index < 0 or index >= self.grid_size:
+            raise IndexError("The grid index %d is out of range." % index)
+
+        parameters = {}
+        for dimension, axis, stride, radix in zip(self.dimensions, self.axes, self.strides, self.radices):
+            parameters[dimension.name] = axis[(index // stride) % radix]
+
+        return parameters
+
+    def axis_positions(self, indices):
+        # Decode many flat grid indices at once into their position along every axis
+        indices = np.asarray(indices, dtype=np.int64)
+
+        return [(indices // stride) % radix for stride, radix in zip(self.strides, self.radices)]
+
+    def feasible_mask(self, indices):
+        mask = np.ones(len(indices), dtype=bool)
+
+        # Canonical parameter sets are checked one by one, they may depend on several parameters at once
+        if len(self.constraints) > 0 and self.canonicalize is not None and not self.canonicalize_per_axis:
+            for i, index in enumerate(indices):
+                mask[i] = self.is_feasible(self.decode(int(index)))
+
+        # Otherwise constraints compare whole arrays of parameter values at once
+        elif len(self.constraints) > 0:
+            values = {}
+            for dimension, axis, positions in zip(self.dimensions, self.canonical_axes(), \
+                self.axis_positions(indices)):
+                values[dimension.name] = np.asarray(axis)[positions]
+
+            for constraint in self.constraints:
+                mask &= constraint.is_satisfied(values)
+
+        return mask
+
+    def iter_feasible_indices(self, chunk_size, start=0, stop=None):
+        # Scan the grid lazily, one block of flat indices at a time
+        if stop is None or stop > self.grid_size:
+            stop = self.grid_size
+
+        for chunk_start in xrange(start, stop, chunk_size):
+            indices = np.arange(chunk_start, min(chunk_start + chunk_size, stop), dtype=np.int64)
+            yield indices[self.feasible_mask(indices)]
+
+    def canonical_axes(self):
+        # The canonical value of every axis position, only valid when parameters are canonicalized on their own
+        if self.canonicalize is None or self.grid_size == 0:
+            return self.axes
+        if not self.canonicalize_per_axis:
+            raise ValueError("The parameters are not canonicalized independently of each other.")
+
+        base_parameters = self.decode(0)
+        canonical_axes = []
+        for dimension, axis in zip(self.dimensions, self.axes):
+            canonical_axis = []
+            for value in axis:
+                parameters = dict(base_parameters)
+                parameters[dimension.name] = value
+                canonical_axis.append(self.canonicalize(parameters)[dimension.name])
+
+            canonical_axes.append(canonical_axis)
+
+        return canonical_axes
+
+    def axis_representatives(self):
+        # Map every axis position onto the first position of the same axis whose value canonicalizes the same
+        axis_representatives = []
+        for canonical_axis in self.canonical_axes():
+            first_positions = {}
+            representatives = np.empty(len(canonical_axis), dtype=np.int64)
+            for position, canonical_value in enumerate(canonical_axis):
+                representatives[position] = first_positions.setdefault(canonical_value, position)
+
+            axis_representatives.append(representatives)
+
+        return axis_representatives
+
+    def representative_indices(self, indices, axis_representatives):
+        # Re-encode flat grid indices with the representative position along every axis
+        representatives = np.zeros(len(indices), dtype=np.int64)
+        for positions, stride, representative in zip(self.axis_positions(indices), self.strides, axis_representatives):
+            representatives += representative[positions] * stride
+
+        return representatives
+
+    def from_unit(self, unit_point):
+        parameters = {}
+        for dimension, u in zip(self.dimensions, unit_point):
+            parameters[dimension.name] = dimension.from_unit(u)
+
+        return parameters
+
+    def to_unit(self, parameters):
+        return np.array([dimension.to_unit(parameters[dimension.name]) for dimension in self.dimensions])
+
+    def trust_region(self, parameter_sets, radius):
+        # The box around the given parameter sets, widened by the radius on every side of the unit hypercube
+        unit_points = np.array([self.to_unit(parameters) for parameters in parameter_sets])
+
+        return np.clip(unit_points.min(axis=0) - radius, 0.0, 1.0), np.clip(unit_points.max(axis=0) + radius, 0.0, 1.0)
+
+    def sample(self, num_samples, random_state, region=None):
+        return [self.from_unit(unit_point) for unit_point in self.sample_unit_points(num_samples, random_state, region)]
+
+    def sample_unit_points(self, num_samples, random_state, region=None):
+        feasible_points = []
+        lower, upper = region if region is not None else (0.0, 1.0)
+
+        # Draw uniformly from the unit hypercube, or the region's box within it, and reject points which map onto
+        # infeasible parameter sets
+        for i in range(ParameterSpace.MAX_REJECTION_ROUNDS):
+            unit_points = random_state.uniform(lower, upper, size=(num_samples - len(feasible_points), \
+                len(self.dimensions)))
+            for unit_point in unit_points:
+                if self.is_feasible(self.from_unit(unit_point)):
+                    feasible_points.append(unit_point)
+
+            if len(feasible_points) == num_samples:
+                return feasible_points
+
+        raise ValueError("Could not sample feasible parameter sets, check the parameter constraints.")
+
+
+class ParameterGrid(object):
+
+    def __init__(self, parameter_space, indices=None):
+        # A read-only sequence of grid parameter sets, decoded on demand from their flat grid indices
+        self.parameter_space = parameter_space
+        self.indices = indices
+
+    def __len__(self):
+        if self.indices is None:
+            return self.parameter_space.grid_size
+
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+
+        return self.parameter_space.decode(self.grid_index(i))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def grid_index(self, i):
+        if self.indices is None:
+            return i
+
+        return int(self.indices[i])
+
+    def grid_indices(self, positions):
+        # Vectorized grid_index for an array of positions
+        if self.indices is None:
+            return np.asarray(positions, dtype=np.int64)
+
+        return self.indices[positions]
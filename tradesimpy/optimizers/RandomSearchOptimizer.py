@@ -0,0 +1,97 @@
+from Optimizer import Optimizer
+import numpy as np
+import logging as log
+import time
+
+
+class RandomSearchOptimizer(Optimizer):
+
+    # Evaluation budget of searches which are given neither an evaluation nor a time budget
+    DEFAULT_MAX_EVALUATIONS = 100
+
+    def __init__(self, num_processors, trading_algorithm, commission, ticker_spreads, optimization_metric,
+        optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, result_mode='full',
+        top_n_results=1, max_evaluations=None, max_seconds=None, batch_size=None, seed=None, num_warm_start_seeds=0,
+        trust_region_radius=0.2, max_seed_drop=0.5, result_store=None):
+        super(RandomSearchOptimizer, self).__init__(num_processors, trading_algorithm, optimization_metric,
+            optimization_metric_ascending, optimization_parameters, frequency, commission=commission,
+            ticker_spreads=ticker_spreads, worker_pool=worker_pool, result_mode=result_mode,
+            top_n_results=top_n_results, result_store=result_store)
+
+        # A time budget alone is not cut short by the default evaluation budget
+        if max_evaluations is None and max_seconds is None:
+            max_evaluations = RandomSearchOptimizer.DEFAULT_MAX_EVALUATIONS
+
+        # Data members
+        self.parameter_space = self.create_parameter_space()
+        self.max_evaluations = max_evaluations
+        self.max_seconds = max_seconds
+        self.batch_size = batch_size
+        self.seed = seed
+        self.optimization_parameter_sets = []
+        self.num_warm_start_seeds = num_warm_start_seeds
+        self.trust_region_radius = trust_region_radius
+        self.max_seed_drop = max_seed_drop
+
+    def run(self, data, start_date, end_date):
+        # Seed every run the same way so that runs are reproducible
+        random_state = np.random.RandomState(self.seed)
+        batch_size = self.batch_size or 4 * self.worker_pool.num_processors
+
+        # Evaluate batches of random parameter sets in parallel until the budget is used up
+        self.optimization_parameter_sets = []
+        evaluations = []
+        start_time = time.time()
+
+        # Re-evaluate the seeds of the previous run first, the rest of the budget samples around them
+        seed_parameter_sets = [parameters for parameters, metric in self.warm_start_seeds]
+        self.start_progress(self._num_scenarios(len(seed_parameter_sets)))
+        evaluations.extend(self.evaluate(seed_parameter_sets, data, start_date, end_date))
+        self.optimization_parameter_sets.extend(seed_parameter_sets)
+        region = self.warm_start_region(evaluations)
+
+        while not self._budget_exhausted(start_time):
+            num_samples = self._batch_size(batch_size, len(evaluations), start_time)
+
+            parameter_sets = self.parameter_space.sample(num_samples, random_state, region)
+            evaluations.extend(self.evaluate(parameter_sets, data, start_date, end_date, len(evaluations)))
+            self.optimization_parameter_sets.extend(parameter_sets)
+
+        self.finish_progress()
+        log.info('Random search evaluated %d parameter sets in %.1f seconds' \
+            % (len(evaluations), time.time() - start_time))
+
+        # Find optimal parameters and save results
+        return self.build_results(evaluations, data, start_date, end_date)
+
+    def _batch_size(self, batch_size, num_evaluations, start_time):
+        num_samples = batch_size
+        if self.max_evaluations is not None:
+            num_samples = min(num_samples, self.max_evaluations - num_evaluations)
+
+        # Batches of a time budget are sized by the throughput so far so they end close to it, the first batch
+        # keeps every worker busy once to measure the throughput
+        if self.max_seconds is not None:
+            elapsed_seconds = time.time() - start_time
+            if num_evaluations == 0 or elapsed_seconds <= 0:
+                num_remaining = self.worker_pool.num_processors
+            else:
+                num_remaining = int((self.max_seconds - elapsed_seconds) * num_evaluations / elapsed_seconds)
+            num_samples = min(num_samples, max(num_remaining, self.worker_pool.num_processors))
+
+        return num_samples
+
+    def _num_scenarios(self, num_seeds):
+        # The seeds count against the evaluation budget, a time budget alone does not tell the number of scenarios
+        if self.max_evaluations is None:
+            return None
+
+        return max(self.max_evaluations, num_seeds)
+
+    def _budget_exhausted(self, start_time):
+        if self.max_evaluations is not None and len(self.optimization_parameter_sets) >= self.max_evaluations:
+            return True
+        if self.max_seconds is not None and (time.time() - start_time) >= self.max_seconds:
+            return True
+
+        return False
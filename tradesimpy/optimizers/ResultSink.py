@@ -0,0 +1,22 @@
+from analytics import optimizer_analytics
+
+
+class ResultSink(list):
+
+    # Optimizers collect their evaluations in a sink indexed by scenario position. This one keeps every result in
+    # memory, see MemmapResultSink for sweeps which do not fit into it.
+
+    def series_matrix(self, series_name, start=0, stop=None):
+        # Stack one series of a block of scenarios, row by row
+        return optimizer_analytics.return_matrix([getattr(result, series_name).values \
+            for result in self[start:stop]])
+
+    def put(self, position, result, metric=None):
+        # Only sinks ranking their results use the optimization metric
+        self[position] = result
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
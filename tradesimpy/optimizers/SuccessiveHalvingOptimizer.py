@@ -0,0 +1,117 @@
+from GridSearchOptimizer import GridSearchOptimizer
+from Optimizer import Optimizer
+from OptimizationResults import OptimizationResults
+import numpy as np
+import logging as log
+
+
+class SuccessiveHalvingOptimizer(GridSearchOptimizer):
+
+    def __init__(self, num_processors, trading_algorithm, commission, ticker_spreads, optimization_metric,
+        optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, result_mode='full',
+        top_n_results=1, eta=3, min_fraction=1.0 / 9, result_store=None):
+        super(SuccessiveHalvingOptimizer, self).__init__(num_processors, trading_algorithm, commission, ticker_spreads,
+            optimization_metric, optimization_metric_ascending, optimization_parameters, frequency, worker_pool,
+            result_mode, top_n_results, result_store=result_store)
+
+        if eta < 2:
+            raise ValueError("The SuccessiveHalvingOptimizer eta must be at least two.")
+        if not 0.0 < min_fraction <= 1.0:
+            raise ValueError("The SuccessiveHalvingOptimizer min_fraction must be between zero and one.")
+
+        # Data members
+        self.eta = eta
+        self.min_fraction = min_fraction
+        self.fidelities = self.get_fidelities(eta, min_fraction)
+
+    def run(self, data, start_date, end_date):
+        num_parameter_sets = len(self.optimization_parameter_sets)
+        evaluations = [None] * num_parameter_sets
+        fidelities = [None] * num_parameter_sets
+        survivors = range(num_parameter_sets)
+        self.start_progress(sum(self.get_num_survivors(num_parameter_sets)))
+
+        for fidelity in self.fidelities:
+            # Only run the surviving candidates on a longer slice of the date range, the running best only compares
+            # the candidates evaluated on the same slice
+            fidelity_data, fidelity_end_date = self._slice_data(data, end_date, fidelity)
+            self.running_best = None
+            parameter_sets = [self.optimization_parameter_sets[i] for i in survivors]
+            fidelity_evaluations = self.evaluate(parameter_sets, fidelity_data, start_date, fidelity_end_date, \
+                backtest_ids=survivors)
+
+            for backtest_id, evaluation in zip(survivors, fidelity_evaluations):
+                evaluations[backtest_id] = evaluation
+                fidelities[backtest_id] = fidelity
+
+            log.info('Evaluated %d parameter sets on %.0f%% of the date range' % (len(survivors), 100 * fidelity))
+
+            # Keep the best fraction of candidates for the next fidelity
+            if fidelity < 1.0:
+                num_survivors = max(1, int(np.ceil(len(survivors) / float(self.eta))))
+                sorted_idices = self._rank(fidelity_evaluations, num_survivors)
+                survivors = sorted([survivors[i] for i in sorted_idices])
+
+        self.finish_progress()
+
+        # Find optimal parameters among the candidates evaluated on the full date range
+        num_results = min(self.top_n_results, len(survivors))
+        sorted_idices = self._rank([evaluations[i] for i in survivors], num_results)
+        top_ids = [survivors[i] for i in sorted_idices]
+        optimal_parameters = self.optimization_parameter_sets[top_ids[0]]
+
+        # Save results, summaries only keep the full results of the top candidates
+        if self.result_mode == 'summary':
+            backtest_results = self.rebuild_backtest_results(data, start_date, end_date, top_ids)
+            self.results = OptimizationResults(backtest_results, optimal_parameters, self.optimization_parameter_sets, \
+                evaluations, fidelities)
+        else:
+            self.results = OptimizationResults(evaluations, optimal_parameters, self.optimization_parameter_sets, \
+                fidelities=fidelities)
+
+        return self.results
+
+    def _rank(self, evaluations, num_results):
+        # Failed metrics, e.g. without any trade on a short slice, always rank last
+        worst_metric = np.inf if self.optimization_metric_ascending else -np.inf
+        optimization_metrics = np.array([self.evaluation_metric(evaluation) for evaluation in evaluations], dtype=float)
+        optimization_metrics[np.isnan(optimization_metrics)] = worst_metric
+
+        return Optimizer.get_sorted_metric_indices(optimization_metrics, num_results, self.optimization_metric_ascending)
+
+    def _slice_data(self, data, end_date, fidelity):
+        if fidelity >= 1.0:
+            return data, end_date
+
+        # Measure the slice in tradable observations, i.e. those following the history window
+        tradable_dates = set()
+        for ticker_data in data.itervalues():
+            tradable_dates.update(ticker_data.index[self.trading_algorithm.history_window:])
+        tradable_dates = sorted(tradable_dates)
+
+        fidelity_end_date = tradable_dates[max(1, int(np.ceil(fidelity * len(tradable_dates)))) - 1]
+        fidelity_data = {}
+        for ticker, ticker_data in data.iteritems():
+            fidelity_data[ticker] = ticker_data[:fidelity_end_date]
+
+        return fidelity_data, fidelity_end_date
+
+    @staticmethod
+    def get_fidelities(eta, min_fraction):
+        # Grow the date range by a factor of eta per rung until the full range is used
+        fidelities = []
+        fidelity = min_fraction
+        while fidelity < 1.0 - 1e-9:
+            fidelities.append(fidelity)
+            fidelity *= eta
+        fidelities.append(1.0)
+
+        return fidelities
+
+    def get_num_survivors(self, num_candidates):
+        # Number of candidates evaluated on each rung, a fraction 1/eta of them survives to the next one
+        num_survivors = [num_candidates]
+        for fidelity in self.fidelities[1:]:
+            num_survivors.append(max(1, int(np.ceil(num_survivors[-1] / float(self.eta)))))
+
+        return num_survivors
@@ -0,0 +1,216 @@
+from RandomSearchOptimizer import RandomSearchOptimizer
+from Optimizer import Optimizer
+import numpy as np
+import logging as log
+import math
+import Queue
+import time
+import copy
+
+
+class TPEOptimizer(RandomSearchOptimizer):
+
+    def __init__(self, num_processors, trading_algorithm, commission, ticker_spreads, optimization_metric,
+        optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, result_mode='full',
+        top_n_results=1, max_evaluations=None, max_seconds=None, batch_size=None, seed=None, num_startup=None,
+        gamma=0.25, num_candidates=24, num_warm_start_seeds=0, trust_region_radius=0.2, max_seed_drop=0.5,
+        result_store=None):
+        super(TPEOptimizer, self).__init__(num_processors, trading_algorithm, commission, ticker_spreads,
+            optimization_metric, optimization_metric_ascending, optimization_parameters, frequency, worker_pool,
+            result_mode, top_n_results, max_evaluations, max_seconds, batch_size, seed, num_warm_start_seeds,
+            trust_region_radius, max_seed_drop, result_store)
+
+        if not 0.0 < gamma < 1.0:
+            raise ValueError("The TPEOptimizer gamma must be between zero and one.")
+
+        # Data members
+        self.num_startup = num_startup or max(10, 2 * len(self.parameter_space.dimensions))
+        self.gamma = gamma
+        self.num_candidates = num_candidates
+        self.unit_points = []
+
+    def run(self, data, start_date, end_date):
+        random_state = np.random.RandomState(self.seed)
+        num_in_flight = self.batch_size or self.worker_pool.num_processors
+
+        # Initialize the evaluation history
+        self.optimization_parameter_sets = []
+        self.unit_points = []
+        evaluations = {}
+        optimization_metrics = {}
+        completed = Queue.Queue()
+        pending = {}
+        scenario_keys = {}
+        start_time = time.time()
+
+        # Proposals of an effective parameter set which was already proposed share its evaluation
+        first_ids = {}
+        duplicate_ids = {}
+
+        # Re-evaluate the seeds of the previous run first, they join the history the model is fitted on
+        seed_parameter_sets = [parameters for parameters, metric in self.warm_start_seeds]
+        progress = self.start_progress(self._num_scenarios(len(seed_parameter_sets)))
+        seed_evaluations = self.evaluate(seed_parameter_sets, data, start_date, end_date)
+        for backtest_id, (parameters, evaluation) in enumerate(zip(seed_parameter_sets, seed_evaluations)):
+            self.unit_points.append(self.parameter_space.to_unit(parameters))
+            self.optimization_parameter_sets.append(parameters)
+            evaluations[backtest_id] = evaluation
+            optimization_metrics[backtest_id] = self.evaluation_metric(evaluation)
+            first_ids.setdefault(self.parameter_key(parameters), backtest_id)
+        region = self.warm_start_region(seed_evaluations)
+
+        while True:
+            # Keep every worker busy, new candidates are proposed from all evaluations completed so far
+            while len(pending) < num_in_flight and not self._budget_exhausted(start_time):
+                backtest_id = len(self.optimization_parameter_sets)
+                unit_point = self.propose(random_state, optimization_metrics, region)
+                parameters = self.parameter_space.from_unit(unit_point)
+
+                self.unit_points.append(unit_point)
+                self.optimization_parameter_sets.append(parameters)
+
+                # Duplicates of a scenario still in flight are filled in once it completes
+                first_id = first_ids.setdefault(self.parameter_key(parameters), backtest_id)
+                if first_id in pending:
+                    duplicate_ids.setdefault(first_id, []).append(backtest_id)
+                    continue
+                elif first_id != backtest_id:
+                    self._share_evaluation(evaluations[first_id], backtest_id, evaluations, optimization_metrics)
+                    progress.update([backtest_id], running_best=self.running_best)
+                    continue
+
+                # Scenarios completed by earlier runs join the history right away, the keys of the others are kept
+                # until they complete
+                if self.result_store is not None:
+                    stored_evaluations, proposal_keys = self.load_stored_evaluations([backtest_id], [parameters], \
+                        data, start_date, end_date)
+                    scenario_keys.update(proposal_keys)
+                    if backtest_id in stored_evaluations:
+                        evaluations[backtest_id] = stored_evaluations[backtest_id]
+                        optimization_metrics[backtest_id] = self.evaluation_metric(evaluations[backtest_id])
+                        self._update_progress(progress, evaluations[backtest_id])
+                        continue
+
+                pending[backtest_id] = self.evaluate_async(backtest_id, parameters, data, start_date, end_date, \
+                    completed.put)
+
+            if len(pending) == 0:
+                break
+
+            # Wait for the next scenario to finish and update the history
+            evaluation, duration, worker_name = self._next_completed(completed, pending)
+            evaluations[evaluation.backtest_id] = evaluation
+            optimization_metrics[evaluation.backtest_id] = self.evaluation_metric(evaluation)
+            del pending[evaluation.backtest_id]
+            self._update_progress(progress, evaluation, [duration], worker_name)
+            for backtest_id in duplicate_ids.pop(evaluation.backtest_id, []):
+                self._share_evaluation(evaluation, backtest_id, evaluations, optimization_metrics)
+                progress.update([backtest_id], running_best=self.running_best)
+            if self.result_store is not None:
+                self.result_store.put(scenario_keys.pop(evaluation.backtest_id), self._result_kind(), evaluation)
+
+        self.finish_progress()
+        log.info('TPE search evaluated %d parameter sets in %.1f seconds' \
+            % (len(evaluations), time.time() - start_time))
+
+        # Find optimal parameters and save results
+        evaluations = [evaluations[i] for i in range(len(evaluations))]
+        return self.build_results(evaluations, data, start_date, end_date)
+
+    def _share_evaluation(self, evaluation, backtest_id, evaluations, optimization_metrics):
+        evaluations[backtest_id] = copy.copy(evaluation)
+        evaluations[backtest_id].backtest_id = backtest_id
+        optimization_metrics[backtest_id] = optimization_metrics[evaluation.backtest_id]
+
+    def _update_progress(self, progress, evaluation, durations=None, worker_name=None):
+        # Stored scenarios were not run, so they have no duration to report
+        self.update_running_best(evaluation)
+        progress.update([evaluation.backtest_id], durations, worker_name, running_best=self.running_best)
+
+    def propose(self, random_state, optimization_metrics, region=None):
+        # Explore randomly until enough scenarios are known to fit the model
+        if len(optimization_metrics) < self.num_startup:
+            return self.parameter_space.sample_unit_points(1, random_state, region)[0]
+
+        # Split the evaluated points into the best gamma quantile and the rest, failed metrics rank last
+        backtest_ids = sorted(optimization_metrics.keys())
+        worst_metric = np.inf if self.optimization_metric_ascending else -np.inf
+        metrics = np.array([optimization_metrics[i] for i in backtest_ids], dtype=float)
+        metrics[np.isnan(metrics)] = worst_metric
+        sorted_idices = Optimizer.get_sorted_metric_indices(metrics, len(metrics), self.optimization_metric_ascending)
+        num_good = max(1, int(np.ceil(self.gamma * len(metrics))))
+
+        points = np.array([self.unit_points[i] for i in backtest_ids])
+        good_points = points[sorted_idices[:num_good]]
+        bad_points = points[sorted_idices[num_good:]]
+
+        # Sample feasible candidates from the density of good points and keep the one most likely to be good,
+        # a warm started search only keeps the candidates inside of its trust region
+        candidates = self._sample_parzen(random_state, good_points, self.num_candidates)
+        feasible = np.array([self.parameter_space.is_feasible(self.parameter_space.from_unit(c)) for c in candidates], \
+            dtype=bool)
+        if region is not None:
+            feasible &= ((candidates >= region[0]) & (candidates <= region[1])).all(axis=1)
+        candidates = candidates[feasible]
+        if len(candidates) == 0:
+            return self.parameter_space.sample_unit_points(1, random_state, region)[0]
+
+        scores = self._log_parzen_density(candidates, good_points) - self._log_parzen_density(candidates, bad_points)
+
+        return candidates[np.argmax(scores)]
+
+    def _sample_parzen(self, random_state, points, num_samples):
+        bandwidths = self._bandwidths(points)
+        prior_weight = 1.0 / (len(points) + 1)
+
+        # Draw around randomly chosen observations, with some draws taken from the uniform prior instead
+        centers = points[random_state.randint(len(points), size=num_samples)]
+        samples = centers + random_state.normal(size=centers.shape) * bandwidths
+        from_prior = random_state.uniform(size=num_samples) < prior_weight
+        samples[from_prior] = random_state.uniform(size=(from_prior.sum(), points.shape[1]))
+
+        # Redraw samples outside of the unit interval so the kernels are truncated rather than clipped
+        outside = (samples < 0.0) | (samples > 1.0)
+        while outside.any():
+            noise = random_state.normal(size=centers.shape) * bandwidths
+            samples[outside] = (centers + noise)[outside]
+            outside = (samples < 0.0) | (samples > 1.0)
+
+        return samples
+
+    def _log_parzen_density(self, samples, points):
+        # An independent Gaussian mixture per dimension, blended with the uniform prior of the unit interval
+        if len(points) == 0:
+            return np.zeros(len(samples))
+
+        bandwidths = self._bandwidths(points)
+        prior_weight = 1.0 / (len(points) + 1)
+        distances = (samples[:, np.newaxis, :] - points[np.newaxis, :, :]) / bandwidths
+        kernels = np.exp(-0.5 * distances ** 2) / (np.sqrt(2 * np.pi) * bandwidths)
+        kernels /= self._unit_interval_mass(points, bandwidths)[np.newaxis, :, :]
+        densities = (1 - prior_weight) * kernels.mean(axis=1) + prior_weight
+
+        return np.log(densities).sum(axis=1)
+
+    def _unit_interval_mass(self, points, bandwidths):
+        # Probability mass of each kernel which lies inside of the unit interval
+        erf = np.frompyfunc(math.erf, 1, 1)
+        upper = erf((1.0 - points) / (np.sqrt(2) * bandwidths)).astype(float)
+        lower = erf((0.0 - points) / (np.sqrt(2) * bandwidths)).astype(float)
+
+        return 0.5 * (upper - lower)
+
+    def _bandwidths(self, points):
+        # Scott's rule on the unit interval, bounded to keep the estimators from collapsing or flattening
+        bandwidths = 1.06 * points.std(axis=0) * len(points) ** (-1.0 / 5)
+        return np.clip(bandwidths, 0.02, 0.5)
+
+    def _next_completed(self, completed, pending):
+        while True:
+            try:
+                return completed.get(timeout=0.1)
+            except Queue.Empty:
+                # Callbacks are not called for failed scenarios, so surface their errors here
+                for async_result in pending.values():
+                    if async_result.ready() and not async_result.successful():
+                        async_result.get()
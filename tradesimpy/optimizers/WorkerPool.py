@@ -0,0 +1,82 @@
+import sys
+import multiprocessing as mp
+import logging as log
+
+
+def _init_worker(lib_paths, algorithm_uri):
+    # Give the worker the same import paths as its parent
+    for lib_path in lib_paths:
+        if lib_path not in sys.path:
+            sys.path.append(lib_path)
+
+    # Pre-warm the worker with the heavy imports needed by every backtest
+    import numpy
+    import pandas
+    import Backtester
+    from TradingAlgorithm import TradingAlgorithm
+
+    # Pre-warm the worker with the trading algorithm module
+    if algorithm_uri is not None:
+        TradingAlgorithm.load_trading_algorithm_class(algorithm_uri)
+
+
+class WorkerPool(object):
+
+    def __init__(self, num_processors, algorithm_uri=None):
+        # Set processor count for parallelization
+        if(num_processors > mp.cpu_count()):
+            self.num_processors = mp.cpu_count()
+        else:
+            self.num_processors = num_processors
+
+        self.algorithm_uri = algorithm_uri
+        self.pool = None
+
+    def start(self):
+        # Workers are only started once and then reused until the pool is closed
+        if self.pool is None:
+            log.info('Starting a pool of %d workers...' % self.num_processors)
+            self.pool = mp.Pool(processes=self.num_processors, initializer=_init_worker,
+                initargs=(list(sys.path), self.algorithm_uri))
+
+        return self
+
+    @property
+    def is_running(self):
+        return self.pool is not None
+
+    def map(self, func, iterable, chunksize=None):
+        return self.start().pool.map(func, iterable, chunksize)
+
+    def imap(self, func, iterable, chunksize=1):
+        return self.start().pool.imap(func, iterable, chunksize)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return self.start().pool.imap_unordered(func, iterable, chunksize)
+
+    def apply_async(self, func, args=(), callback=None):
+        return self.start().pool.apply_async(func, args, callback=callback)
+
+    def close(self):
+        # Let the workers finish their current tasks before shutting them down
+        if self.pool is not None:
+            log.info('Closing the pool of workers...')
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def terminate(self):
+        if self.pool is not None:
+            log.info('Terminating the pool of workers...')
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
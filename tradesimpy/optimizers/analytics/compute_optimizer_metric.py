@@ -1,7 +1,15 @@
 import optimizer_analytics
+import numpy as np
 import exceptions as ex
 
 
+# Metrics which can be computed for many scenarios at once from one of their stacked result series
+METRIC_MATRIX_FUNCTIONS = {
+    'sharpe_ratio':     ('log_returns', optimizer_analytics.sharpe_ratio_matrix),
+    'sortino_ratio':    ('log_returns', optimizer_analytics.sortino_ratio_matrix),
+    'max_drawdown':     ('portfolio_value', lambda matrix, frequency: optimizer_analytics.max_drawdown_matrix(matrix))
+}
+
 def compute_optimizer_metric(metric_name, backtest_result, frequency):
     metric_name = metric_name.lower()
 
@@ -9,5 +17,198 @@ def compute_optimizer_metric(metric_name, backtest_result, frequency):
         return optimizer_analytics.sharpe_ratio(backtest_result.log_returns, frequency)
     elif metric_name == 'sortino_ratio':
         return optimizer_analytics.sortino_ratio(backtest_result.log_returns, frequency)
+    elif metric_name == 'max_drawdown':
+        return optimizer_analytics.max_drawdown(backtest_result.portfolio_value)
+    elif metric_name == 'turnover':
+        return optimizer_analytics.turnover(backtest_result.transactions, backtest_result.portfolio_value, frequency)
+    else:
+        raise NotImplementedError("The optimizer metric %s is not supported." % metric_name)
+
+def series_matrix(backtest_results, series_name):
+    # Result sinks stack their series themselves, e.g. straight from their memory-mapped files
+    if hasattr(backtest_results, 'series_matrix'):
+        return backtest_results.series_matrix(series_name)
+
+    return optimizer_analytics.return_matrix([getattr(backtest_result, series_name).values \
+        for backtest_result in backtest_results])
+
+def log_return_matrix(backtest_results):
+    return series_matrix(backtest_results, 'log_returns')
+
+def compute_optimizer_metric_matrix(metric_name, matrix, frequency):
+    metric_name = metric_name.lower()
+
+    if metric_name not in METRIC_MATRIX_FUNCTIONS:
+        raise NotImplementedError("The optimizer metric %s can not be computed from a matrix." % metric_name)
+
+    return METRIC_MATRIX_FUNCTIONS[metric_name][1](matrix, frequency)
+
+def compute_optimizer_metrics(metric_name, backtest_results, frequency, block_size=4096):
+    metric_name = metric_name.lower()
+
+    # Fall back to one scenario at a time for metrics without a matrix implementation
+    if metric_name not in METRIC_MATRIX_FUNCTIONS:
+        return np.array([compute_optimizer_metric(metric_name, backtest_result, frequency) \
+            for backtest_result in backtest_results], dtype=float)
+
+    # Stack blocks of scenarios so the matrix stays bounded in memory
+    series_name = METRIC_MATRIX_FUNCTIONS[metric_name][0]
+    optimization_metrics = np.empty(len(backtest_results))
+    for start in range(0, len(backtest_results), block_size):
+        if hasattr(backtest_results, 'series_matrix'):
+            matrix = backtest_results.series_matrix(series_name, start, start + block_size)
+        else:
+            matrix = series_matrix(backtest_results[start:start + block_size], series_name)
+        optimization_metrics[start:start + len(matrix)] = compute_optimizer_metric_matrix(metric_name, matrix, \
+            frequency)
+
+    return optimization_metrics
+
+def sorted_metric_indices(optimization_metrics, num_results, ascending):
+    # Rank descending metrics by their negation, failed (NaN) metrics always rank last
+    optimization_metrics = np.asarray(optimization_metrics, dtype=float)
+    keys = optimization_metrics if ascending else -optimization_metrics
+    is_nan = np.isnan(keys)
+    keys = np.where(is_nan, np.inf, keys)
+    num_results = min(num_results, len(keys))
+
+    # Only sort the candidates for the top results, keeping all scenarios tied with the last one
+    if 0 < num_results < len(keys):
+        kth_key = np.partition(keys, num_results - 1)[num_results - 1]
+        candidates = np.flatnonzero(keys <= kth_key)
     else:
-        raise NotImplementedError("The optimizer metric %s is not supported." % metric)
+        candidates = np.arange(len(keys))
+
+    # Stable sort so ties keep the order of the scenarios
+    sorted_idices = candidates[np.lexsort((keys[candidates], is_nan[candidates]))]
+
+    return sorted_idices[:num_results].tolist()
+
+def optimal_index(objective_metrics, ascending):
+    # With several objectives, the optimum is the best on the first objective among the Pareto front
+    pareto_front = None
+    candidates = np.arange(len(objective_metrics[0]))
+    if len(objective_metrics) > 1:
+        pareto_front = pareto_front_indices(objective_metrics, ascending)
+        if len(pareto_front) > 0:
+            candidates = np.array(pareto_front)
+    first_metrics = np.asarray(objective_metrics[0], dtype=float)[candidates]
+
+    return int(candidates[sorted_metric_indices(first_metrics, 1, ascending[0])[0]]), pareto_front
+
+def pareto_front_indices(optimization_metrics, ascending):
+    # Turn every objective into one to minimize, scenarios with a failed (NaN) metric are never on the front
+    objectives = np.array(optimization_metrics, dtype=float).reshape(len(ascending), -1).T
+    objectives[:, ~np.asarray(ascending, dtype=bool)] *= -1
+    candidates = np.flatnonzero(~np.isnan(objectives).any(axis=1))
+    objectives = objectives[candidates]
+
+    # Sort lexicographically, so no scenario is strictly dominated by one following it
+    order = np.lexsort(objectives.T[::-1])
+    objectives = objectives[order]
+
+    if objectives.shape[1] == 1:
+        on_front = objectives[:, 0] == objectives[0, 0] if len(objectives) > 0 else np.zeros(0, dtype=bool)
+    elif objectives.shape[1] == 2:
+        on_front = _pareto_front_2d(objectives)
+    else:
+        on_front = _pareto_front_nd(objectives)
+
+    return sorted(candidates[order[on_front]].tolist())
+
+def _pareto_front_2d(objectives):
+    # Sweep in order of the first objective, keeping the best second objective of all strictly better first ones
+    first, second = objectives[:, 0], objectives[:, 1]
+    group_starts = np.r_[True, first[1:] != first[:-1]] if len(first) > 0 else np.zeros(0, dtype=bool)
+    group_ids = np.cumsum(group_starts) - 1
+    group_best = second[group_starts]
+    previous_best = np.r_[np.inf, np.minimum.accumulate(group_best)[:-1]]
+
+    # Dominated by a scenario with a better first objective, or by an equal first and better second objective
+    dominated = (previous_best[group_ids] <= second) | (group_best[group_ids] < second)
+
+    return ~dominated
+
+def _pareto_front_nd(objectives, leaf_size=64):
+    # Identical scenarios share their place on the front, distinct ones dominate as soon as they are no worse on every
+    # objective. The sorted objectives keep identical scenarios next to each other
+    starts = np.r_[True, (objectives[1:] != objectives[:-1]).any(axis=1)] if len(objectives) > 0 else \
+        np.zeros(0, dtype=bool)
+    distinct_objectives = objectives[starts]
+
+    on_front = np.zeros(len(distinct_objectives), dtype=bool)
+    on_front[_kung_front(distinct_objectives, np.arange(len(distinct_objectives)), leaf_size)] = True
+
+    return on_front[np.cumsum(starts) - 1]
+
+def _kung_front(objectives, indices, leaf_size):
+    # Kung's divide and conquer, the scenarios are sorted lexicographically so the second half never dominates the
+    # first one and is no better on the first objective, its front is only filtered on the remaining objectives
+    if len(indices) <= leaf_size:
+        points = objectives[indices]
+        return indices[~_dominated(points, points)]
+
+    middle = len(indices) // 2
+    first_front = _kung_front(objectives, indices[:middle], leaf_size)
+    second_front = _kung_front(objectives, indices[middle:], leaf_size)
+
+    return np.concatenate([first_front, second_front[~_filter_dominated(objectives[second_front], \
+        objectives[first_front], 1, leaf_size)]])
+
+def _filter_dominated(points, dominating_points, dimension, leaf_size):
+    # Which distinct points some dominating point is no worse than, given it is no worse on the objectives before the
+    # dimension. Splitting both sets on the dimension only leaves the objectives after it to compare across the
+    # halves, which takes O(N log^(d - 2) N) over d objectives
+    num_objectives = points.shape[1]
+    if len(points) == 0 or len(dominating_points) == 0:
+        return np.zeros(len(points), dtype=bool)
+    if dimension == num_objectives - 1:
+        return dominating_points[:, dimension].min() <= points[:, dimension]
+
+    # Order both sets on the dimension, dominating points first on ties
+    values = np.concatenate([dominating_points[:, dimension], points[:, dimension]])
+    is_point = np.r_[np.zeros(len(dominating_points), dtype=bool), np.ones(len(points), dtype=bool)]
+    order = np.lexsort((is_point, values))
+    point_positions = order[is_point[order]] - len(dominating_points)
+
+    # With two objectives left, sweep for the best last objective of all dominating points before each point
+    if dimension == num_objectives - 2:
+        last_values = np.concatenate([dominating_points[:, dimension + 1], np.full(len(points), np.inf)])[order]
+        best_before = np.minimum.accumulate(last_values)[is_point[order]]
+        dominated = np.zeros(len(points), dtype=bool)
+        dominated[point_positions] = best_before <= points[point_positions, dimension + 1]
+        return dominated
+
+    if len(points) * len(dominating_points) <= leaf_size ** 2:
+        return _dominated(points[:, dimension:], dominating_points[:, dimension:], strict=False)
+
+    # Dominating points of the lower half are no worse on the dimension than the points of the upper half
+    middle = len(order) // 2
+    lower, upper = order[:middle], order[middle:]
+    lower_points = lower[is_point[lower]] - len(dominating_points)
+    upper_points = upper[is_point[upper]] - len(dominating_points)
+    lower_dominating = lower[~is_point[lower]]
+    upper_dominating = upper[~is_point[upper]]
+
+    dominated = np.zeros(len(points), dtype=bool)
+    dominated[lower_points] = _filter_dominated(points[lower_points], dominating_points[lower_dominating], \
+        dimension, leaf_size)
+    dominated[upper_points] = _filter_dominated(points[upper_points], dominating_points[upper_dominating], \
+        dimension, leaf_size) | _filter_dominated(points[upper_points], dominating_points[lower_dominating], \
+        dimension + 1, leaf_size)
+
+    return dominated
+
+def _dominated(points, dominating_points, strict=True, max_comparisons=2 ** 22):
+    # A point is dominated by another one which is no worse on every objective and, unless the points are known to be
+    # distinct, better on at least one. Points are compared in blocks to bound the memory of large fronts
+    dominated = np.zeros(len(points), dtype=bool)
+    block_size = max(1, max_comparisons // max(1, len(dominating_points)))
+    for start in range(0, len(points), block_size):
+        block = points[start:start + block_size]
+        dominating = (dominating_points[np.newaxis, :, :] <= block[:, np.newaxis, :]).all(axis=2)
+        if strict:
+            dominating &= (dominating_points[np.newaxis, :, :] < block[:, np.newaxis, :]).any(axis=2)
+        dominated[start:start + block_size] = dominating.any(axis=1)
+
+    return dominated
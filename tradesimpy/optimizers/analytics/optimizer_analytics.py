@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import warnings
 
 def discrete_returns(price_series):
     return price_series / price_series.shift(1) - 1
@@ -32,3 +33,46 @@ def sortino_ratio(return_series, frequency):
     factor = annualization_factor(frequency)
 
     return np.sqrt(factor) * (return_series.mean() / return_series[return_series < 0].std())
+
+def max_drawdown(price_series):
+    return (price_series / price_series.cummax() - 1).min()
+
+def turnover(transactions_series, price_series, frequency):
+    factor = annualization_factor(frequency)
+
+    # Annualized traded value relative to the average portfolio value
+    traded_value = sum(transaction['share_count'] * transaction['share_price'] \
+        for transactions in transactions_series for transaction in transactions.itervalues())
+
+    return traded_value / price_series.mean() * factor / len(price_series)
+
+def return_matrix(return_series_list):
+    # Stack return series row by row, shorter series are padded with NaN
+    num_observations = max([len(return_series) for return_series in return_series_list] or [0])
+    matrix = np.full((len(return_series_list), num_observations), np.nan)
+    for i, return_series in enumerate(return_series_list):
+        matrix[i, :len(return_series)] = return_series
+
+    return matrix
+
+def sharpe_ratio_matrix(return_matrix, frequency):
+    factor = annualization_factor(frequency)
+
+    # NaN observations are skipped per row like pandas does, rows without enough observations yield NaN
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.sqrt(factor) * (np.nanmean(return_matrix, axis=1) / np.nanstd(return_matrix, axis=1, ddof=1))
+
+def sortino_ratio_matrix(return_matrix, frequency):
+    factor = annualization_factor(frequency)
+
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        downside_matrix = np.where(return_matrix < 0, return_matrix, np.nan)
+        return np.sqrt(factor) * (np.nanmean(return_matrix, axis=1) / np.nanstd(downside_matrix, axis=1, ddof=1))
+
+def max_drawdown_matrix(price_matrix):
+    # The running peak skips the NaN padding of shorter rows
+    with warnings.catch_warnings(), np.errstate(invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmin(price_matrix / np.fmax.accumulate(price_matrix, axis=1) - 1, axis=1)
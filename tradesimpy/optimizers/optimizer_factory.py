@@ -1,15 +1,44 @@
 from GridSearchOptimizer import GridSearchOptimizer
+from RandomSearchOptimizer import RandomSearchOptimizer
+from TPEOptimizer import TPEOptimizer
+from DifferentialEvolutionOptimizer import DifferentialEvolutionOptimizer
+from SuccessiveHalvingOptimizer import SuccessiveHalvingOptimizer
 import exceptions as ex
 
 
 def create_optimizer(num_processors, optimizer_name, trading_algorithm, commission, ticker_spreads, optimization_metric,
-    optimization_metric_ascending, optimization_parameters, frequency):
+    optimization_metric_ascending, optimization_parameters, frequency, worker_pool=None, optimizer_options=None,
+    result_store=None):
     optimizer_name = optimizer_name.lower()
 
+    # Optimizer specific options are passed through as keyword arguments
+    if optimizer_options is None:
+        optimizer_options = {}
+
     if optimizer_name == 'gridsearchoptimizer':
         return GridSearchOptimizer(num_processors=num_processors, trading_algorithm=trading_algorithm,
             commission=commission, ticker_spreads=ticker_spreads, optimization_metric=optimization_metric,
             optimization_metric_ascending=optimization_metric_ascending, optimization_parameters=optimization_parameters,
-            frequency=frequency)
+            frequency=frequency, worker_pool=worker_pool, result_store=result_store, **optimizer_options)
+    elif optimizer_name == 'randomsearchoptimizer':
+        return RandomSearchOptimizer(num_processors=num_processors, trading_algorithm=trading_algorithm,
+            commission=commission, ticker_spreads=ticker_spreads, optimization_metric=optimization_metric,
+            optimization_metric_ascending=optimization_metric_ascending, optimization_parameters=optimization_parameters,
+            frequency=frequency, worker_pool=worker_pool, result_store=result_store, **optimizer_options)
+    elif optimizer_name == 'tpeoptimizer':
+        return TPEOptimizer(num_processors=num_processors, trading_algorithm=trading_algorithm,
+            commission=commission, ticker_spreads=ticker_spreads, optimization_metric=optimization_metric,
+            optimization_metric_ascending=optimization_metric_ascending, optimization_parameters=optimization_parameters,
+            frequency=frequency, worker_pool=worker_pool, result_store=result_store, **optimizer_options)
+    elif optimizer_name == 'differentialevolutionoptimizer':
+        return DifferentialEvolutionOptimizer(num_processors=num_processors, trading_algorithm=trading_algorithm,
+            commission=commission, ticker_spreads=ticker_spreads, optimization_metric=optimization_metric,
+            optimization_metric_ascending=optimization_metric_ascending, optimization_parameters=optimization_parameters,
+            frequency=frequency, worker_pool=worker_pool, result_store=result_store, **optimizer_options)
+    elif optimizer_name == 'successivehalvingoptimizer':
+        return SuccessiveHalvingOptimizer(num_processors=num_processors, trading_algorithm=trading_algorithm,
+            commission=commission, ticker_spreads=ticker_spreads, optimization_metric=optimization_metric,
+            optimization_metric_ascending=optimization_metric_ascending, optimization_parameters=optimization_parameters,
+            frequency=frequency, worker_pool=worker_pool, result_store=result_store, **optimizer_options)
     else:
         raise NotImplementedError("Unknown optimizer name %s" % (optimizer_name))
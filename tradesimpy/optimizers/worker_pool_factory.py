@@ -0,0 +1,11 @@
+from WorkerPool import WorkerPool
+from DistributedWorkerPool import DistributedWorkerPool
+
+
+def create_worker_pool(num_processors, algorithm_uri=None, distributed_workers=None):
+    # Backtests run on the local processors unless workers on other hosts are configured
+    if distributed_workers is None:
+        return WorkerPool(num_processors, algorithm_uri)
+
+    # Options like the address, port, authkey and number of local workers are passed through as keyword arguments
+    return DistributedWorkerPool(num_processors, algorithm_uri, **distributed_workers)
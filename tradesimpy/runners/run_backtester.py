@@ -18,5 +18,8 @@ if __name__ == '__main__':
     backtest_engine = BacktestEngine()
     results = backtest_engine.run(config)
 
-    # Store the results in a binary file
-    results.save_pickle(config.results_uri)
+    # Store the results in a binary file, or in columnar archives which can be read selectively
+    if config.results_format == 'columnar':
+        results.save_columnar(config.results_uri)
+    else:
+        results.save_pickle(config.results_uri)
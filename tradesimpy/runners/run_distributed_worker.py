@@ -0,0 +1,39 @@
+from runner_script_import import *
+from optimization_engine_import import *
+import os
+import sys
+import argparse
+import multiprocessing as mp
+from DistributedWorkerPool import run_worker
+
+# The authkey of the work queue is not passed on the command line, where other users of the host can read it
+AUTHKEY_VARIABLE = 'TRADESIMPY_AUTHKEY'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run workers for the work queue of an optimization. The authkey of '
+        'the work queue is read from the %s environment variable, or from a file.' % AUTHKEY_VARIABLE)
+    parser.add_argument('host', help='host of the work queue')
+    parser.add_argument('port', type=int, help='port of the work queue')
+    parser.add_argument('num_processes', type=int, nargs='?', default=mp.cpu_count(),
+        help='number of worker processes, defaults to the number of processors')
+    parser.add_argument('--authkey-file', help='file holding the authkey of the work queue')
+    args = parser.parse_args()
+
+    if args.authkey_file is not None:
+        with open(args.authkey_file, 'rb') as f:
+            authkey = f.read().strip()
+    else:
+        authkey = os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        parser.error('Please provide the authkey in the %s environment variable or with --authkey-file' % \
+            AUTHKEY_VARIABLE)
+
+    # Every process asks the optimizer's work queue for chunks of its own, with the import paths set up above
+    address = (args.host, args.port)
+    workers = [mp.Process(target=run_worker, args=(address, authkey, None, list(sys.path))) for i in \
+        range(args.num_processes)]
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
@@ -0,0 +1,22 @@
+from runner_script_import import *
+import sys
+from MonteCarloConfiguration import MonteCarloConfiguration
+from MonteCarloEngine import MonteCarloEngine
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        raise StandardError('Please provide valid parameters {[configuration file]}')
+
+    args = sys.argv[1:]
+    config_uri = args[0]
+
+    # Create Monte Carlo configuration and display
+    config = MonteCarloConfiguration(config_uri)
+    config.__str__()
+
+    # Initialize and run the Monte Carlo engine
+    monte_carlo_engine = MonteCarloEngine()
+    results = monte_carlo_engine.run(config)
+
+    # Store the results in a binary file
+    results.save_pickle(config.results_uri)
@@ -1,22 +1,56 @@
 from runner_script_import import *
-import sys
+import argparse
 from OptimizationConfiguration import OptimizationConfiguration
 from OptimizationEngine import OptimizationEngine
+from OptimizationResults import OptimizationResults
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        raise StandardError('Please provide valid parameters {[configuration file]}')
+    parser = argparse.ArgumentParser(description='Run an optimization, one shard of it, or merge its shards.')
+    parser.add_argument('config_uri', help='configuration file')
+    parser.add_argument('--shard', help='only run the shard i of N, counting from 0, given as i/N')
+    parser.add_argument('--resume', action='store_true', help='skip the scenarios found in the checkpoint')
+    parser.add_argument('--merge', nargs='+', metavar='RESULTS_URI', help='merge the results files of all shards')
+    args = parser.parse_args()
 
-    args = sys.argv[1:]
-    config_uri = args[0]
+    if args.shard is not None and args.merge is not None:
+        parser.error('--shard and --merge can not be combined')
 
-    # Create backtest configuration and display
-    config = OptimizationConfiguration(config_uri)
+    # Create optimization configuration and display
+    config = OptimizationConfiguration(args.config_uri)
     config.__str__()
 
-    # Initialize and run the backtest engine
-    optimization_engine = OptimizationEngine()
-    results = optimization_engine.run(config)
+    if args.merge is not None:
+        # Combine the shards and recompute the global optimum
+        results = OptimizationResults.merge([OptimizationResults.load_pickle(uri) for uri in args.merge], \
+            config.optimization_metric, config.optimization_metric_ascending, config.time_resolution)
+        if config.results_format == 'columnar':
+            results.save_columnar(config.results_uri)
+        else:
+            results.save_pickle(config.results_uri)
+    else:
+        results_name = 'optimization_results'
+        if args.shard is not None:
+            if config.optimizer_name.lower() != 'gridsearchoptimizer':
+                parser.error('--shard is only supported by the GridSearchOptimizer')
 
-    # Store the results in a binary file
-    results.save_pickle(config.results_uri)
+            # Shards are deterministic slices of the grid, so every batch job can run one on its own
+            config.optimizer_options['shard'] = args.shard
+            results_name = 'optimization_results_shard_%s' % args.shard.replace('/', '_of_')
+
+        if args.resume:
+            if 'checkpoint_uri' not in config.optimizer_options:
+                parser.error('--resume needs the checkpoint_uri optimizer option')
+
+            # Continue an interrupted optimization from its checkpoint
+            config.optimizer_options['resume'] = True
+
+        # Initialize and run the optimization engine
+        optimization_engine = OptimizationEngine()
+        results = optimization_engine.run(config)
+
+        # Store the results in a binary file, or in a columnar archive which can be read selectively, shards are
+        # always pickled so they can be merged
+        if config.results_format == 'columnar' and args.shard is None:
+            results.save_columnar(config.results_uri, results_name)
+        else:
+            results.save_pickle(config.results_uri, results_name)
@@ -5,7 +5,8 @@ import sys
 lib_paths =\
     [
         os.path.abspath('../engines/'),
-        os.path.abspath('../configurations/')
+        os.path.abspath('../configurations/'),
+        os.path.abspath('../optimizers/')
     ]
 
 for lib_path in lib_paths:
@@ -1,6 +1,7 @@
 import sys
 import re
 import inspect
+import indicators
 
 
 class TradingAlgorithm(object):
@@ -16,11 +17,54 @@ class TradingAlgorithm(object):
         for ticker in self.tickers:
             self.position_is_open[ticker] = False
 
+        # Precomputed indicator series are handed over by the optimizer
+        self.indicator_cache = None
+
+        # Set when the signals only depend on the current history window, not on earlier trades or bars, so a
+        # backtest over a longer span trades every sub-period like a backtest of the sub-period would
+        self.stateless_signals = False
+
+        # Set when canonicalize_parameters maps every parameter on its own, independent of the other parameters, so
+        # optimizers can canonicalize a parameter grid axis by axis instead of parameter set by parameter set
+        self.independent_canonical_parameters = False
+
     def set_parameters(self, parameters):
     	self.parameters = parameters
 
+    def canonicalize_parameters(self, parameters):
+        # Override to map parameter sets which trade identically, e.g. after casting to int, onto the same values
+        return dict(parameters)
+
+    def canonicalizes_independently(self):
+        # The default canonicalization keeps every parameter as it is
+        return self.independent_canonical_parameters or \
+            type(self).canonicalize_parameters.im_func is TradingAlgorithm.canonicalize_parameters.im_func
+
+    def indicators(self, parameters):
+        # Override to declare the indicators needed by a parameter set, e.g. [('rolling_mean', 'Close', 20)]
+        return []
+
+    def scenario_cost(self, parameters):
+        # Override to estimate the relative cost of backtesting a parameter set, e.g. from its window lengths
+        return None
+
+    def indicator(self, ticker, ticker_data, indicator):
+        # Read the indicator's current value from the shared cache, computing it from the history window otherwise
+        if self.indicator_cache is not None:
+            value = self.indicator_cache.lookup(ticker, indicator, self.history_window + 1, ticker_data.index[-1])
+            if value is not None:
+                return value
+
+        return indicators.current_indicator(ticker_data, indicator)
+
     @staticmethod
     def create_trading_algorithm(algorithm_uri, tickers, history_window, algorithm_parameters = None):
+        cls = TradingAlgorithm.load_trading_algorithm_class(algorithm_uri)
+
+        return cls(tickers, history_window, algorithm_parameters)
+
+    @staticmethod
+    def load_trading_algorithm_class(algorithm_uri):
         # Check if the path points to a python file
         if algorithm_uri[-3:] != '.py':
             raise NameError("The trading algorithm URI must include the Python file.")
@@ -40,5 +84,5 @@ class TradingAlgorithm(object):
         # Check class
         if not inspect.isclass(cls):
            raise TypeError("%s is not a class" % module_name)
-        
-        return cls(tickers, history_window, algorithm_parameters)
+
+        return cls
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+# Trading algorithms only see a trailing history window, so every indicator value is computed from at most the
+# history_length observations ending at it
+
+def rolling_mean(series, window, history_length=None):
+    # Windows which are not filled yet average over the observations available so far
+    window = int(window) if history_length is None else min(int(window), history_length)
+    return series.rolling(window, min_periods=1).mean().values
+
+def rolling_std(series, window, history_length=None):
+    window = int(window) if history_length is None else min(int(window), history_length)
+    return series.rolling(window, min_periods=2).std().values
+
+def exponential_mean(series, span, history_length=None):
+    means = series.ewm(span=span).mean().values
+
+    # Means over a full history window only weigh its observations, each by its age
+    if history_length is not None and len(series) > history_length:
+        weights = _exponential_weights(span, history_length)
+        means[history_length - 1:] = np.convolve(series.values, weights, 'valid') / weights.sum()
+
+    return means
+
+def last_rolling_mean(values, window):
+    return values[-int(window):].mean()
+
+def last_rolling_std(values, window):
+    values = values[-int(window):]
+    return values.std(ddof=1) if len(values) >= 2 else np.nan
+
+def last_exponential_mean(values, span):
+    weights = _exponential_weights(span, len(values))
+    return np.dot(weights[::-1], values) / weights.sum()
+
+def _exponential_weights(span, length):
+    # The weights of the adjusted exponential mean, from the latest observation backwards
+    return (1.0 - 2.0 / (span + 1.0)) ** np.arange(length)
+
+# Every indicator computes its whole series, e.g. to be cached, or only its value at the last observation
+INDICATORS = {
+    'rolling_mean':     (rolling_mean, last_rolling_mean),
+    'rolling_std':      (rolling_std, last_rolling_std),
+    'exponential_mean': (exponential_mean, last_exponential_mean)
+}
+
+def compute_indicator(ticker_data, indicator, history_length=None):
+    # An indicator is declared as a hashable (function name, column, argument, ...) tuple
+    name, column, args = indicator[0], indicator[1], indicator[2:]
+    if name not in INDICATORS:
+        raise NotImplementedError("The indicator %s is not supported." % name)
+
+    return np.asarray(INDICATORS[name][0](ticker_data[column], *args, history_length=history_length), dtype=float)
+
+def current_indicator(ticker_data, indicator):
+    # The indicator's value at the last observation of the history window
+    name, column, args = indicator[0], indicator[1], indicator[2:]
+    if name not in INDICATORS:
+        raise NotImplementedError("The indicator %s is not supported." % name)
+
+    return INDICATORS[name][1](np.asarray(ticker_data[column].values, dtype=float), *args)
@@ -1,6 +1,8 @@
+import os
 import pickle
 import logging as log
 from datetime import datetime
+from ResultsArchive import ResultsArchive
 
 
 class WalkForwardAnalysisResults(object):
@@ -18,3 +20,12 @@ class WalkForwardAnalysisResults(object):
         pickle.dump(self, open('%s/walk_forward_analysis_results_%s.p' % (file_uri, datetime.now()), "wb"))
         log.info('Results stored!')
         print
+
+    def save_columnar(self, file_uri):
+        # The out-of-sample backtests form one archive, each window's optimization results another one
+        archive_uri = '%s/walk_forward_analysis_results_%s' % (file_uri, datetime.now())
+        ResultsArchive.write(os.path.join(archive_uri, 'backtests'), self.backtest_results)
+        for i, optimization_results in enumerate(self.optimization_results):
+            optimization_results.write_columnar(os.path.join(archive_uri, 'window_%03d' % i))
+
+        return archive_uri
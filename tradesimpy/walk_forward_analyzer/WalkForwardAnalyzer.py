@@ -1,19 +1,29 @@
 import exceptions as ex
+import sys
+import threading
 import pandas as pd
 from pandas.tseries.offsets import BDay
 from datetime import date, timedelta
 import Optimizer
+from analytics import compute_optimizer_metric
+from OptimizationResults import OptimizationResults
 from WalkForwardAnalysisResults import WalkForwardAnalysisResults
 
 
 class WalkForwardAnalyzer(object):
 
-    def __init__(self, in_sample_periods, out_of_sample_periods, sample_period, optimizer, backtester):
+    def __init__(self, in_sample_periods, out_of_sample_periods, sample_period, optimizer, backtester,
+        parallel_windows=False, reuse_return_streams=False):
         self.in_sample_periods = in_sample_periods
         self.out_of_sample_periods = out_of_sample_periods
         self.sample_period = sample_period
         self.optimizer = optimizer
         self.backtester = backtester
+        self.parallel_windows = parallel_windows
+        self.reuse_return_streams = reuse_return_streams
+
+        if parallel_windows and reuse_return_streams:
+            raise ValueError("Parallel windows and reused return streams can not be combined.")
 
     def run(self, data, start_date, end_date, cash):
         if(cash <= 0):
@@ -26,8 +36,15 @@ class WalkForwardAnalyzer(object):
         # Initialize results
         self.results = WalkForwardAnalysisResults()
 
+        # Only the cash is carried over between windows, so their in-sample optimizations may all run at once
+        all_optimization_results = None
+        if self.parallel_windows:
+            all_optimization_results = self.optimize_in_parallel(data, sample_periods)
+        elif self.reuse_return_streams:
+            all_optimization_results = self.optimize_from_return_streams(data, sample_periods)
+
         # Perform the walk forward analysis for all given sample periods
-        for periods in sample_periods:
+        for i, periods in enumerate(sample_periods):
             # Setup sample dates
             in_start_date = periods['in'][0]
             in_end_date = periods['in'][1]
@@ -42,17 +59,119 @@ class WalkForwardAnalyzer(object):
                 backtester_data[ticker] = ticker_data[out_start_date:out_end_date]
             
             # Run the optimizer
-            self.optimizer.run(optimizer_data, in_start_date, in_end_date)
+            if all_optimization_results is not None:
+                optimization_results = all_optimization_results[i]
+            else:
+                self.optimizer.run(optimizer_data, in_start_date, in_end_date)
+                optimization_results = self.optimizer.results
+
+                # Optimal parameters drift slowly, so the next window's search may start from this window's best
+                self.optimizer.set_warm_start(optimization_results)
 
             # Run the backtester using the optimal trading algorithm parameters
-            self.backtester.trading_algorithm.set_parameters(self.optimizer.results.optimal_parameters)
+            self.backtester.trading_algorithm.set_parameters(optimization_results.optimal_parameters)
             self.backtester.run(backtester_data, out_start_date, out_end_date, cash)
 
             # Update cash holdings
             cash = self.backtester.results.cash[-1]
 
             # Save results
-            self.results.add_results(self.optimizer.results, self.backtester.results)
+            self.results.add_results(optimization_results, self.backtester.results)
+
+    def optimize_in_parallel(self, data, sample_periods):
+        # Every window runs on its own copy of the optimizer, their scenarios interleave on the shared worker pool
+        self.optimizer.worker_pool.start()
+        optimizers = [self.optimizer.spawn() for periods in sample_periods]
+        all_optimization_results = [None] * len(sample_periods)
+        errors = []
+
+        def optimize(i):
+            try:
+                in_start_date, in_end_date = sample_periods[i]['in']
+                optimizer_data = dict((ticker, ticker_data[in_start_date:in_end_date]) for ticker, ticker_data in \
+                    data.iteritems())
+                all_optimization_results[i] = optimizers[i].run(optimizer_data, in_start_date, in_end_date)
+            except Exception:
+                errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=optimize, args=(i,)) for i in range(len(sample_periods))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for optimizer in optimizers:
+            optimizer.close()
+
+        if len(errors) > 0:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+        return all_optimization_results
+
+    def optimize_from_return_streams(self, data, sample_periods):
+        optimizer = self.optimizer
+        if not optimizer.trading_algorithm.stateless_signals:
+            raise ValueError("Return streams can only be reused for trading algorithms with stateless signals.")
+        if optimizer.result_mode != 'full':
+            raise ValueError("Return streams can only be reused with the full result mode.")
+
+        # Backtest every parameter set once over the span of all in-sample periods
+        span_start_date = sample_periods[0]['in'][0]
+        span_end_date = max(periods['in'][1] for periods in sample_periods)
+        span_data = dict((ticker, ticker_data[span_start_date:span_end_date]) for ticker, ticker_data in \
+            data.iteritems())
+        span_results = optimizer.run(span_data, span_start_date, span_end_date)
+        if len(span_results.backtest_results) != len(span_results.parameter_sets):
+            raise ValueError("Return streams need the backtest results of every parameter set.")
+
+        # Stack the series the objectives are computed from once, each window only slices its dates out of them
+        series_names = []
+        series_matrices = {}
+        for objective in optimizer.objectives:
+            if objective.lower() not in compute_optimizer_metric.METRIC_MATRIX_FUNCTIONS:
+                raise NotImplementedError("The optimizer metric %s can not be computed from return streams." % \
+                    objective)
+
+            series_name = compute_optimizer_metric.METRIC_MATRIX_FUNCTIONS[objective.lower()][0]
+            if series_name not in series_matrices:
+                series_matrices[series_name] = compute_optimizer_metric.series_matrix(span_results.backtest_results, \
+                    series_name)
+            series_names.append(series_name)
+        dates = span_results.backtest_results[0].portfolio_value.index
+
+        all_optimization_results = []
+        for periods in sample_periods:
+            # A window's own optimization only trades once its history window is filled, so its dates start at its
+            # first tradable bar. Returns at that bar are changes from the bar before it, which the window never sees
+            start = dates.searchsorted(self.first_tradable_date(data, periods['in'][0], periods['in'][1], \
+                optimizer.trading_algorithm.history_window))
+            stop = dates.searchsorted(pd.Timestamp(periods['in'][1]), side='right')
+            series_starts = dict((series_name, start if series_name == 'portfolio_value' else start + 1) \
+                for series_name in series_names)
+            objective_metrics = [compute_optimizer_metric.compute_optimizer_metric_matrix(objective, \
+                series_matrices[series_name][:, series_starts[series_name]:stop], optimizer.frequency) \
+                for objective, series_name in zip(optimizer.objectives, series_names)]
+            optimal_idx, pareto_front = compute_optimizer_metric.optimal_index(objective_metrics, \
+                optimizer.objectives_ascending)
+
+            # The windows share the backtest results of the span, each one caches the metrics of its own dates
+            optimization_results = OptimizationResults(span_results.backtest_results, \
+                span_results.parameter_sets[optimal_idx], span_results.parameter_sets, pareto_front=pareto_front)
+            for objective, optimization_metrics in zip(optimizer.objectives, objective_metrics):
+                optimization_results.cache_optimization_metrics(objective, optimizer.frequency, optimization_metrics)
+            all_optimization_results.append(optimization_results)
+
+        return all_optimization_results
+
+    @staticmethod
+    def first_tradable_date(data, start_date, end_date, history_window):
+        # Like the Backtester, the first date of any ticker with a full history window before it
+        first_dates = [ticker_data[start_date:end_date].index[history_window] for ticker_data in data.itervalues() \
+            if len(ticker_data[start_date:end_date]) > history_window]
+        if len(first_dates) == 0:
+            raise ValueError("The period from %s to %s is shorter than the history window." % (start_date, end_date))
+
+        return min(first_dates)
 
 
     def create_sample_periods(self, data, start_date, end_date, in_sample_periods, out_of_sample_periods, sample_period):